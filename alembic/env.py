@@ -24,6 +24,7 @@ from alembic import context
 # --- 🔹 Para poder importar tu app ---
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
+from app.core.config import settings
 from app.core.database import Base  # 👈 importa tu Base
 import app.models                   # 👈 importa tus modelos para que Alembic los detecte
 
@@ -36,6 +37,11 @@ fileConfig(config.config_file_name)
 # 🔸 Pasa tu metadata al target
 target_metadata = Base.metadata
 
+# 🔸 URL desde Settings (DATABASE_URL), no desde alembic.ini
+if not settings.DATABASE_URL:
+    raise RuntimeError("❌ DATABASE_URL no configurada (variable de entorno o .env).")
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL.replace("%", "%%"))
+
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
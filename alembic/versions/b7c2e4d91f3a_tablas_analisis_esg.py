@@ -0,0 +1,74 @@
+"""Tablas de análisis ESG y resultados por prompt"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# Identificadores de Alembic
+revision = 'b7c2e4d91f3a'
+down_revision = '1a841fa66c1b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 1️⃣ Cabecera del análisis
+    op.create_table(
+        'esg_analyses',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('organization_name', sa.String(255), nullable=False),
+        sa.Column('country', sa.String(120), nullable=False),
+        sa.Column('website', sa.String(500), nullable=False),
+        sa.Column('industry', sa.String(255), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('failed_prompts', postgresql.JSONB(), nullable=False, server_default='[]'),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_esg_analyses_organization_name', 'esg_analyses', ['organization_name', sa.text('created_at DESC')])
+    op.create_index('ix_esg_analyses_industry', 'esg_analyses', ['industry', sa.text('created_at DESC')])
+    op.create_index('ix_esg_analyses_status', 'esg_analyses', ['status', sa.text('created_at DESC')])
+    op.create_index(
+        'ix_esg_analyses_created_at_id', 'esg_analyses',
+        [sa.text('created_at DESC'), sa.text('id DESC')],
+    )
+
+    # 2️⃣ Resultados por prompt
+    op.create_table(
+        'esg_analysis_steps',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column(
+            'analysis_id', postgresql.UUID(as_uuid=True),
+            sa.ForeignKey('esg_analyses.id', ondelete='CASCADE'), nullable=False,
+        ),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('thread_id', sa.String(120), nullable=True),
+        sa.Column('response_content', postgresql.JSONB(), nullable=False),
+    )
+    op.create_index(
+        'ix_esg_analysis_steps_analysis_id_position', 'esg_analysis_steps',
+        ['analysis_id', 'position'], unique=True,
+    )
+
+    # 3️⃣ JSONB grande → TOAST con lz4, más rápido que pglz. Requiere
+    # PostgreSQL 14+ compilado con lz4; si no, la columna queda con pglz.
+    op.execute(
+        "DO $$ BEGIN "
+        "IF current_setting('server_version_num')::int >= 140000 "
+        "AND EXISTS (SELECT 1 FROM pg_settings WHERE name = 'default_toast_compression' "
+        "AND 'lz4' = ANY(enumvals)) THEN "
+        "ALTER TABLE esg_analysis_steps ALTER COLUMN response_content SET COMPRESSION lz4; "
+        "END IF; END $$;"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_esg_analysis_steps_analysis_id_position', table_name='esg_analysis_steps')
+    op.drop_table('esg_analysis_steps')
+
+    op.drop_index('ix_esg_analyses_created_at_id', table_name='esg_analyses')
+    op.drop_index('ix_esg_analyses_status', table_name='esg_analyses')
+    op.drop_index('ix_esg_analyses_industry', table_name='esg_analyses')
+    op.drop_index('ix_esg_analyses_organization_name', table_name='esg_analyses')
+    op.drop_table('esg_analyses')
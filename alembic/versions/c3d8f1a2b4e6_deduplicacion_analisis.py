@@ -0,0 +1,27 @@
+"""Hash de solicitud e Idempotency-Key en los análisis ESG"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Identificadores de Alembic
+revision = 'c3d8f1a2b4e6'
+down_revision = 'b7c2e4d91f3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 1️⃣ Columnas (nulas para los análisis existentes)
+    op.add_column('esg_analyses', sa.Column('request_hash', sa.String(64), nullable=True))
+    op.add_column('esg_analyses', sa.Column('idempotency_key', sa.String(255), nullable=True))
+
+    # 2️⃣ Búsqueda del último análisis por hash / por key
+    op.create_index('ix_esg_analyses_request_hash', 'esg_analyses', ['request_hash', sa.text('created_at DESC')])
+    op.create_index('ix_esg_analyses_idempotency_key', 'esg_analyses', ['idempotency_key', sa.text('created_at DESC')])
+
+
+def downgrade():
+    op.drop_index('ix_esg_analyses_idempotency_key', table_name='esg_analyses')
+    op.drop_index('ix_esg_analyses_request_hash', table_name='esg_analyses')
+    op.drop_column('esg_analyses', 'idempotency_key')
+    op.drop_column('esg_analyses', 'request_hash')
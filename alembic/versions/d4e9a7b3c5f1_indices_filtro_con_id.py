@@ -0,0 +1,30 @@
+"""Índices de filtro del listado con id (orden del cursor)"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Identificadores de Alembic
+revision = 'd4e9a7b3c5f1'
+down_revision = 'c3d8f1a2b4e6'
+branch_labels = None
+depends_on = None
+
+# `list_analyses` ordena por (created_at DESC, id DESC): con id en el índice
+# el filtro + cursor se resuelve sin ordenar filas con el mismo created_at
+FILTER_INDEXES = {
+    'ix_esg_analyses_organization_name': 'organization_name',
+    'ix_esg_analyses_industry': 'industry',
+    'ix_esg_analyses_status': 'status',
+}
+
+
+def upgrade():
+    for name, column in FILTER_INDEXES.items():
+        op.drop_index(name, table_name='esg_analyses')
+        op.create_index(name, 'esg_analyses', [column, sa.text('created_at DESC'), sa.text('id DESC')])
+
+
+def downgrade():
+    for name, column in FILTER_INDEXES.items():
+        op.drop_index(name, table_name='esg_analyses')
+        op.create_index(name, 'esg_analyses', [column, sa.text('created_at DESC')])
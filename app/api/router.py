@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 from app.api.routes import esg
+from app.core.responses import FastJSONResponse
 
-api_router = APIRouter()
+# orjson para todas las respuestas de la API (payloads de análisis grandes)
+api_router = APIRouter(default_response_class=FastJSONResponse)
 
 api_router.include_router(esg.router, prefix="/esg", tags=["esg"])
\ No newline at end of file
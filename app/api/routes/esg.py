@@ -1,39 +1,207 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import Response, JSONResponse
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.core.admission import Overloaded, get_admission
+from app.core.config import settings
+from app.core.responses import FastJSONResponse, dumps
 from app.schemas.analysis_request import AnalysisRequest, IndustryRequest
-from app.services.langchain.workflows import run_esg_analysis, run_sasb_mapping_and_table
-from app.services.pdf_generation.pdf import PDFGenerator
 from app.db.session import get_db
-from sqlalchemy.orm import Session
-import base64
-import os
-import json 
+from typing import Optional
+from uuid import UUID
+
+# ⚡ LangChain, SQLAlchemy y el store se importan dentro de cada handler:
+# así `import main` no los carga y el cold start queda en lo mínimo.
 
 router = APIRouter()
 
 
+def resolve_document(data: AnalysisRequest) -> str:
+    """Texto del documento: inline (`document`) o subido antes (`document_id`)."""
+    if not data.document_id:
+        return data.document or ""
+    from app.services.documents.store import load_text
+
+    text = load_text(data.document_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail=f"Documento {data.document_id} no encontrado")
+    return text
+
+
+def new_job(data: AnalysisRequest):
+    """Token de cancelación del análisis; el deadline corre desde ahora (cola incluida)."""
+    from app.services.langchain.deadline import CancelToken, get_job
+
+    if data.job_id and get_job(data.job_id) is not None:
+        raise HTTPException(status_code=409, detail=f"Ya hay un trabajo en curso con job_id {data.job_id}")
+    return CancelToken(data.job_id, data.deadline_s or settings.ESG_DEFAULT_DEADLINE_S or None)
+
+
+# ==========================================================
+# 📥 Subida de documentos (multipart en streaming)
+# ==========================================================
+@router.post("/documents")
+async def upload_document(request: Request):
+    """
+    Recibe un PDF/DOCX/HTML/TXT como multipart/form-data, lo escribe a disco
+    por chunks, extrae el texto en un proceso aparte y devuelve el
+    `document_id` para usar en los análisis.
+    """
+    from app.services.documents.extract import UnsupportedDocument
+    from app.services.documents.store import UploadError, UploadTooLarge, receive_upload
+
+    try:
+        return await receive_upload(request.headers.get("content-type", ""), request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (UploadError, UnsupportedDocument) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.get("/documents/{document_id}")
+def get_document(document_id: str):
+    from app.services.documents.store import get_metadata
+
+    meta = get_metadata(document_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    return meta
+
+
 # ==========================================================
 # 🚀 Análisis ESG completo (sin PDF)
 # ==========================================================
 @router.post("/esg-analysis")
 async def esg_analysis(data: AnalysisRequest):
+    from app.services.langchain.workflows import run_esg_analysis
+
+    from app.services import idempotency
+    from app.services.langchain.deadline import run_job
+
     print(data)
-    result = await run_esg_analysis(
-        organization_name=data.organization_name,
-        country=data.country,
-        website=data.website,
-        industry=data.industry,
-        document=data.document or ""
-        )
+    document = resolve_document(data)
+    token = new_job(data)
+
+    async def admitted():
+        async with get_admission().slot():
+            return await run_esg_analysis(
+                organization_name=data.organization_name,
+                country=data.country,
+                website=data.website,
+                industry=data.industry,
+                document=document,
+                priority=data.priority,
+                tenant=data.tenant,
+                )
 
+    async def run():
+        result = await run_job(token, admitted)
+        return {**result, "job_id": token.job_id}
+
+    if not settings.ESG_DEDUP_ENABLED:
+        return await run()
+
+    # Sin persistencia: solo se unen los duplicados que llegan mientras corre
+    req_hash = idempotency.request_hash(
+        data.organization_name, data.country, data.website, data.industry, document
+    )
+    result, _ = await idempotency.coalesce(idempotency.dedup_key("plain", req_hash, None), req_hash, run)
     return result
 
 
+# ==========================================================
+# 💸 Estimación de costo (preflight, sin correr el análisis)
+# ==========================================================
+@router.post("/esg-analysis-estimate")
+async def esg_analysis_estimate(data: AnalysisRequest):
+    """
+    Tokens y USD esperados del análisis y qué haría el preflight con los
+    presupuestos actuales: "full" | "downgraded" | "rejected".
+    """
+    from app.services.documents.preprocess import prepare_document
+    from app.services.langchain import costs, prompt_registry
+
+    document = resolve_document(data)
+    prepared = await asyncio.to_thread(prepare_document, document) if document else None
+    tenant = (data.tenant or data.organization_name).strip().casefold()
+    return costs.plan(tenant, prompt_registry.count_tokens(prepared.text) if prepared else 0)
+
+
+# ==========================================================
+# 📡 Análisis ESG con progreso en vivo (Server-Sent Events)
+# ==========================================================
+@router.post("/esg-analysis-stream")
+async def esg_analysis_stream(data: AnalysisRequest):
+    """
+    Igual que /esg-analysis, pero emite el progreso como SSE: `step`
+    (inicio/fin de cada prompt), `row` (cada fila de las tablas largas a
+    medida que el modelo la genera) y al final `result` o `error`. El
+    primer evento es `job` (id para cancelar); si el worker está lleno,
+    luego `queued` con la posición en la cola.
+    """
+    from app.services.langchain.deadline import RunCancelled, run_job
+    from app.services.langchain.workflows import run_esg_analysis
+
+    document = resolve_document(data)
+    token = new_job(data)
+    admission = get_admission()
+    # Cola llena → 429 antes de abrir el stream; la espera en cola va dentro
+    admission.check()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def admitted():
+        if admission.inflight >= admission.max_inflight:
+            queue.put_nowait({"type": "queued", "position": admission.queued + 1})
+        async with admission.slot():
+            return await run_esg_analysis(
+                organization_name=data.organization_name,
+                country=data.country,
+                website=data.website,
+                industry=data.industry,
+                document=document,
+                on_event=queue.put_nowait,
+                priority=data.priority,
+                tenant=data.tenant,
+            )
+
+    async def produce():
+        try:
+            queue.put_nowait({"type": "job", "job_id": token.job_id, "deadline_s": token.remaining()})
+            result = await run_job(token, admitted)
+            queue.put_nowait({"type": "result", "job_id": token.job_id, **result})
+        except Overloaded as e:
+            queue.put_nowait({"type": "error", "error": str(e), "retry_after_s": e.retry_after})
+        except RunCancelled as e:
+            queue.put_nowait({"type": "error", "error": str(e), "status": e.status})
+        except Exception as e:
+            queue.put_nowait({"type": "error", "error": str(e)})
+        finally:
+            queue.put_nowait(None)
+
+    async def events():
+        task = asyncio.create_task(produce())
+        try:
+            while (event := await queue.get()) is not None:
+                yield b"event: %s\ndata: %s\n\n" % (event["type"].encode(), dumps(event))
+        finally:
+            # Cliente desconectado → no seguir gastando runs
+            if not task.done():
+                token.cancel("client_disconnected")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @router.post("/esg-analysis-prompts")
 async def esg_analysis(data: IndustryRequest):
-    result = await run_sasb_mapping_and_table(
-        industry=data.industry,
-    )
+    from app.services.langchain.scheduler import INTERACTIVE, lane
+    from app.services.langchain.workflows import run_sasb_mapping_and_table
+
+    # Consulta corta: clase interactiva, en su propio flujo (no espera detrás de carteras)
+    with lane(INTERACTIVE, "sasb-lookup"):
+        result = await run_sasb_mapping_and_table(
+            industry=data.industry,
+        )
     return result
 # ==========================================================
 # 🧾 Análisis ESG completo con PDF (JSON + base64 + link)
@@ -41,7 +209,7 @@ async def esg_analysis(data: IndustryRequest):
 @router.post("/esg-analysis-api")
 async def esg_analysis_api(
     data: AnalysisRequest,
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
     """
     Ejecuta el flujo completo del análisis ESG.
@@ -49,48 +217,103 @@ async def esg_analysis_api(
     - status: "complete" | "incomplete" | "failed"
     - analysis_json: respuestas de todos los prompts
     - failed_prompts: lista de prompts fallidos
+
+    Solicitudes repetidas (misma `Idempotency-Key` o mismo cuerpo) no
+    lanzan otro análisis: se unen al que está en curso o reciben el
+    guardado, con el header `Idempotent-Replayed: in-flight | stored`.
+
+    Cancelado (`job_id`) o con el deadline vencido a mitad de camino →
+    207 con status "cancelled" | "deadline_exceeded" y lo ya generado.
     """
-    print(f"🚀 Iniciando análisis ESG para {data.organization_name}")
+    from app.services.langchain.deadline import run_job
+    from app.services.langchain.workflows import run_esg_analysis
+    from app.services import idempotency
 
-    pipeline_result = None
+    print(f"🚀 Iniciando análisis ESG para {data.organization_name}")
 
+    document = resolve_document(data)
     try:
-        # ===========================
-        # 1️⃣ Ejecutar análisis completo
-        # ===========================
-        pipeline_result = await run_esg_analysis(
-            organization_name=data.organization_name,
-            country=data.country,
-            website=data.website,
-            industry=data.industry,
-            document=data.document or ""
-        )
+        key = idempotency.check_key(idempotency_key)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    req_hash = idempotency.request_hash(
+        data.organization_name, data.country, data.website, data.industry, document
+    )
+    token = new_job(data)
+
+    async def persist(status, responses, failed_prompts):
+        # 💾 Guardar resultado con su propia sesión: la corrida puede seguir
+        # (para los duplicados) aunque el cliente que la inició se desconecte.
+        # Si la base falla, igual devolvemos el análisis.
+        try:
+            analysis_id = await run_in_threadpool(
+                save_analysis_now,
+                organization_name=data.organization_name,
+                country=data.country,
+                website=data.website,
+                industry=data.industry,
+                status=status,
+                responses=responses,
+                failed_prompts=failed_prompts,
+                request_hash=req_hash,
+                idempotency_key=key,
+            )
+            return str(analysis_id)
+        except Exception as e:
+            print(f"⚠️ No se pudo persistir el análisis: {e}")
+            return None
+
+    async def analyze():
+        pipeline_result = None
+        try:
+            # ===========================
+            # 1️⃣ Ejecutar análisis completo
+            # ===========================
+            pipeline_result = await run_esg_analysis(
+                organization_name=data.organization_name,
+                country=data.country,
+                website=data.website,
+                industry=data.industry,
+                document=document,
+                priority=data.priority,
+                tenant=data.tenant,
+            )
+
+            status = pipeline_result.get("status", "failed")
+            responses = pipeline_result.get("responses", [])
+            failed_prompts = pipeline_result.get("failed_prompts", [])
 
-        status = pipeline_result.get("status", "failed")
-        responses = pipeline_result.get("responses", [])
-        failed_prompts = pipeline_result.get("failed_prompts", [])
+            analysis_id = await persist(status, responses, failed_prompts)
 
-        # ===========================
-        # 2️⃣ Devolver SOLO JSON
-        # ===========================
-        return JSONResponse(
-            status_code=200 if status == "complete" else 207,
-            content={
+            # ===========================
+            # 2️⃣ Devolver SOLO JSON
+            # ===========================
+            return 200 if status == "complete" else 207, {
+                "analysis_id": analysis_id,
+                "job_id": token.job_id,
                 "status": status,
                 "analysis_json": responses,
                 "failed_prompts": failed_prompts,
-            },
-        )
+            }
+
+        except Overloaded:
+            # Presupuesto insuficiente (preflight): 402/429, nada que guardar
+            raise
+        except Exception as e:
+            # ===========================
+            # 3️⃣ Error crítico → devolver parcial si existe
+            # ===========================
+            print(f"❌ Error en análisis ESG: {str(e)}")
 
-    except Exception as e:
-        # ===========================
-        # 3️⃣ Error crítico → devolver parcial si existe
-        # ===========================
-        print(f"❌ Error en análisis ESG: {str(e)}")
+            analysis_id = await persist(
+                "failed",
+                pipeline_result.get("responses", []) if pipeline_result else [],
+                pipeline_result.get("failed_prompts", []) if pipeline_result else [],
+            )
 
-        return JSONResponse(
-            status_code=500,
-            content={
+            return 500, {
+                "analysis_id": analysis_id,
+                "job_id": token.job_id,
                 "status": "failed",
                 "error": str(e),
                 "partial_results": (
@@ -99,5 +322,111 @@ async def esg_analysis_api(
                 "failed_prompts": (
                     pipeline_result.get("failed_prompts") if pipeline_result else []
                 ),
-            },
+            }
+
+    async def admitted(guarded):
+        # Fuera del try de `analyze`: un rechazo por saturación es 429/503, no 500
+        async with get_admission().slot():
+            # Lock de deduplicación recién con lugar (ver idempotency.run_once)
+            return await guarded(analyze)
+
+    async def run(guarded=lambda call: call()):
+        return await run_job(token, lambda: admitted(guarded))
+
+    def replay(stored):
+        return 200 if stored["status"] == "complete" else 207, {
+            "analysis_id": stored["id"],
+            "status": stored["status"],
+            "analysis_json": stored["analysis_json"],
+            "failed_prompts": stored["failed_prompts"],
+        }
+
+    if not settings.ESG_DEDUP_ENABLED:
+        status_code, content = await run()
+        return FastJSONResponse(status_code=status_code, content=content)
+
+    try:
+        (status_code, content), origin = await idempotency.run_once("api", req_hash, key, run, replay)
+    except idempotency.IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if origin:
+        print(f"♻️ Solicitud repetida ({origin}): {data.organization_name}")
+    headers = {idempotency.REPLAYED_HEADER: origin} if origin else None
+    return FastJSONResponse(status_code=status_code, content=content, headers=headers)
+
+
+def save_analysis_now(**kwargs) -> str:
+    from app.core.database import SessionLocal, get_engine
+    from app.services.analysis_store import save_analysis
+
+    db = SessionLocal(bind=get_engine())
+    try:
+        return save_analysis(db, **kwargs)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+
+# ==========================================================
+# 🛑 Trabajos en curso (cancelación)
+# ==========================================================
+@router.get("/jobs")
+async def esg_jobs():
+    from app.services.langchain.deadline import list_jobs
+
+    return {"jobs": list_jobs()}
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def esg_job_cancel(job_id: str):
+    """
+    Cancela un análisis en cola o en curso de este worker. El análisis
+    responde a su cliente con lo generado hasta ahora (status "cancelled").
+    """
+    from app.services.langchain.deadline import cancel_job
+
+    token = cancel_job(job_id)
+    if token is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado (terminado o en otro worker)")
+    return FastJSONResponse(status_code=202, content=token.snapshot())
+
+
+# ==========================================================
+# 📚 Análisis guardados
+# ==========================================================
+@router.get("/analyses")
+def esg_analyses_list(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    organization_name: Optional[str] = None,
+    industry: Optional[str] = None,
+    status: Optional[str] = None,
+    db=Depends(get_db),
+):
+    from app.services.analysis_store import list_analyses
+
+    try:
+        return list_analyses(
+            db,
+            limit=limit,
+            cursor=cursor,
+            organization_name=organization_name,
+            industry=industry,
+            status=status,
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/analyses/{analysis_id}")
+def esg_analysis_detail(analysis_id: UUID, db=Depends(get_db)):
+    from app.services.analysis_store import get_analysis
+
+    analysis = get_analysis(db, analysis_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Análisis no encontrado")
+    return analysis
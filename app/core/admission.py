@@ -0,0 +1,160 @@
+"""
+Control de admisión de análisis por worker.
+
+Cada análisis lanza decenas de runs contra el mismo rate limit de OpenAI;
+aceptar todos los que lleguen en una ráfaga hace que todos vayan lentos y
+fallen juntos. Aquí se limita cuántos corren a la vez
+(`ESG_MAX_INFLIGHT_ANALYSES`) y cuántos esperan en una cola FIFO acotada
+(`ESG_ADMISSION_QUEUE`):
+
+- cola llena → 429 inmediato;
+- demasiado tiempo en cola (`ESG_ADMISSION_QUEUE_TIMEOUT_S`) → 503.
+
+Ambos con `Retry-After` estimado a partir de la profundidad de la cola y
+la latencia reciente de los pasos. `status()` expone las métricas para
+el autoscaling (`load` = (en curso + en cola) / capacidad).
+"""
+
+import asyncio
+import math
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from app.core.config import settings
+
+
+class Overloaded(Exception):
+    """El worker no admite más análisis; se responde `status_code` con Retry-After (si lo hay)."""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[int]):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_inflight: int, max_queue: int, queue_timeout_s: float):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self._waits: Deque[float] = deque(maxlen=200)
+        self._runs: Deque[float] = deque(maxlen=50)
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for f in self._waiters if not f.done())
+
+    # -------- estimación --------
+    def expected_run_s(self) -> float:
+        """Duración esperada de un análisis: suma de los p50 por paso, o corridas recientes."""
+        from app.services.langchain import hedging
+
+        steps = [s["p50_s"] for s in hedging.latency.snapshot().values() if s["p50_s"]]
+        if steps:
+            return sum(steps)
+        if self._runs:
+            return statistics.median(self._runs)
+        return settings.ESG_ADMISSION_DEFAULT_RUN_S
+
+    def retry_after(self) -> int:
+        """Segundos hasta que se libere un lugar para una solicitud nueva."""
+        waves = (self.queued + 1) / max(self.max_inflight, 1)
+        seconds = math.ceil(waves * self.expected_run_s())
+        return max(1, min(seconds, settings.ESG_ADMISSION_MAX_RETRY_AFTER_S))
+
+    # -------- admisión --------
+    def check(self):
+        """Rechazo rápido (sin encolar) si la cola ya está llena."""
+        if self.inflight >= self.max_inflight and self.queued >= self.max_queue:
+            self.rejected_full += 1
+            raise Overloaded("Cola de análisis llena", 429, self.retry_after())
+
+    async def acquire(self):
+        if self.inflight < self.max_inflight and not self.queued:
+            self.inflight += 1
+            self.admitted += 1
+            return
+        self.check()
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.queued_total += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, timeout=self.queue_timeout_s)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # El lugar llegó justo cuando se abandonaba la espera: devolverlo
+                self.release()
+            else:
+                fut.cancel()
+            try:
+                self._waiters.remove(fut)
+            except ValueError:
+                pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected_timeout += 1
+                raise Overloaded("Tiempo de espera en cola agotado", 503, self.retry_after()) from None
+            raise
+        self._waits.append(time.monotonic() - started)
+        self.admitted += 1
+
+    def release(self):
+        # El lugar pasa directo al primero de la cola (FIFO)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._runs.append(time.monotonic() - started)
+            self.release()
+
+    def status(self) -> Dict[str, Any]:
+        queued = self.queued
+        return {
+            "inflight": self.inflight,
+            "queued": queued,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            # > 1: hay trabajo esperando; señal para escalar workers
+            "load": round((self.inflight + queued) / max(self.max_inflight, 1), 2),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_p50_s": round(statistics.median(self._waits), 2) if self._waits else None,
+            "expected_run_s": round(self.expected_run_s(), 1),
+            "retry_after_s": self.retry_after(),
+        }
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            settings.ESG_MAX_INFLIGHT_ANALYSES,
+            settings.ESG_ADMISSION_QUEUE,
+            settings.ESG_ADMISSION_QUEUE_TIMEOUT_S,
+        )
+    return _controller
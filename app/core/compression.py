@@ -0,0 +1,117 @@
+"""
+Compresión negociada de respuestas (zstd o gzip según `Accept-Encoding`).
+
+Middleware ASGI propio en lugar de `GZipMiddleware` porque además de gzip
+ofrece zstd (`zstandard` ya está en requirements), que comprime el JSON del
+análisis algo mejor y bastante más rápido. Solo comprime respuestas
+completas (un único `http.response.body`) de tipo texto/JSON por encima de
+`COMPRESSION_MIN_BYTES`; el streaming (SSE) y las respuestas ya codificadas
+pasan sin tocar.
+"""
+
+import gzip
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+SKIP_TYPES = ("text/event-stream",)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """{'zstd': 1.0, 'gzip': 0.8, ...} a partir del header (q=0 → excluido)."""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    accepted = parse_accept_encoding(header or "")
+    candidates: List[Tuple[float, int, str]] = []
+    # A igual q se prefiere zstd, pero solo si el cliente lo nombra: "*" lo
+    # mandan clientes que no necesariamente saben descomprimirlo → gzip
+    for rank, name in enumerate(("zstd", "gzip")):
+        if name == "zstd" and zstandard is None:
+            continue
+        q = accepted.get(name, accepted.get("*", 0.0) if name == "gzip" else 0.0)
+        if q > 0:
+            candidates.append((q, -rank, name))
+    return max(candidates)[2] if candidates else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, min_size: Optional[int] = None):
+        self.app = app
+        self.min_size = settings.COMPRESSION_MIN_BYTES if min_size is None else min_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+            eligible = (
+                not message.get("more_body", False)
+                and "content-encoding" not in headers
+                and len(body) >= self.min_size
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+                and not content_type.startswith(SKIP_TYPES)
+            )
+            if eligible:
+                body = compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                message = {**message, "body": body}
+            else:
+                # Streaming o respuesta chica: se envía tal cual
+                passthrough = True
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
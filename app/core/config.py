@@ -1,13 +1,145 @@
 from pydantic_settings import BaseSettings
+from typing import Any, Dict, Tuple
 
 class Settings(BaseSettings):
 
     ENVIRONMENT: str = "development"
     
+    # Obligatoria para usar la base (sin default: nada de credenciales en el código)
     DATABASE_URL: str = ""
 
+    # 🧭 Pool de conexiones (SQLAlchemy)
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+
     OPENAI_API_KEY: str = ""
 
+    # 🤖 Pool HTTP compartido para el Assistants API
+    OPENAI_HTTP2: bool = True
+    OPENAI_MAX_CONNECTIONS: int = 50
+    OPENAI_MAX_KEEPALIVE: int = 20
+    OPENAI_KEEPALIVE_EXPIRY: float = 60.0
+    OPENAI_CONNECT_TIMEOUT: float = 10.0
+    OPENAI_READ_TIMEOUT: float = 120.0
+    ASSISTANT_CHECK_EVERY_MS: float = 1000.0
+
+    # 🧵 "fork": thread nuevo por paso con contexto compacto | "shared": un thread para todo
+    ESG_THREAD_MODE: str = "fork"
+
+    # 🔀 Fan-out por tema (Prompts 6, 7 y 10) bajo un límite global de runs
+    OPENAI_MAX_CONCURRENT_RUNS: int = 8
+    # 🗓️ Scheduler de runs: pesos por clase (WFQ), lugares solo interactive, pesos por tenant
+    ESG_SCHED_WEIGHT_INTERACTIVE: float = 8.0
+    ESG_SCHED_WEIGHT_BATCH: float = 1.0
+    ESG_SCHED_INTERACTIVE_RESERVED: int = 2
+    ESG_SCHED_DEFAULT_COST_S: float = 30.0  # costo de un paso sin latencias medidas
+    ESG_SCHED_TENANT_WEIGHTS: Dict[str, float] = {}
+    ESG_FANOUT_ENABLED: bool = True
+    ESG_FANOUT_SHARD_SIZE: int = 2
+    ESG_FANOUT_SHARD_RETRIES: int = 2
+
+    # 🪁 Hedging: duplicar runs que superan el p95 de su paso
+    ESG_HEDGE_ENABLED: bool = True
+    ESG_HEDGE_WINDOW: int = 200
+    ESG_HEDGE_MIN_SAMPLES: int = 20
+    ESG_HEDGE_MIN_AFTER_S: float = 15.0
+    ESG_HEDGE_DEFAULT_AFTER_S: float = 0.0  # 0 = sin hedge hasta tener muestras
+    ESG_HEDGE_MAX_RATIO: float = 0.1
+    ESG_HEDGE_BURST: float = 3.0
+    ESG_HEDGE_MAX_CONCURRENT: int = 4
+
+    # 🔁 Reintentos (backoff exponencial con jitter) y circuit breaker
+    ESG_RETRY_BASE_S: float = 2.0
+    ESG_RETRY_MAX_S: float = 60.0
+    ESG_RATE_LIMIT_BASE_S: float = 15.0
+    ESG_RATE_LIMIT_MAX_S: float = 120.0
+    ESG_BREAKER_WINDOW_S: float = 60.0
+    ESG_BREAKER_MIN_CALLS: int = 20
+    ESG_BREAKER_ERROR_RATE: float = 0.5
+    ESG_BREAKER_OPEN_S: float = 30.0
+    ESG_BREAKER_MODE: str = "fail"  # "fail": falla rápido | "wait": espera al half-open
+    ESG_BREAKER_MAX_WAIT_S: float = 60.0
+
+    # ✂️ Continuaciones dirigidas cuando una tabla larga se trunca
+    ESG_MAX_CONTINUATIONS: int = 2
+
+    # 📡 Streaming de las tablas largas (filas incrementales + aborto temprano)
+    ESG_STREAMING: bool = True
+    ESG_STREAM_MAX_BAD_ROWS: int = 3
+
+    # 📄 Documento adjunto: extracto acotado para el Prompt 1 (BM25 local + cache por hash)
+    ESG_DOCUMENT_BUDGET_TOKENS: int = 3000
+    ESG_DOCUMENT_CHUNK_CHARS: int = 1200
+    ESG_DOCUMENT_PASSAGES_PER_FIELD: int = 2
+    ESG_DOCUMENT_CACHE_SIZE: int = 32
+
+    # 📥 Subida de documentos (multipart en streaming + extracción en procesos)
+    ESG_DOCUMENTS_DIR: str = "storage/documents"
+    ESG_UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    ESG_EXTRACT_WORKERS: int = 2
+    ESG_EXTRACT_MAX_PAGES: int = 400
+    ESG_EXTRACT_MAX_CHARS: int = 2_000_000
+    ESG_EXTRACT_TIMEOUT_S: float = 120.0
+
+    # 🧠 Salidas crudas por corrida: comprimidas; a disco por encima de este tamaño
+    ESG_RAW_SPILL_BYTES: int = 256 * 1024
+
+    # 🚦 Control de admisión por worker (análisis en curso + cola acotada)
+    ESG_MAX_INFLIGHT_ANALYSES: int = 4
+    ESG_ADMISSION_QUEUE: int = 16
+    ESG_ADMISSION_QUEUE_TIMEOUT_S: float = 600.0
+    ESG_ADMISSION_DEFAULT_RUN_S: float = 240.0  # hasta tener latencias medidas
+    ESG_ADMISSION_MAX_RETRY_AFTER_S: int = 900
+
+    # ⏱️ Deadline por análisis si la solicitud no trae `deadline_s` (0 = sin límite)
+    ESG_DEFAULT_DEADLINE_S: float = 0
+
+    # 💸 Costo y presupuestos (USD; 0 = sin límite). Precios: USD por 1M tokens (entrada, salida)
+    ESG_DEFAULT_MODEL: str = "gpt-4o"  # modelo del asistente, para precios y estimaciones
+    ESG_MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+        "gpt-4o": (2.50, 10.00),
+        "gpt-4o-mini": (0.15, 0.60),
+        "gpt-4.1": (2.00, 8.00),
+        "gpt-4.1-mini": (0.40, 1.60),
+        "gpt-4.1-nano": (0.10, 0.40),
+    }
+    ESG_USAGE_FROM_API: bool = True  # leer `usage` del run (si no, se estima por texto)
+    ESG_BUDGET_ANALYSIS_USD: float = 0
+    ESG_BUDGET_TENANT_DAILY_USD: float = 0
+    ESG_BUDGET_TENANT_DAILY_OVERRIDES: Dict[str, float] = {}
+    ESG_BUDGET_DAILY_USD: float = 0
+    ESG_BUDGET_DOWNGRADE_MODEL: str = "gpt-4o-mini"  # "" = rechazar en vez de degradar
+    ESG_COST_DEFAULT_OUTPUT_TOKENS: int = 1500  # por run, hasta tener historial
+    ESG_COST_MIN_SAMPLES: int = 5
+    ESG_COST_ESTIMATE_MARGIN: float = 1.2
+    ESG_QUOTA_COOLDOWN_S: float = 300.0
+
+    # 🧭 Ruteo por paso (routing.py): {"prompt_8": {"model": "gpt-4.1-mini", "max_output_tokens": 200}}
+    ESG_ROUTING_ENABLED: bool = True
+    ESG_STEP_ROUTES: Dict[str, Dict[str, Any]] = {}
+    ESG_BACKEND: str = "openai"  # "local" = stand-in sin red (pruebas / benchmarks)
+
+    # 🔁 Deduplicación de solicitudes repetidas (Idempotency-Key / hash del cuerpo)
+    ESG_DEDUP_ENABLED: bool = True
+    ESG_DEDUP_WINDOW_S: float = 600.0  # sin key: reusar un "complete" idéntico de hace menos de esto
+    ESG_IDEMPOTENCY_TTL_S: float = 24 * 3600.0
+    ESG_DEDUP_LOCK_POLL_S: float = 2.0
+    ESG_DEDUP_LOCK_WAIT_S: float = 1800.0
+
+    # 🗜️ Compresión de respuestas (zstd/gzip según Accept-Encoding)
+    RESPONSE_COMPRESSION: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 5
+    COMPRESSION_ZSTD_LEVEL: int = 3
+
+    # ⚡ Precalentar LangChain/engine/WeasyPrint en el arranque (lifespan)
+    WARMUP_ON_STARTUP: bool = False
+
     SUPABASE_URL: str = ""
 
     SUPABASE_ANON_KEY: str = ""
@@ -15,4 +147,4 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
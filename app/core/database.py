@@ -1,20 +1,231 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.core.config import settings
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from app.core.config import Settings, settings
+from app.core.responses import dumps_str
 
 Base = declarative_base()
 
-engine = create_engine(
-    settings.DATABASE_URL, 
-    echo=True,
-    future=True
-)
 
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# ==========================================================
+# 📊 Métricas del pool (checkouts, overflow, tiempo de espera)
+# ==========================================================
+class PoolMetrics:
+    """
+    Contadores del pool de un engine. `connects` cuenta conexiones físicas
+    nuevas y `checkouts` cuenta préstamos: si checkouts >> connects, el pool
+    está reutilizando conexiones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def record_wait(self, elapsed: float):
+        with self._lock:
+            self.wait_total_s += elapsed
+            self.wait_max_s = max(self.wait_max_s, elapsed)
+
+    def snapshot(self, pool) -> Dict[str, Any]:
+        with self._lock:
+            checkouts = self.checkouts
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "checkouts": checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "reuse_ratio": round(1 - self.connects / checkouts, 4) if checkouts else 0.0,
+                "wait_avg_ms": round(self.wait_total_s / checkouts * 1000, 3) if checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max_s * 1000, 3),
+            }
+
+
+class _MeteredPoolMixin:
+    """Mide cuánto espera cada checkout a que el pool entregue una conexión."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.metrics.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() reemplaza el pool: las métricas siguen en el nuevo
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _attach_metrics(engine: Engine) -> PoolMetrics:
+    metrics = PoolMetrics()
+    engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        with metrics._lock:
+            metrics.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        with metrics._lock:
+            metrics.checkouts += 1
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exc):
+        with metrics._lock:
+            metrics.invalidations += 1
+
+    return metrics
+
+
+def _pool_kwargs(config: Settings) -> Dict[str, Any]:
+    return {
+        "echo": config.DB_ECHO,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
+
+# ==========================================================
+# 🏭 Fábrica única de engines
+# ==========================================================
+def _database_url(config: Settings) -> str:
+    if not config.DATABASE_URL:
+        raise RuntimeError("❌ DATABASE_URL no configurada (variable de entorno o .env).")
+    return config.DATABASE_URL
+
+
+def create_db_engine(config: Settings = settings) -> Engine:
+    """
+    Crea el engine síncrono (psycopg2) con el pool configurado en Settings.
+    El statement_timeout se fija por conexión para que ninguna consulta
+    bloquee un worker indefinidamente.
+    """
+    engine = create_engine(
+        _database_url(config),
+        poolclass=MeteredQueuePool,
+        connect_args={"options": f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}"},
+        json_serializer=dumps_str,
+        future=True,
+        **_pool_kwargs(config),
+    )
+    _attach_metrics(engine)
+    return engine
+
+
+def create_async_db_engine(config: Settings = settings):
+    """
+    Crea el engine async (asyncpg) para rutas async. asyncpg es opcional:
+    si no está instalado se lanza RuntimeError con instrucciones.
+    """
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        import asyncpg  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("❌ Engine async requiere `asyncpg` (pip install asyncpg).") from e
+
+    url = make_url(_database_url(config)).set(drivername="postgresql+asyncpg")
+    engine = create_async_engine(
+        url,
+        poolclass=MeteredAsyncQueuePool,
+        json_serializer=dumps_str,
+        connect_args={
+            "server_settings": {"statement_timeout": str(config.DB_STATEMENT_TIMEOUT_MS)}
+        },
+        **_pool_kwargs(config),
+    )
+    _attach_metrics(engine.sync_engine)
+    return engine
+
+
+# Los engines se crean en el primer uso: importar este módulo no abre
+# conexiones ni exige que DATABASE_URL sea válida.
+@lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    return create_db_engine(settings)
+
+
+@lru_cache(maxsize=1)
+def get_async_engine():
+    return create_async_db_engine(settings)
+
+
+@lru_cache(maxsize=1)
+def get_lock_engine() -> Engine:
+    """
+    Engine sin pool para conexiones de larga duración (advisory locks de
+    idempotency.py): retienen su conexión todo el análisis y no deben
+    quitarle lugar al pool que usan las consultas y el guardado.
+    """
+    return create_engine(
+        _database_url(settings),
+        poolclass=NullPool,
+        connect_args={"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"},
+        future=True,
+    )
+
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
 
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as db:
+        yield db
+
+
+def pool_status() -> Dict[str, Optional[Dict[str, Any]]]:
+    """Métricas de los engines ya creados (None si aún no se usaron)."""
+    status: Dict[str, Optional[Dict[str, Any]]] = {"sync": None, "async": None}
+    if get_engine.cache_info().currsize:
+        pool = get_engine().pool
+        status["sync"] = pool.metrics.snapshot(pool)
+    if get_async_engine.cache_info().currsize:
+        pool = get_async_engine().sync_engine.pool
+        status["async"] = pool.metrics.snapshot(pool)
+    return status
+
+
+async def dispose_engines():
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
+    if get_lock_engine.cache_info().currsize:
+        get_lock_engine().dispose()
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
@@ -0,0 +1,51 @@
+"""
+Inicialización diferida de subsistemas pesados.
+
+`import main` no carga LangChain, SQLAlchemy ni WeasyPrint. Cada uno se
+inicializa en su primer uso, o antes con `warm_up()` (lifespan con
+WARMUP_ON_STARTUP=true, o el endpoint /warmup).
+"""
+
+import time
+from typing import Dict, Iterable, Optional
+
+
+def _warm_langchain():
+    from app.services.langchain.clients import get_registry
+    from app.services.langchain.prompt_registry import print_report
+    import app.services.langchain.workflows  # noqa: F401
+
+    # Costo de entrada por paso, visible en los logs de arranque
+    print_report()
+    get_registry().get("esg")
+
+
+def _warm_database():
+    from app.core.database import get_engine
+
+    get_engine()
+
+
+def _warm_pdf():
+    from app.services.pdf_generation.pdf import PDFGenerator  # noqa: F401
+
+
+SUBSYSTEMS = {
+    "langchain": _warm_langchain,
+    "database": _warm_database,
+    "pdf": _warm_pdf,
+}
+
+
+def warm_up(subsystems: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, object]]:
+    """Inicializa los subsistemas pedidos y devuelve el tiempo de cada uno."""
+    report: Dict[str, Dict[str, object]] = {}
+    for name in subsystems or SUBSYSTEMS:
+        start = time.perf_counter()
+        try:
+            SUBSYSTEMS[name]()
+            report[name] = {"ok": True}
+        except Exception as e:
+            report[name] = {"ok": False, "error": str(e)}
+        report[name]["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return report
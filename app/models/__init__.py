@@ -0,0 +1,3 @@
+from app.models.analysis import EsgAnalysis, EsgAnalysisStep
+
+__all__ = ["EsgAnalysis", "EsgAnalysisStep"]
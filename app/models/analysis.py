@@ -0,0 +1,69 @@
+import uuid
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import relationship
+
+from app.core.database import Base
+
+
+class EsgAnalysis(Base):
+    """Cabecera de un análisis ESG ejecutado por el pipeline."""
+
+    __tablename__ = "esg_analyses"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_name = Column(String(255), nullable=False)
+    country = Column(String(120), nullable=False)
+    website = Column(String(500), nullable=False)
+    industry = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False)
+    failed_prompts = Column(JSONB, nullable=False, default=list)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    # Deduplicación de envíos repetidos (ver app/services/idempotency.py)
+    request_hash = Column(String(64), nullable=True)
+    idempotency_key = Column(String(255), nullable=True)
+
+    steps = relationship(
+        "EsgAnalysisStep",
+        back_populates="analysis",
+        order_by="EsgAnalysisStep.position",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        # Filtros del listado + orden del cursor (created_at, id) en el mismo índice
+        Index("ix_esg_analyses_organization_name", "organization_name", created_at.desc(), id.desc()),
+        Index("ix_esg_analyses_industry", "industry", created_at.desc(), id.desc()),
+        Index("ix_esg_analyses_status", "status", created_at.desc(), id.desc()),
+        # Paginación por cursor (created_at, id) en orden descendente
+        Index("ix_esg_analyses_created_at_id", created_at.desc(), id.desc()),
+        # Último análisis con la misma solicitud / la misma Idempotency-Key
+        Index("ix_esg_analyses_request_hash", "request_hash", created_at.desc()),
+        Index("ix_esg_analyses_idempotency_key", "idempotency_key", created_at.desc()),
+    )
+
+
+class EsgAnalysisStep(Base):
+    """Resultado de un prompt dentro de un análisis (response_content en JSONB comprimido)."""
+
+    __tablename__ = "esg_analysis_steps"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    analysis_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("esg_analyses.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    position = Column(Integer, nullable=False)
+    name = Column(String(255), nullable=False)
+    thread_id = Column(String(120), nullable=True)
+    response_content = Column(JSONB, nullable=False)
+
+    analysis = relationship("EsgAnalysis", back_populates="steps")
+
+    __table_args__ = (
+        Index("ix_esg_analysis_steps_analysis_id_position", "analysis_id", "position", unique=True),
+    )
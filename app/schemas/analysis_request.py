@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
-from typing import Optional
+from typing import Literal, Optional
 
 class AnalysisRequest(BaseModel):
     organization_name: str
@@ -8,6 +8,16 @@ class AnalysisRequest(BaseModel):
     website: str
     industry: str
     document: Optional[str] = None
+    # Id devuelto por POST /api/esg/documents (alternativa a enviar el texto)
+    document_id: Optional[str] = None
+    # Clase en el scheduler de runs: carteras/scripts → "batch"
+    priority: Literal["interactive", "batch"] = "interactive"
+    # Flujo de cola justa (por defecto, la organización)
+    tenant: Optional[str] = None
+    # Id para cancelar el trabajo (POST /api/esg/jobs/{job_id}/cancel); si no, se genera
+    job_id: Optional[str] = Field(None, min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_.:-]+$")
+    # Segundos para terminar (cola incluida); al vencer se devuelve el resultado parcial
+    deadline_s: Optional[float] = Field(None, gt=0)
 
 
 
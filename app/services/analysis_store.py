@@ -0,0 +1,206 @@
+"""
+Persistencia de análisis ESG y sus resultados por prompt.
+"""
+
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import and_, insert, select, tuple_
+from sqlalchemy.orm import Session, joinedload
+
+from app.models.analysis import EsgAnalysis, EsgAnalysisStep
+
+MAX_PAGE_SIZE = 100
+
+
+# ==========================================================
+# 💾 Escritura — una cabecera + bulk insert de los pasos
+# ==========================================================
+def save_analysis(
+    db: Session,
+    organization_name: str,
+    country: str,
+    website: str,
+    industry: str,
+    status: str,
+    responses: List[Dict[str, Any]],
+    failed_prompts: List[str],
+    request_hash: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> UUID:
+    analysis_id = uuid4()
+
+    db.execute(
+        insert(EsgAnalysis),
+        [{
+            "id": analysis_id,
+            "organization_name": organization_name,
+            "country": country,
+            "website": website,
+            "industry": industry,
+            "status": status,
+            "failed_prompts": failed_prompts,
+            "completed_at": datetime.now(timezone.utc),
+            "request_hash": request_hash,
+            "idempotency_key": idempotency_key,
+        }],
+    )
+
+    steps = [
+        {
+            "analysis_id": analysis_id,
+            "position": position,
+            "name": r.get("name", f"step_{position}"),
+            "thread_id": r.get("thread_id"),
+            "response_content": r.get("response_content") or {},
+        }
+        for position, r in enumerate(responses)
+    ]
+    if steps:
+        db.execute(insert(EsgAnalysisStep), steps)
+
+    db.commit()
+    return analysis_id
+
+
+# ==========================================================
+# 📖 Lectura
+# ==========================================================
+def _summary(a: EsgAnalysis) -> Dict[str, Any]:
+    return {
+        "id": str(a.id),
+        "organization_name": a.organization_name,
+        "country": a.country,
+        "website": a.website,
+        "industry": a.industry,
+        "status": a.status,
+        "failed_prompts": a.failed_prompts,
+        "created_at": a.created_at.isoformat() if a.created_at else None,
+        "completed_at": a.completed_at.isoformat() if a.completed_at else None,
+    }
+
+
+def get_analysis(db: Session, analysis_id: UUID) -> Optional[Dict[str, Any]]:
+    """Devuelve el análisis con todos sus pasos en una sola consulta (JOIN)."""
+    analysis = db.execute(
+        select(EsgAnalysis)
+        .options(joinedload(EsgAnalysis.steps))
+        .where(EsgAnalysis.id == analysis_id)
+    ).unique().scalar_one_or_none()
+
+    if analysis is None:
+        return None
+
+    return {
+        **_summary(analysis),
+        "analysis_json": [
+            {
+                "name": s.name,
+                "response_content": s.response_content,
+                "thread_id": s.thread_id,
+            }
+            for s in analysis.steps
+        ],
+    }
+
+
+def find_reusable(
+    db: Session,
+    request_hash: str,
+    idempotency_key: Optional[str],
+    window_s: float,
+    key_ttl_s: float,
+) -> Optional[Tuple[UUID, Optional[str]]]:
+    """
+    Análisis guardado que se puede devolver en vez de correr otro:
+    - con Idempotency-Key: el último con esa key dentro de `key_ttl_s`
+      (salvo "failed" / cortado, que se puede reintentar con la misma key);
+    - sin key: el último "complete" con el mismo hash dentro de `window_s`.
+
+    Devuelve (id, request_hash guardado) o None.
+    """
+    now = datetime.now(timezone.utc)
+    query = select(EsgAnalysis.id, EsgAnalysis.request_hash)
+    if idempotency_key:
+        query = query.where(
+            EsgAnalysis.idempotency_key == idempotency_key,
+            EsgAnalysis.created_at > now - timedelta(seconds=key_ttl_s),
+            EsgAnalysis.status.notin_(("failed", "cancelled", "deadline_exceeded", "budget_exceeded")),
+        )
+    else:
+        query = query.where(
+            EsgAnalysis.request_hash == request_hash,
+            EsgAnalysis.created_at > now - timedelta(seconds=window_s),
+            EsgAnalysis.status == "complete",
+        )
+    row = db.execute(query.order_by(EsgAnalysis.created_at.desc()).limit(1)).first()
+    return (row.id, row.request_hash) if row else None
+
+
+def encode_cursor(created_at: datetime, analysis_id: UUID) -> str:
+    raw = f"{created_at.isoformat()}|{analysis_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        created_at, analysis_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(analysis_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def list_analyses(
+    db: Session,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    organization_name: Optional[str] = None,
+    industry: Optional[str] = None,
+    status: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Paginación por cursor sobre (created_at, id): cada página es un index
+    scan acotado, sin OFFSET, así que el costo no crece con la tabla.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = select(
+        EsgAnalysis.id,
+        EsgAnalysis.organization_name,
+        EsgAnalysis.country,
+        EsgAnalysis.website,
+        EsgAnalysis.industry,
+        EsgAnalysis.status,
+        EsgAnalysis.failed_prompts,
+        EsgAnalysis.created_at,
+        EsgAnalysis.completed_at,
+    )
+
+    filters = []
+    if organization_name:
+        filters.append(EsgAnalysis.organization_name == organization_name)
+    if industry:
+        filters.append(EsgAnalysis.industry == industry)
+    if status:
+        filters.append(EsgAnalysis.status == status)
+    if cursor:
+        created_at, analysis_id = decode_cursor(cursor)
+        filters.append(
+            tuple_(EsgAnalysis.created_at, EsgAnalysis.id) < tuple_(created_at, analysis_id)
+        )
+    if filters:
+        query = query.where(and_(*filters))
+
+    rows = db.execute(
+        query.order_by(EsgAnalysis.created_at.desc(), EsgAnalysis.id.desc()).limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "items": [_summary(r) for r in rows],
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+    }
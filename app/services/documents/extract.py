@@ -0,0 +1,204 @@
+"""
+Extracción de texto de documentos subidos (PDF, DOCX, HTML, texto plano).
+
+El parseo es CPU-bound y puede ser lento con reportes de cientos de
+páginas, así que corre en un pool de procesos (no bloquea el event loop
+ni compite con el GIL de los workers). Límites de páginas y caracteres
+para que un archivo malicioso o gigante no acapare el pool.
+
+PDF requiere `pypdf` (opcional); DOCX y HTML usan solo la stdlib.
+"""
+
+import asyncio
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Any, Dict, Optional
+from xml.etree import ElementTree
+
+from app.core.config import settings
+
+DOCX_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# Tamaño máximo descomprimido de word/document.xml (protege de zip bombs)
+DOCX_MAX_XML_BYTES = 200 * 1024 * 1024
+
+
+class UnsupportedDocument(ValueError):
+    """Formato no soportado, archivo corrupto o dependencia opcional ausente."""
+
+
+# ==========================================================
+# 🔎 Detección de formato
+# ==========================================================
+def detect_kind(head: bytes, filename: str = "") -> str:
+    name = (filename or "").lower()
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        if name.endswith(".docx") or not name:
+            return "docx"
+        raise UnsupportedDocument(f"Archivo comprimido no soportado: {filename}")
+    sample = head[:2048].lower()
+    if name.endswith((".html", ".htm")) or b"<html" in sample or b"<!doctype html" in sample:
+        return "html"
+    return "text"
+
+
+# ==========================================================
+# 📄 Extractores (se ejecutan dentro del proceso del pool)
+# ==========================================================
+def _extract_pdf(path: str, max_pages: int) -> Dict[str, Any]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise UnsupportedDocument("Extraer PDF requiere `pypdf` (pip install pypdf)")
+
+    try:
+        reader = PdfReader(path)
+        total = len(reader.pages)
+        pages = []
+        for page in reader.pages[:max_pages]:
+            pages.append(page.extract_text() or "")
+    except Exception as e:
+        raise UnsupportedDocument(f"PDF ilegible: {e}")
+    return {"text": "\n\n".join(pages), "pages": total, "truncated": total > max_pages}
+
+
+def _extract_docx(path: str, max_pages: int) -> Dict[str, Any]:
+    try:
+        with zipfile.ZipFile(path) as z:
+            info = z.getinfo("word/document.xml")
+            if info.file_size > DOCX_MAX_XML_BYTES:
+                raise UnsupportedDocument("DOCX demasiado grande al descomprimir")
+            with z.open(info) as xml:
+                paragraphs = []
+                current = []
+                page = 1
+                truncated = False
+                for event, el in ElementTree.iterparse(xml, events=("end",)):
+                    if el.tag == DOCX_NS + "t" and el.text:
+                        current.append(el.text)
+                    elif el.tag == DOCX_NS + "tab":
+                        current.append("\t")
+                    elif el.tag == DOCX_NS + "br" and el.get(DOCX_NS + "type") == "page":
+                        page += 1
+                    elif el.tag == DOCX_NS + "p":
+                        paragraphs.append("".join(current))
+                        current = []
+                        el.clear()
+                    if page > max_pages:
+                        truncated = True
+                        break
+    except (KeyError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        raise UnsupportedDocument(f"DOCX ilegible: {e}")
+    return {"text": "\n\n".join(p for p in paragraphs if p.strip()), "pages": page, "truncated": truncated}
+
+
+class _HTMLText(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+    BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "table"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag in self.BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+
+def _read_text(path: str) -> str:
+    with open(path, "rb") as f:
+        data = f.read()
+    for encoding in ("utf-8", "cp1252"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def _extract_html(path: str, max_pages: int) -> Dict[str, Any]:
+    parser = _HTMLText()
+    parser.feed(_read_text(path))
+    parser.close()
+    text = re.sub(r"\n\s*\n\s*", "\n\n", "".join(parser.parts))
+    return {"text": text.strip(), "pages": None, "truncated": False}
+
+
+def _extract_plain(path: str, max_pages: int) -> Dict[str, Any]:
+    return {"text": _read_text(path), "pages": None, "truncated": False}
+
+
+EXTRACTORS = {
+    "pdf": _extract_pdf,
+    "docx": _extract_docx,
+    "html": _extract_html,
+    "text": _extract_plain,
+}
+
+
+def extract_text(path: str, kind: str, max_pages: int, max_chars: int) -> Dict[str, Any]:
+    """Punto de entrada del proceso hijo: {text, pages, truncated, kind}."""
+    result = EXTRACTORS[kind](path, max_pages)
+    if len(result["text"]) > max_chars:
+        result["text"] = result["text"][:max_chars]
+        result["truncated"] = True
+    result["kind"] = kind
+    return result
+
+
+# ==========================================================
+# 🏭 Pool de procesos (perezoso; se cierra en el lifespan)
+# ==========================================================
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.ESG_EXTRACT_WORKERS)
+    return _pool
+
+
+def shutdown_pool(kill: bool = False):
+    global _pool
+    if _pool is not None:
+        if kill:
+            # Un worker colgado no termina con shutdown(): se le corta a mano
+            for process in list((_pool._processes or {}).values()):
+                process.terminate()
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def extract_in_pool(path: str, kind: str) -> Dict[str, Any]:
+    """Extrae en el pool con timeout; un pool roto (worker muerto) se recrea."""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        get_pool(), extract_text, path, kind,
+        settings.ESG_EXTRACT_MAX_PAGES, settings.ESG_EXTRACT_MAX_CHARS,
+    )
+    try:
+        return await asyncio.wait_for(future, timeout=settings.ESG_EXTRACT_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        # El proceso sigue ocupado: se descarta el pool para no encolar detrás de él
+        print(f"⏱️ Extracción de {kind} superó {settings.ESG_EXTRACT_TIMEOUT_S}s → reciclando pool")
+        shutdown_pool(kill=True)
+        raise UnsupportedDocument("La extracción de texto tardó demasiado")
+    except BrokenProcessPool:
+        shutdown_pool(kill=True)
+        raise UnsupportedDocument("El proceso de extracción terminó inesperadamente")
@@ -0,0 +1,252 @@
+"""
+Preprocesamiento del documento adjunto antes del Prompt 1.
+
+`AnalysisRequest.document` puede ser un reporte de cientos de páginas. En
+lugar de interpolarlo completo en el prompt (y reenviarlo en cada
+reintento), aquí se normaliza, se eliminan encabezados/pies repetidos y
+párrafos duplicados, se divide en chunks y se eligen localmente (BM25)
+los pasajes más relevantes para cada campo del Prompt 1, dentro de un
+presupuesto de tokens. El resultado se cachea por hash del documento.
+"""
+
+import hashlib
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Subir al cambiar la lógica de selección (invalida el cache)
+PREPROCESS_VERSION = "1"
+
+# Palabras clave por campo del Prompt 1 (español + inglés de reportes bilingües)
+FIELD_QUERIES: Dict[str, str] = {
+    "nombre_empresa": "empresa compañía razón social grupo sociedad company",
+    "pais_operacion": "país operaciones opera presencia mercados sucursales country operations",
+    "industria": "industria sector rubro actividad económica industry sector",
+    "tamano_empresa": "colaboradores empleados trabajadores dotación ventas ingresos facturación activos employees revenue",
+    "ubicacion_geografica": "sede oficinas plantas ubicación regiones ciudades instalaciones headquarters locations",
+    "modelo_negocio": "modelo negocio clientes productos servicios propuesta valor segmentos business model",
+    "cadena_valor": "cadena valor proveedores abastecimiento distribución logística insumos supply chain",
+    "actividades_principales": "actividades principales procesos producción operaciones servicios activities",
+    "madurez_esg": "sostenibilidad ESG estrategia política emisiones gobierno corporativo certificación GRI SASB reporte",
+    "stakeholders_relevantes": "grupos interés stakeholders comunidades inversionistas reguladores colaboradores clientes",
+}
+
+STOPWORDS = set(
+    "de la el los las un una unos unas y o en del al por para con sin sobre entre su sus se que es son "
+    "como más mas este esta estos estas ese esa lo le les ya no si the of and to in for on with by a an".split()
+)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PAGE_NUMBER = re.compile(r"^(p[aá]gina|page)?\s*\d{1,4}(\s*(de|/|of)\s*\d{1,4})?$", re.IGNORECASE)
+
+
+# ==========================================================
+# 🧹 Normalización y deduplicación
+# ==========================================================
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in _WORD.findall(_fold(text)) if len(w) > 2 and w not in STOPWORDS]
+
+
+def normalize_text(text: str) -> str:
+    """
+    NFKC, une palabras cortadas con guion al final de línea, quita números
+    de página y deja una sola vez las líneas que se repiten muchas veces
+    (encabezados y pies).
+    """
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"[ \t ]+", " ", text)
+
+    lines = [line.strip() for line in text.split("\n")]
+    counts = Counter(line for line in lines if line and len(line) < 120)
+    repeated = {line for line, n in counts.items() if n >= 3}
+
+    kept = []
+    seen = set()
+    for line in lines:
+        if _PAGE_NUMBER.match(line) or line in seen:
+            continue
+        if line in repeated:
+            seen.add(line)
+        kept.append(line)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+
+
+def paragraphs(text: str) -> List[str]:
+    """Párrafos únicos (comparando texto plegado), en orden de aparición."""
+    seen = set()
+    unique = []
+    for block in re.split(r"\n\s*\n", text):
+        block = re.sub(r"\s*\n\s*", " ", block).strip()
+        key = " ".join(tokenize(block))
+        if not block or not key or key in seen:
+            continue
+        seen.add(key)
+        unique.append(block)
+    return unique
+
+
+def chunk(blocks: List[str], max_chars: int) -> List[str]:
+    """Agrupa párrafos consecutivos en chunks de hasta `max_chars` (los largos se cortan)."""
+    chunks: List[str] = []
+    current = ""
+    for block in blocks:
+        while len(block) > max_chars:
+            cut = block.rfind(". ", 0, max_chars)
+            cut = cut + 1 if cut > max_chars // 2 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(block[:cut].strip())
+            block = block[cut:].strip()
+        if current and len(current) + len(block) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{block}" if current else block
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ==========================================================
+# 🔎 BM25
+# ==========================================================
+class BM25:
+    def __init__(self, docs: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.docs = [Counter(d) for d in docs]
+        self.lengths = [len(d) for d in docs]
+        self.avg = (sum(self.lengths) / len(docs)) if docs else 0.0
+        self.k1, self.b = k1, b
+        df = Counter(term for d in self.docs for term in d)
+        n = len(docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        result = []
+        for tf, length in zip(self.docs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg or 1))
+            result.append(sum(
+                self.idf.get(t, 0.0) * tf[t] * (self.k1 + 1) / (tf[t] + norm)
+                for t in query if t in tf
+            ))
+        return result
+
+
+# ==========================================================
+# ✂️ Selección de pasajes por campo
+# ==========================================================
+@dataclass
+class PreparedDocument:
+    text: str
+    digest: str
+    chars_in: int
+    chunks: int = 0
+    selected: int = 0
+    cached: bool = False
+    fields: Dict[str, List[int]] = field(default_factory=dict)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "hash": self.digest,
+            "chars_in": self.chars_in,
+            "chars_out": len(self.text),
+            "chunks": self.chunks,
+            "selected": self.selected,
+            "cached": self.cached,
+        }
+
+
+def document_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def select_passages(chunks: List[str], budget_chars: int, per_field: int) -> Tuple[List[int], Dict[str, List[int]]]:
+    """
+    Elige chunks por ronda: primero el mejor de cada campo, luego el segundo,
+    etc., hasta llenar el presupuesto. Devuelve índices en orden del documento.
+    """
+    index = BM25([tokenize(c) for c in chunks])
+    ranked = {
+        name: [i for s, i in sorted(((s, i) for i, s in enumerate(index.scores(tokenize(q)))), reverse=True) if s > 0]
+        for name, q in FIELD_QUERIES.items()
+    }
+
+    chosen: List[int] = []
+    by_field: Dict[str, List[int]] = {name: [] for name in FIELD_QUERIES}
+    used = 0
+    for rank in range(per_field):
+        for name, order in ranked.items():
+            if rank >= len(order):
+                continue
+            i = order[rank]
+            by_field[name].append(i)
+            if i in chosen or used + len(chunks[i]) > budget_chars:
+                continue
+            chosen.append(i)
+            used += len(chunks[i])
+
+    # Sin coincidencias (documento muy corto o en otro idioma): el comienzo
+    if not chosen:
+        for i, c in enumerate(chunks):
+            if used + len(c) > budget_chars:
+                break
+            chosen.append(i)
+            used += len(c)
+    return sorted(chosen), by_field
+
+
+def _build_excerpt(chunks: List[str], chosen: List[int], by_field: Dict[str, List[int]]) -> str:
+    parts = []
+    for i in chosen:
+        fields = [name for name, idx in by_field.items() if i in idx]
+        label = f" ({', '.join(fields)})" if fields else ""
+        parts.append(f"[Extracto {i + 1}/{len(chunks)}{label}]\n{chunks[i]}")
+    return "\n\n".join(parts)
+
+
+_cache: "OrderedDict[str, PreparedDocument]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def prepare_document(document: Optional[str]) -> PreparedDocument:
+    """
+    Devuelve un extracto acotado del documento para el Prompt 1. Documentos
+    que ya entran en el presupuesto solo se normalizan. Cacheado por hash.
+    """
+    raw = document or ""
+    budget_chars = settings.ESG_DOCUMENT_BUDGET_TOKENS * 4
+    digest = document_hash(f"{PREPROCESS_VERSION}|{budget_chars}|{raw}")
+
+    with _cache_lock:
+        hit = _cache.get(digest)
+        if hit is not None:
+            _cache.move_to_end(digest)
+            return PreparedDocument(**{**hit.__dict__, "cached": True})
+
+    text = normalize_text(raw)
+    prepared = PreparedDocument(text=text, digest=digest[:16], chars_in=len(raw))
+
+    if len(text) > budget_chars:
+        chunks = chunk(paragraphs(text), settings.ESG_DOCUMENT_CHUNK_CHARS)
+        chosen, by_field = select_passages(chunks, budget_chars, settings.ESG_DOCUMENT_PASSAGES_PER_FIELD)
+        prepared.text = _build_excerpt(chunks, chosen, by_field)
+        prepared.chunks = len(chunks)
+        prepared.selected = len(chosen)
+        prepared.fields = {k: v for k, v in by_field.items() if v}
+
+    with _cache_lock:
+        _cache[digest] = prepared
+        while len(_cache) > settings.ESG_DOCUMENT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return prepared
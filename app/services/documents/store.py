@@ -0,0 +1,208 @@
+"""
+Documentos subidos: recepción en streaming, extracción y almacenamiento
+por hash de contenido.
+
+El cuerpo multipart se parsea a medida que llega (`request.stream()`) y
+el archivo se escribe a disco por chunks mientras se calcula su sha256:
+nunca está completo en memoria y el límite de tamaño corta la subida a
+mitad de camino. El texto extraído queda en `ESG_DOCUMENTS_DIR/<id>.txt`
+(con `<id>.json` de metadatos) y el id es el sha256 del archivo, así que
+subir dos veces el mismo reporte no vuelve a extraerlo.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+
+from app.core.config import settings
+from app.services.documents.extract import detect_kind, extract_in_pool
+
+DOCUMENT_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(ValueError):
+    """Subida inválida (sin archivo, multipart mal formado)."""
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+# ==========================================================
+# 📁 Rutas
+# ==========================================================
+def documents_dir() -> str:
+    path = settings.ESG_DOCUMENTS_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _paths(document_id: str):
+    if not DOCUMENT_ID.match(document_id or ""):
+        raise KeyError(document_id)
+    base = os.path.join(documents_dir(), document_id)
+    return base + ".txt", base + ".json"
+
+
+def get_metadata(document_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        _, meta_path = _paths(document_id)
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (KeyError, FileNotFoundError):
+        return None
+
+
+def load_text(document_id: str) -> Optional[str]:
+    """Texto extraído del documento `document_id`, o None si no existe."""
+    try:
+        text_path, _ = _paths(document_id)
+        with open(text_path, encoding="utf-8") as f:
+            return f.read()
+    except (KeyError, FileNotFoundError):
+        return None
+
+
+# ==========================================================
+# 📥 Recepción multipart en streaming
+# ==========================================================
+class _FilePart:
+    """Estado del parser: escribe a disco la primera parte con filename."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.header_field = b""
+        self.header_value = b""
+        self.headers: Dict[bytes, bytes] = {}
+        self.file = None
+        self.done = False
+        self.filename = ""
+        self.content_type = ""
+        self.size = 0
+        self.head = b""
+        self.sha = hashlib.sha256()
+
+    # Callbacks de python-multipart
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data, start, end):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        if filename is not None and self.file is None and not self.done:
+            self.filename = os.path.basename(filename.decode("utf-8", "replace"))
+            self.content_type = self.headers.get(b"content-type", b"").decode("latin-1")
+            self.file = tempfile.NamedTemporaryFile(dir=self.directory, suffix=".upload", delete=False)
+
+    def on_part_data(self, data, start, end):
+        if self.file is None:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"El archivo supera {self.max_bytes} bytes")
+        if len(self.head) < 4096:
+            self.head += chunk[:4096 - len(self.head)]
+        self.sha.update(chunk)
+        self.file.write(chunk)
+
+    def on_part_end(self):
+        if self.file is not None:
+            self.file.close()
+            self.done = True
+
+    def callbacks(self):
+        return {
+            name: getattr(self, name)
+            for name in (
+                "on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+                "on_headers_finished", "on_part_data", "on_part_end",
+            )
+        }
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            try:
+                os.unlink(self.file.name)
+            except FileNotFoundError:
+                pass
+
+
+async def receive_upload(content_type: str, body: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """
+    Consume el cuerpo multipart, guarda el archivo, extrae el texto en el
+    pool de procesos y devuelve los metadatos (incluido `document_id`).
+    """
+    mime, options = parse_options_header(content_type or "")
+    boundary = options.get(b"boundary")
+    if mime != b"multipart/form-data" or not boundary:
+        raise UploadError("Se esperaba multipart/form-data con un archivo")
+
+    directory = documents_dir()
+    part = _FilePart(directory, settings.ESG_UPLOAD_MAX_BYTES)
+    parser = MultipartParser(boundary, part.callbacks())
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+        parser.finalize()
+        if not part.done:
+            raise UploadError("No se recibió ningún archivo")
+    except Exception:
+        part.discard()
+        raise
+
+    document_id = part.sha.hexdigest()
+    text_path, meta_path = _paths(document_id)
+    try:
+        existing = get_metadata(document_id)
+        if existing is not None and os.path.exists(text_path):
+            print(f"📄 Documento {document_id[:12]} ya extraído → reutilizando")
+            return {**existing, "cached": True}
+
+        kind = detect_kind(part.head, part.filename)
+        started = time.perf_counter()
+        extracted = await extract_in_pool(part.file.name, kind)
+        elapsed = time.perf_counter() - started
+    finally:
+        part.discard()
+
+    meta = {
+        "document_id": document_id,
+        "filename": part.filename,
+        "content_type": part.content_type,
+        "kind": extracted["kind"],
+        "bytes": part.size,
+        "pages": extracted["pages"],
+        "chars": len(extracted["text"]),
+        "truncated": extracted["truncated"],
+        "extract_seconds": round(elapsed, 3),
+    }
+
+    # Escritura atómica: primero el texto, al final los metadatos (marcan "listo")
+    for path, content in ((text_path, extracted["text"]), (meta_path, json.dumps(meta, ensure_ascii=False))):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    print(f"📄 Documento {document_id[:12]} ({kind}, {part.size} bytes) → {meta['chars']} caracteres en {elapsed:.2f}s")
+    return {**meta, "cached": False}
@@ -0,0 +1,266 @@
+"""
+Idempotencia y deduplicación de solicitudes de análisis.
+
+Un doble click, el reintento de un cliente tras un timeout del proxy o un
+script batch mandan la misma solicitud varias veces; cada una lanzaría
+los 11 prompts. Cada solicitud se identifica por:
+
+- `Idempotency-Key` (header), si el cliente la manda. La misma key con
+  otro cuerpo es un error (`IdempotencyConflict` → 422).
+- Si no, el hash canónico del cuerpo (`request_hash`): campos normalizados,
+  sha256 del documento y versiones de los prompts.
+
+Tres niveles, del más barato al más caro:
+1. En curso en este proceso → se espera la misma tarea (`coalesce`).
+2. En curso en otro nodo → advisory lock de Postgres por clave: quien lo
+   tiene corre el análisis; los demás esperan (sondeando con
+   `pg_try_advisory_lock`, así el statement_timeout no corta la espera) y
+   luego leen el resultado guardado. El lock se pide recién con lugar en
+   la cola de admisión y su conexión sale de un engine sin pool
+   (`get_lock_engine`): las corridas encoladas no retienen conexiones del
+   pool que necesita el guardado.
+3. Ya terminado → se devuelve el análisis guardado (`find_reusable`).
+
+Si la base no responde, el análisis corre igual (solo con el nivel 1).
+"""
+
+import asyncio
+import hashlib
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# Cambiar si cambia la forma canónica (invalida los hashes guardados)
+HASH_VERSION = 1
+
+
+class IdempotencyConflict(ValueError):
+    """La misma Idempotency-Key se usó con otra solicitud."""
+
+
+# ==========================================================
+# 🔑 Hash canónico
+# ==========================================================
+def _norm(value: Optional[str]) -> str:
+    return re.sub(r"\s+", " ", (value or "").strip()).casefold()
+
+
+def _norm_website(value: Optional[str]) -> str:
+    website = _norm(value)
+    website = re.sub(r"^https?://", "", website)
+    website = re.sub(r"^www\.", "", website)
+    return website.rstrip("/")
+
+
+def request_hash(organization_name: str, country: str, website: str, industry: str, document: str) -> str:
+    """sha256 de la solicitud normalizada; mismo hash ⇒ mismo análisis."""
+    from app.services.langchain import prompt_registry
+
+    canonical = {
+        "v": HASH_VERSION,
+        "organization_name": _norm(organization_name),
+        "country": _norm(country),
+        "website": _norm_website(website),
+        "industry": _norm(industry),
+        "document": hashlib.sha256(document.encode("utf-8")).hexdigest() if document else None,
+        # Un prompt editado produce otro análisis: no se reutiliza el anterior
+        "prompts": prompt_registry.versions(),
+    }
+    return hashlib.sha256(orjson.dumps(canonical, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def check_key(idempotency_key: Optional[str]) -> Optional[str]:
+    if idempotency_key is None:
+        return None
+    key = idempotency_key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"{IDEMPOTENCY_HEADER} debe tener entre 1 y {MAX_KEY_LENGTH} caracteres")
+    return key
+
+
+def dedup_key(scope: str, req_hash: str, idempotency_key: Optional[str]) -> str:
+    return f"{scope}:key:{idempotency_key}" if idempotency_key else f"{scope}:hash:{req_hash}"
+
+
+def lock_id(key: str) -> int:
+    """bigint con signo para pg_advisory_lock."""
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+# ==========================================================
+# ⏳ Nivel 1: en curso en este proceso
+# ==========================================================
+# clave → (request_hash, tarea)
+_inflight: Dict[str, Tuple[str, "asyncio.Task"]] = {}
+
+
+def inflight_count() -> int:
+    return len(_inflight)
+
+
+async def coalesce(key: str, req_hash: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+    """
+    Corre `factory()` una sola vez por clave; los duplicados concurrentes
+    esperan la misma tarea. Devuelve (resultado, se_unió_a_una_en_curso).
+
+    La tarea no se cancela si el cliente que la inició se desconecta: los
+    demás (y el guardado del resultado) dependen de ella.
+    """
+    entry = _inflight.get(key)
+    if entry is not None:
+        if entry[0] != req_hash:
+            raise IdempotencyConflict(f"{IDEMPOTENCY_HEADER} ya usada con otra solicitud")
+        return await asyncio.shield(entry[1]), True
+
+    task = asyncio.create_task(factory())
+    _inflight[key] = (req_hash, task)
+
+    def _done(_):
+        if _inflight.get(key, (None, None))[1] is task:
+            del _inflight[key]
+
+    task.add_done_callback(_done)
+    return await asyncio.shield(task), False
+
+
+# ==========================================================
+# 🔒 Nivel 2: advisory lock entre nodos
+# ==========================================================
+def _try_lock(conn, lock: int) -> bool:
+    from sqlalchemy import text
+
+    acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": lock}).scalar())
+    # El lock es de sesión: no hace falta dejar la transacción abierta mientras corre el análisis
+    conn.commit()
+    return acquired
+
+
+def _unlock(conn, lock: int):
+    from sqlalchemy import text
+
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": lock})
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        # Si no se pudo liberar, se descarta la conexión: cerrarla libera el lock
+        print(f"⚠️ No se pudo liberar el advisory lock: {e}")
+        conn.invalidate()
+
+
+async def _acquire(key: str):
+    """Conexión que tiene el lock de `key`, o None (base caída o espera agotada)."""
+    from app.core.database import get_lock_engine
+
+    lock = lock_id(key)
+    try:
+        conn = await run_in_threadpool(get_lock_engine().connect)
+    except Exception as e:
+        print(f"⚠️ Deduplicación sin lock entre nodos (base no disponible): {e}")
+        return None
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.ESG_DEDUP_LOCK_WAIT_S
+    waited = False
+    try:
+        while True:
+            if await run_in_threadpool(_try_lock, conn, lock):
+                if waited:
+                    print(f"🔓 Lock de deduplicación obtenido tras esperar a otro nodo ({key[:40]})")
+                return conn, lock
+            if loop.time() >= deadline:
+                print(f"⚠️ Espera del lock de deduplicación agotada; se corre igual ({key[:40]})")
+                break
+            waited = True
+            await asyncio.sleep(settings.ESG_DEDUP_LOCK_POLL_S)
+    except Exception as e:
+        print(f"⚠️ Deduplicación sin lock entre nodos: {e}")
+    await run_in_threadpool(conn.close)
+    return None
+
+
+# ==========================================================
+# 💾 Nivel 3: resultado guardado
+# ==========================================================
+def _find_stored(req_hash: str, idempotency_key: Optional[str]) -> Optional[Dict[str, Any]]:
+    from app.core.database import SessionLocal, get_engine
+    from app.services.analysis_store import find_reusable, get_analysis
+
+    db = SessionLocal(bind=get_engine())
+    try:
+        found = find_reusable(
+            db, req_hash, idempotency_key,
+            window_s=settings.ESG_DEDUP_WINDOW_S,
+            key_ttl_s=settings.ESG_IDEMPOTENCY_TTL_S,
+        )
+        if found is None:
+            return None
+        analysis_id, stored_hash = found
+        if idempotency_key and stored_hash and stored_hash != req_hash:
+            raise IdempotencyConflict(f"{IDEMPOTENCY_HEADER} ya usada con otra solicitud")
+        return get_analysis(db, analysis_id)
+    finally:
+        db.close()
+
+
+async def _lookup(req_hash: str, idempotency_key: Optional[str]) -> Optional[Dict[str, Any]]:
+    try:
+        return await run_in_threadpool(_find_stored, req_hash, idempotency_key)
+    except IdempotencyConflict:
+        raise
+    except Exception as e:
+        print(f"⚠️ No se pudo buscar un análisis previo: {e}")
+        return None
+
+
+async def run_once(
+    scope: str,
+    req_hash: str,
+    idempotency_key: Optional[str],
+    run: Callable[[Callable[[Callable[[], Awaitable[Any]]], Awaitable[Any]]], Awaitable[Any]],
+    replay: Callable[[Dict[str, Any]], Any],
+) -> Tuple[Any, Optional[str]]:
+    """
+    Corre el análisis salvo que la misma solicitud esté en curso (aquí o en
+    otro nodo) o ya guardada; en ese caso devuelve `replay(análisis)`.
+    Devuelve (resultado, origen) con origen None | "in-flight" | "stored".
+
+    `run(guarded)` hace la admisión y, ya con lugar, llama
+    `await guarded(analyze)`: ahí se toma el lock entre nodos y se vuelve
+    a buscar un resultado guardado antes de correr `analyze()`.
+    """
+    key = dedup_key(scope, req_hash, idempotency_key)
+    origin: Optional[str] = None
+
+    async def guarded(analyze: Callable[[], Awaitable[Any]]):
+        nonlocal origin
+        held = await _acquire(key)
+        try:
+            # Otro nodo pudo terminarlo mientras se esperaba el lock
+            stored = await _lookup(req_hash, idempotency_key)
+            if stored is not None:
+                origin = "stored"
+                return replay(stored)
+            return await analyze()
+        finally:
+            if held is not None:
+                await run_in_threadpool(_unlock, *held)
+
+    async def once():
+        nonlocal origin
+        # Ya guardado: se devuelve sin pasar por la cola de admisión
+        stored = await _lookup(req_hash, idempotency_key)
+        if stored is not None:
+            origin = "stored"
+            return replay(stored)
+        return await run(guarded)
+
+    result, joined = await coalesce(key, req_hash, once)
+    return result, "in-flight" if joined else origin
@@ -0,0 +1,130 @@
+"""
+Backends de ejecución de runs.
+
+`invoke_once` no habla con OpenAI directamente: le pide al backend de la
+ruta del paso (routing.py) que ejecute el run. Todo backend devuelve la
+misma forma que `ainvoke` de LangChain — `[msg]` con `.thread_id`,
+`.run_id` y `.content[0].text.value` — y, si lo sabe, `.usage`
+(`prompt_tokens` / `completion_tokens`) y `.model` para costs.py.
+
+- "openai": Assistants API vía el registro de clients.py.
+- "local": stand-in sin red para pruebas y benchmarks. Responde con un
+  `responder(step, params) -> texto` y una latencia simulada por modelo,
+  así se puede correr el pipeline completo offline y comparar rutas.
+
+Otros backends se agregan con `register_backend`.
+"""
+
+import asyncio
+import itertools
+import uuid
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.langchain.routing import StepRoute
+from app.services.langchain.truncation import PartialMessage, fetch_partial, incomplete_run
+
+
+class Backend(ABC):
+    name = "base"
+
+    @abstractmethod
+    async def invoke(self, step: str, route: StepRoute, params: Dict[str, Any]) -> List[Any]:
+        """Ejecuta un run del paso y devuelve `[msg]` (ver docstring del módulo)."""
+
+    async def stream(
+        self, step: str, route: StepRoute, params: Dict[str, Any], on_text: Callable[[str], None]
+    ) -> List[Any]:
+        """Por defecto sin streaming real: el texto completo llega de una vez."""
+        result = await self.invoke(step, route, params)
+        on_text(result[0].content[0].text.value)
+        return result
+
+
+# ==========================================================
+# ☁️ Assistants API
+# ==========================================================
+class AssistantsBackend(Backend):
+    name = "openai"
+
+    async def invoke(self, step, route, params):
+        from app.services.langchain.clients import get_registry
+
+        handle = get_registry().get(route.assistant)
+        try:
+            return await handle.ainvoke(params, route, step)
+        except ValueError as e:
+            # Run cortado por límite de tokens: se devuelve lo que alcanzó a generar
+            info = incomplete_run(e)
+            if not info or not info["thread_id"]:
+                raise
+            print(f"✂️ Run incompleto ({info['reason']}) → recuperando salida parcial")
+            return await fetch_partial(get_registry().async_client, info)
+
+    async def stream(self, step, route, params, on_text):
+        from app.services.langchain.clients import get_registry
+
+        return await get_registry().get(route.assistant).astream(params, on_text, route, step)
+
+
+# ==========================================================
+# 🧪 Stand-in local
+# ==========================================================
+class LocalBackend(Backend):
+    name = "local"
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[str, Dict[str, Any]], str]] = None,
+        latency_s: Optional[Dict[str, float]] = None,
+    ):
+        # Sin responder, JSON vacío: el pipeline lo trata como salida inválida
+        self.responder = responder or (lambda step, params: "{}")
+        # Latencia simulada por modelo ("*" = cualquier otro)
+        self.latency_s = dict(latency_s or {})
+        self._runs = itertools.count(1)
+
+    async def invoke(self, step, route, params):
+        from app.services.langchain.prompt_registry import count_tokens
+
+        model = params.get("model") or route.model or settings.ESG_DEFAULT_MODEL
+        delay = self.latency_s.get(model, self.latency_s.get("*", 0.0))
+        if delay:
+            await asyncio.sleep(delay)
+        text = self.responder(step, params)
+        if route.max_output_tokens and count_tokens(text) > route.max_output_tokens:
+            # Como la API: se corta en el tope y el run queda incompleto
+            text = text[: route.max_output_tokens * 4]
+            reason = "max_completion_tokens"
+        else:
+            reason = None
+        usage = SimpleNamespace(prompt_tokens=count_tokens(params.get("content", "")), completion_tokens=count_tokens(text))
+        thread_id = params.get("thread_id") or f"local_{uuid.uuid4().hex[:12]}"
+        return [PartialMessage(thread_id, f"local_run_{next(self._runs)}", text, reason, usage, model)]
+
+
+# ==========================================================
+# 🗂️ Registro
+# ==========================================================
+_backends: Dict[str, Backend] = {}
+FACTORIES: Dict[str, Callable[[], Backend]] = {
+    "openai": AssistantsBackend,
+    "local": LocalBackend,
+}
+
+
+def register_backend(backend: Backend, name: Optional[str] = None):
+    """Registra (o reemplaza) un backend; p. ej. un LocalBackend con respuestas fijas en pruebas."""
+    _backends[name or backend.name] = backend
+
+
+def get_backend(name: Optional[str] = None) -> Backend:
+    name = name or settings.ESG_BACKEND
+    backend = _backends.get(name)
+    if backend is None:
+        if name not in FACTORIES:
+            raise ValueError(f"Backend desconocido: {name!r} (disponibles: {', '.join(sorted(FACTORIES))})")
+        backend = _backends[name] = FACTORIES[name]()
+    return backend
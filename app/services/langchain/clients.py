@@ -0,0 +1,306 @@
+"""
+Registro de clientes del Assistants API.
+
+Un único pool HTTP (keep-alive, HTTP/2 si `h2` está instalado) compartido
+por todos los asistentes. Cada asistente tiene su propia configuración de
+tools, vector stores y archivos. El registro se crea en el lifespan de la
+app y se cierra al apagar el worker; los clientes se construyen en el
+primer uso para no penalizar el cold start.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.config import Settings, settings
+
+
+# ==========================================================
+# ⚙️ Configuración por asistente
+# ==========================================================
+@dataclass(frozen=True)
+class AssistantConfig:
+    assistant_id: str
+    tools: List[str] = field(default_factory=list)
+    vector_store_ids: List[str] = field(default_factory=list)
+    file_ids: List[str] = field(default_factory=list)
+
+    def run_params(self, tools: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Parámetros `tools` / `tool_resources` que se envían en cada run.
+        `tools` restringe las del asistente (ruta del paso); los recursos
+        solo van para las tools que quedan.
+        """
+        tools = list(self.tools if tools is None else tools)
+        params: Dict[str, Any] = {"tools": [{"type": t} for t in tools]} if tools or self.tools else {}
+
+        resources: Dict[str, Any] = {}
+        if self.vector_store_ids and "file_search" in tools:
+            resources["file_search"] = {"vector_store_ids": list(self.vector_store_ids)}
+        if self.file_ids and "code_interpreter" in tools:
+            resources["code_interpreter"] = {"file_ids": list(self.file_ids)}
+        if resources:
+            params["tool_resources"] = resources
+        return params
+
+
+ASSISTANTS: Dict[str, AssistantConfig] = {
+    # Pipeline principal (workflows.py): PDFs de referencia vía file_search
+    "esg": AssistantConfig(
+        assistant_id="asst_uN6jjvZ9s4Yv2PFmV1J4iRJB",
+        tools=["file_search", "code_interpreter"],
+        vector_store_ids=["vs_68c18287fbbc81919a024e80eb9d58b6"],
+    ),
+    # Pipeline incremental (pipeline_esg.py): archivos en code_interpreter
+    "esg_files": AssistantConfig(
+        assistant_id="asst_uN6jjvZ9s4Yv2PFmV1J4iRJB",
+        tools=["code_interpreter"],
+        file_ids=[
+            "file-LzzGj4YJdW1T4bsNp9EcCD",
+            "file-96uwnReXqbEbh97miBRJd5",
+            "file-6UCacZ7WF2eGxcuZuqPnuD",
+            "file-4dixqFDgMjDU39mAEewmRw",
+            "file-Sy8QSZkhRsZdkG7oMU3xNZ",
+            "file-WucnFWVfve87jhWqW9DH4",
+        ],
+    ),
+}
+
+
+# ==========================================================
+# 📊 Métricas de reutilización de conexiones
+# ==========================================================
+class ConnectionStats:
+    """
+    Cuenta respuestas vs. conexiones TCP nuevas usando la extensión `trace`
+    de httpcore. Si `requests >> connects`, el keep-alive está funcionando.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connects = 0
+        self.tls_handshakes = 0
+
+    def _count(self, event_name: str):
+        with self._lock:
+            if event_name == "connection.connect_tcp.complete":
+                self.connects += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+
+    def on_request(self, request):
+        def trace(event_name, info):
+            self._count(event_name)
+
+        request.extensions["trace"] = trace
+
+    async def aon_request(self, request):
+        async def trace(event_name, info):
+            self._count(event_name)
+
+        request.extensions["trace"] = trace
+
+    def on_response(self, response):
+        with self._lock:
+            self.requests += 1
+
+    async def aon_response(self, response):
+        self.on_response(response)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connects": self.connects,
+                "tls_handshakes": self.tls_handshakes,
+                "reuse_ratio": round(1 - self.connects / self.requests, 4) if self.requests else 0.0,
+            }
+
+
+# ==========================================================
+# 🗂️ Registro
+# ==========================================================
+class AssistantHandle:
+    """Runnable de un asistente + su configuración de tools por run."""
+
+    def __init__(self, name: str, config: AssistantConfig, runnable):
+        self.name = name
+        self.config = config
+        self.runnable = runnable
+
+    def run_params(self, params: Dict[str, Any], route=None) -> Dict[str, Any]:
+        """Tools del asistente (o de la ruta del paso) + modelo y tope de salida de la ruta."""
+        merged = self.config.run_params(route.tools if route is not None else None)
+        if route is not None and route.model:
+            merged["model"] = route.model
+        if route is not None and route.max_output_tokens:
+            merged["max_completion_tokens"] = route.max_output_tokens
+        # `params` gana (p. ej. el modelo de una corrida degradada por presupuesto)
+        return {**merged, **params}
+
+    async def ainvoke(self, params: Dict[str, Any], route=None, step: str = "default"):
+        # Sin LangChain: no reenvía el tope de salida al run ni expone el run
+        # hasta que termina (hace falta su id para cancelarlo en el servidor)
+        return await self._run_direct(self.run_params(params, route), step)
+
+    async def astream(self, params: Dict[str, Any], on_text, route=None, step: str = "default"):
+        """Como `ainvoke`, pero con streaming: `on_text` recibe cada delta de texto."""
+        from app.services.langchain.streaming import stream_run
+
+        return await stream_run(
+            self.runnable.async_client,
+            self.config.assistant_id,
+            self.run_params(params, route),
+            on_text,
+            step,
+        )
+
+    async def _run_direct(self, params: Dict[str, Any], step: str = "default"):
+        """Run create + poll; devuelve la misma forma que `ainvoke` de LangChain."""
+        from app.services.langchain.streaming import RUN_PARAMS, cancel_on_abort, unexpected_status
+        from app.services.langchain.truncation import fetch_partial
+
+        client = self.runnable.async_client
+        if "thread_id" in params:
+            # En un thread existente los recursos ya están en el thread:
+            # `runs.create` no acepta `tool_resources`
+            await client.beta.threads.messages.create(
+                params["thread_id"], role="user", content=params["content"]
+            )
+            run = await client.beta.threads.runs.create(
+                thread_id=params["thread_id"],
+                assistant_id=self.config.assistant_id,
+                **{k: v for k, v in params.items() if k in RUN_PARAMS},
+            )
+        else:
+            run = await client.beta.threads.create_and_run(
+                assistant_id=self.config.assistant_id,
+                thread={"messages": [{"role": "user", "content": params["content"]}]},
+                **{k: v for k, v in params.items() if k in RUN_PARAMS + ("tool_resources",)},
+            )
+
+        async with cancel_on_abort(client, run, step):
+            run = await client.beta.threads.runs.poll(
+                run.id, thread_id=run.thread_id, poll_interval_ms=int(self.runnable.check_every_ms)
+            )
+
+        if run.status not in ("completed", "incomplete"):
+            raise unexpected_status(run)
+        reason = run.incomplete_details.reason if run.incomplete_details else None
+        [message] = await fetch_partial(client, {"thread_id": run.thread_id, "run_id": run.id, "reason": reason})
+        message.usage, message.model = run.usage, run.model
+        return [message]
+
+
+class AssistantRegistry:
+    def __init__(self, config: Settings = settings, assistants: Optional[Dict[str, AssistantConfig]] = None):
+        self.config = config
+        self.assistants = dict(assistants or ASSISTANTS)
+        self.stats = ConnectionStats()
+        self._lock = threading.Lock()
+        self._http = None
+        self._ahttp = None
+        self._client = None
+        self._async_client = None
+        self._handles: Dict[str, AssistantHandle] = {}
+
+    def _http2_enabled(self) -> bool:
+        if not self.config.OPENAI_HTTP2:
+            return False
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            print("⚠️ `h2` no instalado → HTTP/1.1 con keep-alive")
+            return False
+
+    def _build_clients(self):
+        import httpx
+        import openai
+
+        limits = httpx.Limits(
+            max_connections=self.config.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=self.config.OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=self.config.OPENAI_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(
+            self.config.OPENAI_READ_TIMEOUT,
+            connect=self.config.OPENAI_CONNECT_TIMEOUT,
+        )
+        http2 = self._http2_enabled()
+
+        self._http = httpx.Client(
+            http2=http2, limits=limits, timeout=timeout,
+            event_hooks={"request": [self.stats.on_request], "response": [self.stats.on_response]},
+        )
+        self._ahttp = httpx.AsyncClient(
+            http2=http2, limits=limits, timeout=timeout,
+            event_hooks={"request": [self.stats.aon_request], "response": [self.stats.aon_response]},
+        )
+        # max_retries=0: los reintentos los decide el pipeline, no el SDK
+        self._client = openai.OpenAI(
+            api_key=self.config.OPENAI_API_KEY, http_client=self._http, max_retries=0,
+        )
+        self._async_client = openai.AsyncOpenAI(
+            api_key=self.config.OPENAI_API_KEY, http_client=self._ahttp, max_retries=0,
+        )
+
+    @property
+    def async_client(self):
+        with self._lock:
+            if self._async_client is None:
+                self._build_clients()
+        return self._async_client
+
+    def get(self, name: str) -> AssistantHandle:
+        handle = self._handles.get(name)
+        if handle is not None:
+            return handle
+
+        from langchain_community.agents.openai_assistant import OpenAIAssistantV2Runnable
+
+        with self._lock:
+            if name not in self._handles:
+                if self._async_client is None:
+                    self._build_clients()
+                cfg = self.assistants[name]
+                runnable = OpenAIAssistantV2Runnable(
+                    assistant_id=cfg.assistant_id,
+                    client=self._client,
+                    async_client=self._async_client,
+                    check_every_ms=self.config.ASSISTANT_CHECK_EVERY_MS,
+                )
+                self._handles[name] = AssistantHandle(name, cfg, runnable)
+        return self._handles[name]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "started": self._async_client is not None,
+            "assistants": sorted(self._handles),
+            "connections": self.stats.snapshot(),
+        }
+
+    async def aclose(self):
+        if self._ahttp is not None:
+            await self._ahttp.aclose()
+        if self._http is not None:
+            self._http.close()
+        self._http = self._ahttp = self._client = self._async_client = None
+        self._handles.clear()
+
+
+_registry: Optional[AssistantRegistry] = None
+
+
+def set_registry(registry: Optional[AssistantRegistry]):
+    global _registry
+    _registry = registry
+
+
+def get_registry() -> AssistantRegistry:
+    """Registro de la app (lifespan) o uno por defecto fuera de FastAPI."""
+    global _registry
+    if _registry is None:
+        _registry = AssistantRegistry()
+    return _registry
@@ -0,0 +1,283 @@
+"""
+Contexto compacto por paso del pipeline ESG.
+
+En vez de encadenar los prompts 2–11 en un único thread (cada paso relee
+toda la conversación), cada paso recibe solo los datos upstream que
+necesita, serializados como JSON compacto, y puede ejecutarse en un
+thread nuevo. Así el costo de entrada de los últimos prompts es similar
+al de los primeros, y un error en un paso no pierde el contexto.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.langchain.memory import RunMemory
+from app.services.langchain.rows import (  # noqa: F401  (re-exportadas)
+    ACTION_COLUMNS, BASE_COLUMNS, IMPACT_COLUMNS, SCORE_COLUMNS, compact_tables,
+)
+
+TOP_THEMES = 10
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida (~4 caracteres por token en español/JSON)."""
+    return max(1, len(text) // 4)
+
+
+def compact_json(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def project(rows: List[Dict[str, Any]], columns: List[str]) -> List[Dict[str, Any]]:
+    """Deja en cada fila solo las columnas pedidas (las ausentes se omiten)."""
+    return [{c: r[c] for c in columns if c in r} for r in rows]
+
+
+# ==========================================================
+# 📐 Qué necesita cada paso
+# ==========================================================
+@dataclass
+class StepInput:
+    # build(ctx, temas_priorizados) → datos del paso
+    build: Callable[["RunContext", List[Dict[str, Any]]], Dict[str, Any]]
+    # Columnas que se pueden quitar (en este orden) si se excede el presupuesto
+    optional_columns: List[str] = field(default_factory=list)
+    budget_tokens: int = 6000
+
+
+def _table(ctx: "RunContext", step: str) -> List[Dict[str, Any]]:
+    return (ctx.outputs.get(step) or {}).get("materiality_table", []) or []
+
+
+def _input_prompt_3(ctx: "RunContext", themes):
+    return {
+        "industria": ctx.industry,
+        "materiality_table": project(_table(ctx, "prompt_2"), BASE_COLUMNS + ACTION_COLUMNS),
+    }
+
+
+def _input_prompt_4(ctx: "RunContext", themes):
+    return {"materiality_table": project(_table(ctx, "prompt_3"), BASE_COLUMNS + IMPACT_COLUMNS)}
+
+
+def _input_prompt_5(ctx: "RunContext", themes):
+    return {
+        "materiality_table": project(_table(ctx, "prompt_4"), BASE_COLUMNS + IMPACT_COLUMNS + SCORE_COLUMNS)
+    }
+
+
+def _input_prompt_6(ctx: "RunContext", themes):
+    return {"materiality_table": [{"tema": r.get("tema"), "tema_material": True} for r in themes]}
+
+
+def _input_prompt_7(ctx: "RunContext", themes):
+    return {"materiality_table_priorizada": project(themes, ["tema"])}
+
+
+def _input_prompt_10(ctx: "RunContext", themes):
+    p1 = ctx.outputs.get("prompt_1") or {}
+    return {
+        "pais_operacion": p1.get("pais_operacion") or ctx.country,
+        "temas_materiales_priorizados": [r.get("tema") for r in themes],
+    }
+
+
+def _input_prompt_11(ctx: "RunContext", themes):
+    p1 = ctx.outputs.get("prompt_1") or {}
+    actions = {r.get("tema"): r for r in _table(ctx, "prompt_2")}
+    return {
+        "organizacion": {
+            "nombre_empresa": p1.get("nombre_empresa") or ctx.organization_name,
+            "industria": p1.get("industria") or ctx.industry,
+            "pais_operacion": p1.get("pais_operacion") or ctx.country,
+        },
+        "temas_materiales_priorizados": [
+            {
+                "tema": r.get("tema"),
+                "materialidad_esg": r.get("materialidad_esg"),
+                **{c: actions.get(r.get("tema"), {}).get(c) for c in ACTION_COLUMNS},
+            }
+            for r in themes
+        ],
+    }
+
+
+STEP_INPUTS: Dict[str, StepInput] = {
+    "prompt_3": StepInput(_input_prompt_3, optional_columns=ACTION_COLUMNS, budget_tokens=8000),
+    "prompt_4": StepInput(_input_prompt_4, budget_tokens=6000),
+    "prompt_5": StepInput(_input_prompt_5, optional_columns=IMPACT_COLUMNS, budget_tokens=6000),
+    "prompt_6": StepInput(_input_prompt_6, budget_tokens=2000),
+    "prompt_7": StepInput(_input_prompt_7, budget_tokens=1000),
+    "prompt_10": StepInput(_input_prompt_10, budget_tokens=1000),
+    "prompt_11": StepInput(_input_prompt_11, optional_columns=ACTION_COLUMNS, budget_tokens=4000),
+}
+
+
+# Salidas que ningún paso vuelve a leer cuando termina cada paso
+# (STEP_INPUTS, workflows.apply_delta y los temas priorizados, que se fijan
+# antes de Prompt 6). Las respuestas del resultado conservan su copia.
+RELEASE_AFTER: Dict[str, Tuple[str, ...]] = {
+    "prompt_4": ("prompt_3",),
+    "prompt_6": ("prompt_4", "prompt_5", "prompt_6"),
+    "prompt_7": ("prompt_7",),
+    "prompt_10": ("prompt_10",),
+    "prompt_11": ("prompt_1", "prompt_2", "prompt_11"),
+}
+
+
+def _drop_column(data: Any, column: str) -> Any:
+    if isinstance(data, dict):
+        return {k: _drop_column(v, column) for k, v in data.items() if k != column}
+    if isinstance(data, list):
+        return [_drop_column(v, column) for v in data]
+    return data
+
+
+# ==========================================================
+# 🧠 Contexto de una corrida
+# ==========================================================
+class RunContext:
+    """
+    Guarda las salidas parseadas de cada paso y arma el input compacto de
+    los siguientes. `thread_mode`:
+      - "fork": cada paso en un thread nuevo con su contexto explícito.
+      - "shared": comportamiento previo (un thread para prompts 2–11).
+    """
+
+    def __init__(
+        self,
+        organization_name: str,
+        country: str,
+        website: str,
+        industry: str,
+        thread_mode: Optional[str] = None,
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.organization_name = organization_name
+        self.country = country
+        self.website = website
+        self.industry = industry
+        self.thread_mode = thread_mode or settings.ESG_THREAD_MODE
+        self.on_event = on_event
+        self.outputs: Dict[str, Any] = {}
+        self.input_tokens: Dict[str, int] = {}
+        self.over_budget: Dict[str, int] = {}
+        self.continuations: Dict[str, int] = {}
+        # Problemas de quality gate de los pasos que se aceptaron degradados
+        self.quality: Dict[str, List[str]] = {}
+        self.memory = RunMemory()
+        # Resultado en construcción (también el parcial si la corrida se corta)
+        self.responses: List[Dict[str, Any]] = []
+        self.failed_prompts: List[Any] = []
+        self.document_stats: Optional[Dict[str, Any]] = None
+        self.cost: Optional[Any] = None  # costs.CostMeter
+        # Temas priorizados fijados tras Prompt 5 (ver freeze_themes)
+        self._themes: Optional[List[Dict[str, Any]]] = None
+
+    # -------- ciclo de vida --------
+    def __enter__(self) -> "RunContext":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Borra los crudos retenidos (también los de disco) y saca la corrida de memory.status()."""
+        self.memory.close()
+
+    @property
+    def fork_threads(self) -> bool:
+        return self.thread_mode == "fork"
+
+    def record(self, step: str, parsed: Any):
+        # Las tablas quedan como filas compactas; la respuesta del paso
+        # referencia el mismo objeto, así que también las ve
+        compact_tables(parsed)
+        self.outputs[step] = parsed
+        self.memory.track(step, parsed)
+
+    def release(self, step: str):
+        if self.outputs.pop(step, None) is not None:
+            self.memory.release(step)
+
+    def consumed(self, step: str):
+        """`step` terminó (bien o mal): suelta las salidas que ya nadie lee."""
+        for done in RELEASE_AFTER.get(step, ()):
+            self.release(done)
+
+    def emit(self, type: str, **data: Any):
+        """Evento de progreso (paso iniciado/terminado, fila recibida) para quien escuche."""
+        if self.on_event is not None:
+            self.on_event({"type": type, **data})
+
+    def prioritized_themes(self) -> List[Dict[str, Any]]:
+        """Los 10 temas priorizados: etiquetados en Prompt 5 o, si no, top por materialidad_esg."""
+        if self._themes is not None:
+            return self._themes
+        rows = _table(self, "prompt_5") or _table(self, "prompt_4")
+        tagged = [r for r in rows if r.get("tema_material") in (True, "Tema Material", "Material")]
+        if tagged:
+            return tagged[:TOP_THEMES]
+
+        def score(r):
+            try:
+                return float(r.get("materialidad_esg") or 0)
+            except (TypeError, ValueError):
+                return 0.0
+
+        return sorted(rows, key=score, reverse=True)[:TOP_THEMES]
+
+    def freeze_themes(self):
+        """Fija los temas priorizados (Prompt 5 ya corrió): las tablas 4 y 5 se pueden soltar."""
+        self._themes = None
+        self._themes = self.prioritized_themes()
+
+    def step_input(self, step: str, themes: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, int]:
+        """
+        JSON compacto para el paso, recortado a su presupuesto de tokens.
+        `themes` restringe los temas priorizados (shards de fan-out).
+        """
+        spec = STEP_INPUTS[step]
+        data = spec.build(self, self.prioritized_themes() if themes is None else themes)
+        payload = compact_json(data)
+
+        for column in spec.optional_columns:
+            if estimate_tokens(payload) <= spec.budget_tokens:
+                break
+            data = _drop_column(data, column)
+            payload = compact_json(data)
+
+        tokens = estimate_tokens(payload)
+        if tokens > spec.budget_tokens:
+            self.over_budget[step] = tokens
+            print(f"⚠️ {step}: contexto de {tokens} tokens excede el presupuesto ({spec.budget_tokens})")
+        return payload, tokens
+
+    def build_content(
+        self, step: str, template: str, themes: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        """
+        Prompt completo: en modo fork (o para un shard, que siempre va en
+        un thread propio) agrega los datos upstream al template.
+        """
+        if step not in STEP_INPUTS or (not self.fork_threads and themes is None):
+            content = template
+        else:
+            payload, _ = self.step_input(step, themes)
+            content = f"{template}\n\n--- DATOS DE ENTRADA (JSON) ---\n{payload}\n"
+        tokens = estimate_tokens(content)
+        # En fan-out se acumula el costo de todos los shards del paso
+        self.input_tokens[step] = self.input_tokens.get(step, 0) + tokens if themes is not None else tokens
+        return content
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "thread_mode": self.thread_mode,
+            "input_tokens": dict(self.input_tokens),
+            "over_budget": dict(self.over_budget),
+            "continuations": dict(self.continuations),
+            "quality": dict(self.quality),
+            "memory": self.memory.snapshot(),
+        }
@@ -0,0 +1,438 @@
+"""
+Costo de los análisis: tokens y USD por paso y por corrida, presupuestos
+y estimación previa (preflight).
+
+- Cada run registra su `usage` real (el run del Assistants API lo trae;
+  incluye los chunks de file_search) o, si no se puede leer, una
+  estimación por el texto de entrada/salida. El acumulado de la corrida
+  (`CostMeter`) viaja en un contextvar, así lo comparten los shards y los
+  hedges.
+- Presupuestos (USD, 0 = sin límite): por análisis, por tenant y día, y
+  por día para todo el worker. Se llevan en memoria del worker, igual que
+  la admisión.
+- `preflight` estima la corrida antes del primer run con el tamaño de los
+  prompts y el historial de tokens por paso. Si no entra en el
+  presupuesto, la corrida pasa a `ESG_BUDGET_DOWNGRADE_MODEL` (sin
+  hedges) o se rechaza (`BudgetExceeded`) sin haber gastado nada. Si a
+  mitad de camino se pasa del límite, se corta con resultado parcial
+  (`budget_exceeded`).
+- Tras un `insufficient_quota`, los análisis nuevos se rechazan durante
+  `ESG_QUOTA_COOLDOWN_S` en vez de pagar los primeros pasos y fallar.
+"""
+
+import math
+import statistics
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.admission import Overloaded
+from app.core.config import settings
+from app.services.langchain import deadline, routing
+
+# Pasos con runs en el pipeline (prompt_9 es local: tabla SASB del CSV)
+PIPELINE_STEPS = (
+    "prompt_1", "prompt_2", "prompt_3", "prompt_4", "prompt_5",
+    "prompt_6", "prompt_7", "prompt_8", "prompt_10", "prompt_11",
+)
+# Pasos con un run por shard de temas
+FANOUT_STEPS = ("prompt_6", "prompt_7", "prompt_10")
+
+
+class BudgetExceeded(Overloaded):
+    """La corrida no entra en el presupuesto: se rechaza antes de empezar."""
+
+
+# ==========================================================
+# 💵 Precios
+# ==========================================================
+def model_price(model: Optional[str]) -> Tuple[float, float]:
+    """(USD por 1M tokens de entrada, de salida); el prefijo más largo gana (gpt-4o-mini ≠ gpt-4o)."""
+    model = model or settings.ESG_DEFAULT_MODEL
+    prices = settings.ESG_MODEL_PRICES
+    matches = [name for name in prices if model.startswith(name)]
+    if not matches:
+        matches = [settings.ESG_DEFAULT_MODEL] if settings.ESG_DEFAULT_MODEL in prices else []
+    if not matches:
+        return 0.0, 0.0
+    price_in, price_out = prices[max(matches, key=len)]
+    return price_in, price_out
+
+
+def usd(input_tokens: int, output_tokens: int, model: Optional[str] = None) -> float:
+    price_in, price_out = model_price(model)
+    return (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+
+
+# ==========================================================
+# 🧾 Acumulado de una corrida
+# ==========================================================
+class CostMeter:
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.usd = 0.0
+        self.estimate_usd = 0.0
+        self.limit_usd: Optional[float] = None
+        # Modelo de la corrida si el preflight la degradó (None = el del asistente)
+        self.model: Optional[str] = None
+
+    @property
+    def downgraded(self) -> bool:
+        return self.model is not None
+
+    def add(self, step: str, input_tokens: int, output_tokens: int, model: Optional[str], estimated: bool):
+        cost = usd(input_tokens, output_tokens, model)
+        entry = self.steps.setdefault(
+            step, {"runs": 0, "input_tokens": 0, "output_tokens": 0, "usd": 0.0, "estimated_runs": 0}
+        )
+        entry["runs"] += 1
+        entry["input_tokens"] += input_tokens
+        entry["output_tokens"] += output_tokens
+        entry["usd"] += cost
+        entry["estimated_runs"] += int(estimated)
+        self.usd += cost
+        ledger.charge(self.tenant, cost)
+
+    def over_limit(self) -> bool:
+        return self.limit_usd is not None and self.usd > self.limit_usd
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "usd": round(self.usd, 4),
+            "estimate_usd": round(self.estimate_usd, 4),
+            "limit_usd": round(self.limit_usd, 4) if self.limit_usd is not None else None,
+            "model": self.model,
+            "input_tokens": sum(s["input_tokens"] for s in self.steps.values()),
+            "output_tokens": sum(s["output_tokens"] for s in self.steps.values()),
+            "steps": {
+                step: {**s, "usd": round(s["usd"], 4)} for step, s in self.steps.items()
+            },
+        }
+
+
+_meter: ContextVar[Optional[CostMeter]] = ContextVar("esg_cost_meter", default=None)
+
+
+def current_meter() -> Optional[CostMeter]:
+    return _meter.get()
+
+
+def run_model() -> Optional[str]:
+    """Modelo impuesto a toda la corrida al degradarla por presupuesto (None = el de cada ruta)."""
+    meter = _meter.get()
+    return meter.model if meter is not None else None
+
+
+@contextmanager
+def metering(meter: CostMeter):
+    reset = _meter.set(meter)
+    ledger.open(meter)
+    try:
+        yield meter
+    finally:
+        ledger.close(meter)
+        _meter.reset(reset)
+
+
+# ==========================================================
+# 📒 Gasto del día (por worker)
+# ==========================================================
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def seconds_to_midnight() -> int:
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, math.ceil((midnight - now).total_seconds()))
+
+
+class SpendLedger:
+    def __init__(self):
+        self.day = _today()
+        self.spent: Dict[str, float] = defaultdict(float)
+        self._active: List[CostMeter] = []
+
+    def _roll(self):
+        today = _today()
+        if today != self.day:
+            self.day = today
+            self.spent = defaultdict(float)
+
+    def charge(self, tenant: str, cost: float):
+        self._roll()
+        self.spent[tenant] += cost
+
+    def open(self, meter: CostMeter):
+        self._active.append(meter)
+
+    def close(self, meter: CostMeter):
+        try:
+            self._active.remove(meter)
+        except ValueError:
+            pass
+
+    def committed(self, tenant: Optional[str] = None, exclude: Optional[CostMeter] = None) -> float:
+        """Gastado hoy + lo que falta gastar de las corridas en curso (según su estimación)."""
+        self._roll()
+        spent = self.spent.get(tenant, 0.0) if tenant is not None else sum(self.spent.values())
+        pending = sum(
+            max(0.0, m.estimate_usd - m.usd)
+            for m in self._active
+            if m is not exclude and (tenant is None or m.tenant == tenant)
+        )
+        return spent + pending
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._roll()
+        return {
+            "day": self.day,
+            "spent_usd": round(sum(self.spent.values()), 4),
+            "tenants": {t: round(v, 4) for t, v in sorted(self.spent.items(), key=lambda kv: -kv[1])[:20]},
+            "active_runs": len(self._active),
+        }
+
+
+ledger = SpendLedger()
+
+
+def tenant_daily_budget(tenant: str) -> float:
+    overrides = {k.strip().casefold(): v for k, v in settings.ESG_BUDGET_TENANT_DAILY_OVERRIDES.items()}
+    return overrides.get(tenant, settings.ESG_BUDGET_TENANT_DAILY_USD)
+
+
+# ==========================================================
+# 📈 Historial de tokens por paso (por corrida completa)
+# ==========================================================
+class CostHistory:
+    def __init__(self, window: int = 50):
+        self._samples: Dict[str, Deque[Tuple[int, int]]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, meter: CostMeter):
+        for step, s in meter.steps.items():
+            self._samples[step].append((s["input_tokens"], s["output_tokens"]))
+
+    def median(self, step: str) -> Optional[Tuple[int, int]]:
+        samples = self._samples.get(step, ())
+        if len(samples) < settings.ESG_COST_MIN_SAMPLES:
+            return None
+        return (
+            int(statistics.median(i for i, _ in samples)),
+            int(statistics.median(o for _, o in samples)),
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {step: {"samples": len(s), "median": self.median(step)} for step, s in self._samples.items()}
+
+
+history = CostHistory()
+
+
+# ==========================================================
+# 🔮 Estimación previa
+# ==========================================================
+def _shards() -> int:
+    from app.services.langchain.context import TOP_THEMES
+
+    if not settings.ESG_FANOUT_ENABLED:
+        return 1
+    return math.ceil(TOP_THEMES / max(1, settings.ESG_FANOUT_SHARD_SIZE))
+
+
+def estimate(document_tokens: int = 0, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Tokens y USD esperados de una corrida: mediana histórica del paso o,
+    sin historial, template + contexto upstream (su presupuesto) + salida
+    por defecto. Incluye las continuaciones vistas en el historial. Con
+    `model`, todos los pasos a ese modelo; si no, el de cada ruta.
+    """
+    import app.services.langchain.prompts  # noqa: F401  (registra los templates)
+    from app.services.langchain import prompt_registry
+    from app.services.langchain.context import STEP_INPUTS
+
+    templates = {r["step"]: r["tokens"] for r in prompt_registry.token_report()}
+    steps: Dict[str, Dict[str, Any]] = {}
+    for step in PIPELINE_STEPS + tuple(f"{s}_continue" for s in PIPELINE_STEPS):
+        observed = history.median(step)
+        if observed is not None:
+            input_tokens, output_tokens = observed
+            source = "history"
+        elif step in PIPELINE_STEPS:
+            runs = _shards() if step in FANOUT_STEPS else 1
+            context_tokens = STEP_INPUTS[step].budget_tokens if step in STEP_INPUTS else 0
+            input_tokens = runs * (templates.get(step, 0) + context_tokens)
+            if step == "prompt_1":
+                input_tokens += document_tokens
+            output_tokens = runs * settings.ESG_COST_DEFAULT_OUTPUT_TOKENS
+            source = "static"
+        else:
+            continue
+        steps[step] = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            # Sin modelo forzado, el de la ruta del paso
+            "usd": round(usd(input_tokens, output_tokens, model or routing.model_for(step)), 4),
+            "source": source,
+        }
+
+    total = sum(s["usd"] for s in steps.values()) * settings.ESG_COST_ESTIMATE_MARGIN
+    return {
+        "model": model or "routing",
+        "usd": round(total, 4),
+        "input_tokens": sum(s["input_tokens"] for s in steps.values()),
+        "output_tokens": sum(s["output_tokens"] for s in steps.values()),
+        "steps": steps,
+    }
+
+
+# ==========================================================
+# 🚦 Preflight
+# ==========================================================
+_quota_exhausted_at: Optional[float] = None
+
+
+def mark_quota_exhausted():
+    global _quota_exhausted_at
+    _quota_exhausted_at = time.monotonic()
+
+
+def quota_retry_after() -> Optional[int]:
+    if _quota_exhausted_at is None:
+        return None
+    left = _quota_exhausted_at + settings.ESG_QUOTA_COOLDOWN_S - time.monotonic()
+    return math.ceil(left) if left > 0 else None
+
+
+def _limits(tenant: str, exclude: Optional[CostMeter] = None) -> List[Tuple[str, float, int]]:
+    """(nombre, USD disponibles, Retry-After si se agota) de cada presupuesto configurado."""
+    limits = []
+    if settings.ESG_BUDGET_ANALYSIS_USD:
+        limits.append(("análisis", settings.ESG_BUDGET_ANALYSIS_USD, None))
+    tenant_budget = tenant_daily_budget(tenant)
+    if tenant_budget:
+        limits.append((
+            f"tenant {tenant} (día)",
+            tenant_budget - ledger.committed(tenant, exclude),
+            seconds_to_midnight(),
+        ))
+    if settings.ESG_BUDGET_DAILY_USD:
+        limits.append(("worker (día)", settings.ESG_BUDGET_DAILY_USD - ledger.committed(None, exclude), seconds_to_midnight()))
+    return limits
+
+
+def plan(tenant: str, document_tokens: int = 0, exclude: Optional[CostMeter] = None) -> Dict[str, Any]:
+    """Decisión del preflight: "full" | "downgraded" | "rejected", con la estimación usada."""
+    retry = quota_retry_after()
+    if retry is not None:
+        return {"decision": "rejected", "reason": "Cuota de OpenAI agotada", "status_code": 503, "retry_after": retry}
+
+    full = estimate(document_tokens)
+    limits = _limits(tenant, exclude)
+    if all(full["usd"] <= available for _, available, _ in limits):
+        return {"decision": "full", "estimate": full, "limit_usd": _min_available(limits)}
+
+    model = settings.ESG_BUDGET_DOWNGRADE_MODEL
+    if model:
+        cheap = estimate(document_tokens, model)
+        if all(cheap["usd"] <= available for _, available, _ in limits):
+            return {"decision": "downgraded", "estimate": cheap, "full_estimate": full, "limit_usd": _min_available(limits)}
+
+    blocked = [(name, available, retry) for name, available, retry in limits if full["usd"] > available]
+    name, available, retry = min(blocked, key=lambda b: b[1])
+    return {
+        "decision": "rejected",
+        "reason": f"Presupuesto de {name} insuficiente: estimado ${full['usd']:.2f}, disponible ${max(available, 0):.2f}",
+        # Presupuesto diario agotado → reintentar mañana; análisis demasiado caro → 402
+        "status_code": 429 if retry else 402,
+        "retry_after": retry,
+        "estimate": full,
+    }
+
+
+def _min_available(limits) -> Optional[float]:
+    return min((available for _, available, _ in limits), default=None)
+
+
+def preflight(meter: CostMeter, document_tokens: int = 0) -> Dict[str, Any]:
+    """Aplica el plan a la corrida (modelo, estimación, límite) o lanza BudgetExceeded."""
+    decision = plan(meter.tenant, document_tokens, exclude=meter)
+    if decision["decision"] == "rejected":
+        print(f"💸 Análisis rechazado: {decision['reason']}")
+        raise BudgetExceeded(decision["reason"], decision["status_code"], decision["retry_after"])
+    meter.estimate_usd = decision["estimate"]["usd"]
+    meter.limit_usd = decision["limit_usd"]
+    if decision["decision"] == "downgraded":
+        meter.model = decision["estimate"]["model"]
+        print(
+            f"💸 Presupuesto justo: ${decision['full_estimate']['usd']:.2f} → "
+            f"{meter.model} (${meter.estimate_usd:.2f}, sin hedges)"
+        )
+    return decision
+
+
+# ==========================================================
+# 📏 Usage de cada run
+# ==========================================================
+async def _fetch_usage(result) -> Optional[Tuple[int, int, Optional[str]]]:
+    message = result[0]
+    usage = getattr(message, "usage", None)
+    model = getattr(message, "model", None)
+    if usage is None and settings.ESG_USAGE_FROM_API:
+        from app.services.langchain.clients import get_registry
+
+        run = await get_registry().async_client.beta.threads.runs.retrieve(
+            message.run_id, thread_id=message.thread_id
+        )
+        usage, model = run.usage, run.model
+    if usage is None:
+        return None
+    return usage.prompt_tokens, usage.completion_tokens, model
+
+
+async def record_run(step: str, params: Dict[str, Any], result, output: str):
+    """Suma el costo del run a la corrida; si se pasa del límite, la corta."""
+    meter = _meter.get()
+    if meter is None:
+        return
+    try:
+        usage = await _fetch_usage(result)
+    except Exception as e:
+        print(f"⚠️ {step}: usage no disponible ({e}); se estima")
+        usage = None
+    estimated = usage is None
+    if estimated:
+        from app.services.langchain.prompt_registry import count_tokens
+
+        usage = (count_tokens(params.get("content", "")), count_tokens(output), params.get("model"))
+    input_tokens, output_tokens, model = usage
+    meter.add(step, input_tokens, output_tokens, model or meter.model or routing.model_for(step), estimated)
+
+    if meter.over_limit():
+        token = deadline.current_token()
+        if token is not None:
+            # Los demás shards cortan en su próximo checkpoint
+            token.reason = deadline.BUDGET
+        raise deadline.BudgetExhausted(
+            f"{step}: gasto ${meter.usd:.2f} supera el presupuesto (${meter.limit_usd:.2f})"
+        )
+
+
+def record_cancelled(step: str, run):
+    """Usage de un run cancelado (hedge perdedor, trabajo cancelado): se cobra, no corta la corrida."""
+    meter = _meter.get()
+    if meter is None or run.usage is None:
+        return
+    usage = run.usage
+    meter.add(step, usage.prompt_tokens, usage.completion_tokens, run.model or routing.model_for(step), False)
+
+
+def status() -> Dict[str, Any]:
+    return {
+        "today": ledger.snapshot(),
+        "quota_retry_after_s": quota_retry_after(),
+        "history": history.snapshot(),
+    }
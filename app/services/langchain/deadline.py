@@ -0,0 +1,234 @@
+"""
+Deadlines y cancelación de análisis.
+
+Cada trabajo lleva un `CancelToken` (en un contextvar, así lo heredan los
+shards de fan-out y los hedges) ligado a la tarea que lo ejecuta:
+
+- `cancel()` (endpoint de cancelación, cliente SSE desconectado) y el
+  vencimiento del deadline cancelan esa tarea: se cortan el run en curso,
+  la espera en la cola de admisión o del scheduler y cualquier sleep de
+  reintento, sin esperar al próximo paso. Los runs de OpenAI en vuelo
+  (registrados con `add_run`) se cancelan también en el servidor.
+- `checkpoint(step)` corta antes de empezar un paso que no alcanza a
+  terminar (tiempo restante < p50 del paso), y `sleep()` antes de un
+  backoff que terminaría después del deadline: no se gasta cuota en
+  trabajo que se va a descartar.
+
+`run_esg_analysis` convierte la cancelación en un resultado parcial con
+lo que ya se generó.
+"""
+
+import asyncio
+import contextvars
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+CANCELLED = "cancelled"
+DEADLINE = "deadline_exceeded"
+BUDGET = "budget_exceeded"
+
+
+class RunCancelled(Exception):
+    """El trabajo se canceló o no llega a su deadline (no se reintenta)."""
+
+    status = CANCELLED
+
+
+class DeadlineExceeded(RunCancelled):
+    status = DEADLINE
+
+
+class BudgetExhausted(RunCancelled):
+    """El gasto de la corrida superó su presupuesto (ver costs.py)."""
+
+    status = BUDGET
+
+
+class CancelToken:
+    def __init__(self, job_id: Optional[str] = None, deadline_s: Optional[float] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.created_at = time.time()
+        self.deadline = time.monotonic() + deadline_s if deadline_s else None
+        self.state = "queued"
+        self.reason: Optional[str] = None
+        self.step: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # run_id → (cancelación en el servidor, contexto del run)
+        self.runs: Dict[str, Tuple[Callable[[], Awaitable[None]], contextvars.Context]] = {}
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def error(self) -> RunCancelled:
+        if self.reason == DEADLINE:
+            return DeadlineExceeded(f"Deadline vencido{f' en {self.step}' if self.step else ''}")
+        if self.reason == BUDGET:
+            return BudgetExhausted(f"Presupuesto agotado{f' en {self.step}' if self.step else ''}")
+        return RunCancelled(f"Análisis cancelado{f' en {self.step}' if self.step else ''}")
+
+    def bind(self, task: asyncio.Task):
+        """Liga el token a la tarea del trabajo y programa el vencimiento del deadline."""
+        self._task = task
+        if self.cancelled:
+            # Cancelado antes de arrancar (p. ej. cliente SSE que ya se fue)
+            task.cancel()
+        elif self.deadline is not None:
+            loop = asyncio.get_running_loop()
+            delay = max(0.0, self.remaining())
+            self._timer = loop.call_later(delay, self.cancel, DEADLINE)
+
+    def add_run(self, run_id: str, stop: Callable[[], Awaitable[None]]):
+        """Registra un run en vuelo; `stop()` lo cancela en el servidor (streaming.cancel_run)."""
+        self.runs[run_id] = (stop, contextvars.copy_context())
+
+    def remove_run(self, run_id: str) -> bool:
+        """False si el run ya no estaba (terminó o el token ya lo canceló)."""
+        return self.runs.pop(run_id, None) is not None
+
+    def _stop_runs(self):
+        runs, self.runs = self.runs, {}
+        loop = asyncio.get_running_loop()
+        for stop, context in runs.values():
+            # En el contexto del run: su usage se suma a la corrida (costs.py)
+            task = loop.create_task(stop(), context=context)
+            _stopping.add(task)
+            task.add_done_callback(_stopping.discard)
+
+    def cancel(self, reason: str = CANCELLED) -> bool:
+        if self.cancelled or self.state == "done":
+            return False
+        self.reason = reason
+        print(f"🛑 Trabajo {self.job_id}: {reason}{f' (paso {self.step})' if self.step else ''}")
+        if self.runs:
+            print(f"🧹 Trabajo {self.job_id}: cancelando {len(self.runs)} run(s) en OpenAI")
+            self._stop_runs()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        return True
+
+    def finish(self):
+        self.state = "done"
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.runs:
+            # Runs huérfanos (p. ej. shards que siguieron tras un BudgetExhausted)
+            self._stop_runs()
+
+    def snapshot(self) -> Dict[str, Any]:
+        remaining = self.remaining()
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "step": self.step,
+            "cancel_reason": self.reason,
+            "remaining_s": round(remaining, 1) if remaining is not None else None,
+            "active_runs": len(self.runs),
+            "age_s": round(time.time() - self.created_at, 1),
+        }
+
+
+_token: ContextVar[Optional[CancelToken]] = ContextVar("esg_cancel_token", default=None)
+# Cancelaciones en el servidor en curso (referencia para que no las recolecte el GC)
+_stopping: Set["asyncio.Task"] = set()
+
+
+def current_token() -> Optional[CancelToken]:
+    return _token.get()
+
+
+# ==========================================================
+# 📋 Trabajos en curso (para el endpoint de cancelación)
+# ==========================================================
+_jobs: Dict[str, CancelToken] = {}
+
+
+def get_job(job_id: str) -> Optional[CancelToken]:
+    return _jobs.get(job_id)
+
+
+def list_jobs() -> List[Dict[str, Any]]:
+    return [token.snapshot() for token in _jobs.values()]
+
+
+def cancel_job(job_id: str) -> Optional[CancelToken]:
+    token = _jobs.get(job_id)
+    if token is not None:
+        token.cancel(CANCELLED)
+    return token
+
+
+async def run_job(token: CancelToken, call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Ejecuta `call()` como el trabajo de `token` (cancelable desde el
+    registro). Si se cancela antes de que el pipeline arme su resultado
+    parcial (p. ej. en la cola de admisión), se lanza RunCancelled.
+    """
+    if token.job_id in _jobs:
+        raise ValueError(f"Ya hay un trabajo con id {token.job_id}")
+    _jobs[token.job_id] = token
+    reset = _token.set(token)
+    token.bind(asyncio.current_task())
+    try:
+        return await call()
+    except asyncio.CancelledError:
+        if not token.cancelled:
+            raise
+        asyncio.current_task().uncancel()
+        raise token.error() from None
+    finally:
+        token.finish()
+        _token.reset(reset)
+        _jobs.pop(token.job_id, None)
+
+
+# ==========================================================
+# ⏱️ Puntos de control
+# ==========================================================
+def _expected_s(step: str) -> Optional[float]:
+    from app.services.langchain.hedging import latency
+
+    return latency.percentile(step, 0.50)
+
+
+def checkpoint(step: str):
+    """Antes de un paso/intento: corta si el trabajo se canceló o el paso no entra en el deadline."""
+    token = _token.get()
+    if token is None:
+        return
+    token.step = step
+    if token.cancelled:
+        raise token.error()
+    remaining = token.remaining()
+    if remaining is None:
+        return
+    expected = _expected_s(step) or 0.0
+    if remaining <= expected:
+        token.reason = DEADLINE
+        raise DeadlineExceeded(
+            f"{step}: quedan {max(remaining, 0):.0f}s y el paso tarda ~{expected:.0f}s; se corta antes de llamar"
+        )
+
+
+async def sleep(seconds: float, step: Optional[str] = None):
+    """asyncio.sleep que no espera más allá del deadline (un backoff que no entra no se duerme)."""
+    token = _token.get()
+    if token is not None:
+        if token.cancelled:
+            raise token.error()
+        remaining = token.remaining()
+        if remaining is not None and seconds >= remaining:
+            token.reason = DEADLINE
+            raise DeadlineExceeded(
+                f"{step or token.step}: espera de {seconds:.0f}s supera el deadline ({max(remaining, 0):.0f}s)"
+            )
+    await asyncio.sleep(seconds)
+
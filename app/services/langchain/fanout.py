@@ -0,0 +1,82 @@
+"""
+Fan-out por tema para los pasos que procesan los 10 temas priorizados.
+
+Los temas se reparten en shards pequeños que se ejecutan concurrentemente
+(bajo el límite global de runs de `safe_invoke`). Solo se reintentan los
+shards que fallan, y el tiempo total lo marca el shard más lento. Si el
+upstream no está disponible (cuota o circuito abierto) o el análisis se
+canceló / no llega a su deadline, se aborta el paso.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.langchain import deadline
+from app.services.langchain.memory import preview
+from app.services.langchain.resilience import ErrorKind, UpstreamUnavailable, policy_for
+
+
+def split_shards(items: Sequence[Any], shard_size: int) -> List[List[Any]]:
+    shard_size = max(1, shard_size)
+    return [list(items[i:i + shard_size]) for i in range(0, len(items), shard_size)]
+
+
+async def fan_out(
+    items: Sequence[Any],
+    run_shard: Callable[[List[Any]], Awaitable[Optional[List[Dict[str, Any]]]]],
+    shard_size: Optional[int] = None,
+    retries: Optional[int] = None,
+    name: str = "",
+) -> Tuple[List[Dict[str, Any]], List[List[Any]]]:
+    """
+    Ejecuta `run_shard` sobre cada shard en paralelo. Un shard falla si
+    lanza una excepción o devuelve None; solo esos se reintentan.
+
+    Devuelve (filas de todos los shards exitosos en orden, shards fallidos).
+    """
+    shards = split_shards(items, shard_size or settings.ESG_FANOUT_SHARD_SIZE)
+    retries = settings.ESG_FANOUT_SHARD_RETRIES if retries is None else retries
+
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(shards)
+    pending = list(range(len(shards)))
+
+    for attempt in range(retries + 1):
+        if attempt:
+            print(f"🔁 {name}: reintentando {len(pending)} shard(s) fallidos")
+            await deadline.sleep(policy_for(name).delay(attempt, ErrorKind.INVALID_OUTPUT), name)
+
+        outcomes = await asyncio.gather(
+            *(run_shard(shards[i]) for i in pending), return_exceptions=True
+        )
+
+        for outcome in outcomes:
+            if isinstance(outcome, (UpstreamUnavailable, deadline.RunCancelled)):
+                raise outcome
+
+        failed = []
+        for i, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception) or outcome is None:
+                print(f"⚠️ {name}: shard {i + 1}/{len(shards)} falló: {preview(outcome)}")
+                failed.append(i)
+            else:
+                results[i] = outcome
+        pending = failed
+        if not pending:
+            break
+
+    rows = [row for shard_rows in results if shard_rows for row in shard_rows]
+    return rows, [shards[i] for i in pending]
+
+
+def dedupe(rows: List[Dict[str, Any]], key: Callable[[Dict[str, Any]], Hashable]) -> List[Dict[str, Any]]:
+    """Elimina filas repetidas entre shards conservando la primera aparición."""
+    seen = set()
+    unique = []
+    for row in rows:
+        k = key(row)
+        if k in seen:
+            continue
+        seen.add(k)
+        unique.append(row)
+    return unique
@@ -0,0 +1,201 @@
+"""
+Hedging de llamadas al Assistants API.
+
+Algunos runs quedan colgados mucho más que su duración habitual. Si una
+llamada supera el p95 móvil de su paso, se lanza un duplicado en un thread
+nuevo y se usa el primer resultado válido; el perdedor se cancela, también
+en el servidor (streaming.cancel_run), y su usage se suma a la corrida. Un
+presupuesto global (proporción de llamadas + máximo concurrente) evita que
+el hedging multiplique el consumo de rate limit.
+"""
+
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+# ==========================================================
+# ⏱️ Latencias por paso (ventana móvil)
+# ==========================================================
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float):
+        with self._lock:
+            self._samples[step].append(seconds)
+
+    def percentile(self, step: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(step, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            steps = list(self._samples)
+        return {
+            step: {
+                "samples": len(self._samples[step]),
+                "p50_s": self.percentile(step, 0.50),
+                "p95_s": self.percentile(step, 0.95),
+            }
+            for step in steps
+        }
+
+
+# ==========================================================
+# 💰 Presupuesto global de hedges
+# ==========================================================
+class HedgeBudget:
+    """
+    Token bucket: cada llamada primaria suma `ratio` tokens (hasta `burst`)
+    y cada hedge consume 1. Además se limita la cantidad de hedges en vuelo.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 3.0, max_concurrent: int = 4):
+        self.ratio = ratio
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.tokens = burst
+        self.in_flight = 0
+        self.launched = 0
+        self.denied = 0
+        self.won = 0
+
+    def on_primary(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        if self.tokens < 1 or self.in_flight >= self.max_concurrent:
+            self.denied += 1
+            return False
+        self.tokens -= 1
+        self.in_flight += 1
+        self.launched += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "tokens": round(self.tokens, 2),
+            "in_flight": self.in_flight,
+            "launched": self.launched,
+            "won": self.won,
+            "denied": self.denied,
+        }
+
+
+latency = LatencyTracker(settings.ESG_HEDGE_WINDOW, settings.ESG_HEDGE_MIN_SAMPLES)
+budget = HedgeBudget(
+    settings.ESG_HEDGE_MAX_RATIO, settings.ESG_HEDGE_BURST, settings.ESG_HEDGE_MAX_CONCURRENT
+)
+
+
+def hedge_after(step: str) -> Optional[float]:
+    """Segundos tras los cuales conviene lanzar un hedge (p95 del paso)."""
+    if not settings.ESG_HEDGE_ENABLED:
+        return None
+    p95 = latency.percentile(step, 0.95)
+    if p95 is None:
+        return settings.ESG_HEDGE_DEFAULT_AFTER_S or None
+    return max(p95, settings.ESG_HEDGE_MIN_AFTER_S)
+
+
+async def _timed(call: Awaitable[T]) -> "tuple[T, float]":
+    start = time.perf_counter()
+    result = await call
+    return result, time.perf_counter() - start
+
+
+async def _cancel(task: "asyncio.Task"):
+    # El run del perdedor se cancela en el servidor al recibir la cancelación
+    # (cancel_on_abort / stream_run); se espera a que termine de hacerlo
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+async def hedged_call(
+    step: str,
+    make_call: Callable[[bool], Awaitable[T]],
+    is_valid: Optional[Callable[[T], bool]] = None,
+) -> T:
+    """
+    Ejecuta `make_call(False)`; si supera el p95 del paso y hay presupuesto,
+    lanza `make_call(True)` (hedge, thread nuevo) en paralelo. Devuelve el
+    primer resultado válido y cancela el otro. Si ambos fallan, propaga el
+    error del primario.
+    """
+    budget.on_primary()
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(_timed(make_call(False)))
+    after = hedge_after(step)
+
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=after)
+    except asyncio.CancelledError:
+        await _cancel(primary)
+        raise
+    if done or not budget.try_acquire():
+        result, elapsed = await primary
+        latency.record(step, elapsed)
+        return result
+
+    print(f"🪁 {step}: supera p95 ({after:.1f}s) → lanzando hedge en thread nuevo")
+    hedge = asyncio.ensure_future(_timed(make_call(True)))
+    pending = {primary, hedge}
+    primary_error: Optional[BaseException] = None
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    if task is primary:
+                        primary_error = task.exception()
+                    continue
+                result, elapsed = task.result()
+                if is_valid is not None and not is_valid(result):
+                    continue
+                if task is hedge:
+                    budget.won += 1
+                    # El primario lento también cuenta (cota inferior) para no sesgar el p95
+                    latency.record(step, time.perf_counter() - started)
+                else:
+                    latency.record(step, elapsed)
+                for loser in pending:
+                    await _cancel(loser)
+                return result
+    finally:
+        budget.release()
+        for task in (primary, hedge):
+            if not task.done():
+                await _cancel(task)
+
+    if primary_error is not None:
+        raise primary_error
+    # Ninguno devolvió un resultado válido: se entrega el del primario
+    return primary.result()[0]
+
+
+def status() -> Dict[str, Any]:
+    return {
+        "enabled": settings.ESG_HEDGE_ENABLED,
+        "budget": budget.snapshot(),
+        "latency": latency.snapshot(),
+    }
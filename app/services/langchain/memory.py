@@ -0,0 +1,173 @@
+"""
+Contabilidad de memoria por análisis y retención acotada de salidas crudas.
+
+Cada corrida guarda el texto crudo de los pasos solo mientras hace falta
+(rescate de filas, diagnóstico de un paso fallido): comprimido con zlib y,
+por encima de `ESG_RAW_SPILL_BYTES`, escrito a un archivo temporal. Los
+bytes retenidos por la corrida (crudos + salidas parseadas) se cuentan
+para exponer el pico por análisis y dimensionar los workers.
+
+Los tamaños de las salidas parseadas son estimados (largo del JSON
+compacto), no mediciones del heap.
+"""
+
+import os
+import tempfile
+import threading
+import zlib
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.responses import dumps
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Errores y salidas en logs: como máximo esta cantidad de caracteres
+LOG_PREVIEW_CHARS = 300
+
+
+def preview(value: Any, limit: int = LOG_PREVIEW_CHARS) -> str:
+    """Texto acotado para logs (los errores de LangChain traen el JSON entero del run)."""
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}… (+{len(text) - limit} caracteres)"
+
+
+def payload_size(value: Any) -> int:
+    """Tamaño estimado de una salida parseada (bytes de su JSON compacto)."""
+    try:
+        return len(dumps(value))
+    except TypeError:
+        return len(str(value))
+
+
+def process_peak_rss_mb() -> Optional[float]:
+    """Pico de RSS del proceso (ru_maxrss: KB en Linux, bytes en macOS)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+# ==========================================================
+# 📊 Agregado del proceso (todas las corridas del worker)
+# ==========================================================
+_lock = threading.Lock()
+_active: Dict[int, "RunMemory"] = {}
+_max_run_peak = 0
+_finished = 0
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "active_runs": len(_active),
+            "retained_bytes": sum(m.current for m in _active.values()),
+            "max_run_peak_bytes": _max_run_peak,
+            "finished_runs": _finished,
+            "process_peak_rss_mb": process_peak_rss_mb(),
+        }
+
+
+# ==========================================================
+# 🧠 Memoria de una corrida
+# ==========================================================
+class RunMemory:
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.sizes: Dict[str, int] = {}
+        # step → (bytes comprimidos | ruta en disco, largo original)
+        self._raw: Dict[str, Any] = {}
+        self.raw_in_memory = 0
+        self.raw_on_disk = 0
+        self.spilled = 0
+        self.rss_start_mb = process_peak_rss_mb()
+        with _lock:
+            _active[id(self)] = self
+
+    # -------- contabilidad --------
+    def _account(self, key: str, size: int):
+        self.current += size - self.sizes.get(key, 0)
+        if size:
+            self.sizes[key] = size
+        else:
+            self.sizes.pop(key, None)
+        self.peak = max(self.peak, self.current)
+
+    def track(self, step: str, value: Any):
+        self._account(f"out:{step}", payload_size(value) if value is not None else 0)
+
+    def release(self, step: str):
+        self._account(f"out:{step}", 0)
+
+    # -------- salidas crudas --------
+    def put_raw(self, step: str, text: str):
+        """Reemplaza el crudo del paso: comprimido en memoria o, si es grande, en disco."""
+        self.drop_raw(step)
+        if not text:
+            return
+        blob = zlib.compress(text.encode("utf-8"), 1)
+        if len(blob) > settings.ESG_RAW_SPILL_BYTES:
+            fd, path = tempfile.mkstemp(prefix="esg-raw-", suffix=".z")
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            self._raw[step] = path
+            self.raw_on_disk += len(blob)
+            self.spilled += 1
+        else:
+            self._raw[step] = blob
+            self.raw_in_memory += len(blob)
+            self._account(f"raw:{step}", len(blob))
+
+    def raw(self, step: str) -> str:
+        stored = self._raw.get(step)
+        if stored is None:
+            return ""
+        if isinstance(stored, str):
+            with open(stored, "rb") as f:
+                stored = f.read()
+        return zlib.decompress(stored).decode("utf-8")
+
+    def drop_raw(self, step: str):
+        stored = self._raw.pop(step, None)
+        if stored is None:
+            return
+        if isinstance(stored, str):
+            self.raw_on_disk -= os.path.getsize(stored)
+            os.unlink(stored)
+        else:
+            self.raw_in_memory -= len(stored)
+            self._account(f"raw:{step}", 0)
+
+    # -------- cierre --------
+    def close(self):
+        """Borra los crudos que quedaron (también los de disco) y cierra la cuenta."""
+        global _max_run_peak, _finished
+        for step in list(self._raw):
+            self.drop_raw(step)
+        with _lock:
+            _active.pop(id(self), None)
+            _max_run_peak = max(_max_run_peak, self.peak)
+            _finished += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        rss = process_peak_rss_mb()
+        return {
+            "retained_bytes": self.current,
+            "peak_bytes": self.peak,
+            "raw_in_memory_bytes": self.raw_in_memory,
+            "raw_on_disk_bytes": self.raw_on_disk,
+            "raw_spilled": self.spilled,
+            "process_peak_rss_mb": rss,
+            # Cuánto subió el pico del proceso durante esta corrida (con
+            # corridas concurrentes, el aumento puede ser de otra)
+            "process_peak_growth_mb": (
+                round(rss - self.rss_start_mb, 1) if rss is not None and self.rss_start_mb is not None else None
+            ),
+        }
@@ -11,32 +11,16 @@ from app.services.langchain.prompts import (
     prompt_9, prompt_10, prompt_11,
 )
 from app.utils.json_formatter import clean_and_parse_json, try_fix_json
-from app.core.config import settings
-from langchain_community.agents.openai_assistant import OpenAIAssistantV2Runnable
-from app.services.langchain.workflows import validate_min_lengths
+from app.services.langchain.clients import get_registry
+from app.services.langchain.validation import validate_min_lengths
 from app.services.pdf_generator import PDFGenerator
 
 # ======================================================
-# ⚙️ Configurar el asistente una sola vez
+# ⚙️ Asistente con archivos en code_interpreter (ver clients.ASSISTANTS)
 # ======================================================
-os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
-
-assistant = OpenAIAssistantV2Runnable(
-    assistant_id='asst_uN6jjvZ9s4Yv2PFmV1J4iRJB',
-    tools=[
-        {
-            "type": "code_interpreter",
-            "file_ids": [
-                "file-LzzGj4YJdW1T4bsNp9EcCD",
-                "file-96uwnReXqbEbh97miBRJd5",
-                "file-6UCacZ7WF2eGxcuZuqPnuD",
-                "file-4dixqFDgMjDU39mAEewmRw",
-                "file-Sy8QSZkhRsZdkG7oMU3xNZ",
-                "file-WucnFWVfve87jhWqW9DH4",
-            ]
-        }
-    ],
-)
+def assistant():
+    return get_registry().get("esg_files")
+
 
 # ======================================================
 # 🧱 1️⃣ Funciones por Prompt (sin reintentos globales)
@@ -45,7 +29,7 @@ assistant = OpenAIAssistantV2Runnable(
 async def run_prompt_1(data, thread_id=None):
     print("🧭 Ejecutando Prompt 1")
     try:
-        response = await assistant.ainvoke({
+        response = await assistant().ainvoke({
             "content": prompt_1.format(
                 organization_name=data["organization_name"],
                 country=data["country"],
@@ -74,7 +58,7 @@ async def run_prompt_1(data, thread_id=None):
 async def run_prompt_2(data, thread_id=None):
     print("🧭 Ejecutando Prompt 2 (con 2.1 si hace falta)")
     try:
-        response = await assistant.ainvoke({
+        response = await assistant().ainvoke({
             "content": prompt_2.format(
                 organization_name=data["organization_name"],
                 country=data["country"],
@@ -94,7 +78,7 @@ async def run_prompt_2(data, thread_id=None):
         # 🔁 Sub-retry interno
         if len(rows) < 15 and not exhausted:
             print("⚠️ Ejecutando Prompt 2.1 para completar filas")
-            response_2 = await assistant.ainvoke({
+            response_2 = await assistant().ainvoke({
                 "content": prompt_2_1.format(
                     organization_name=data["organization_name"],
                     country=data["country"],
@@ -124,7 +108,7 @@ async def run_prompt_2(data, thread_id=None):
 async def run_prompt_generic(prompt, data, thread_id=None):
     print(f"🧭 Ejecutando {prompt.name}")
     try:
-        response = await assistant.ainvoke({
+        response = await assistant().ainvoke({
             "content": prompt.template,
             **({"thread_id": thread_id} if thread_id else {})
         })
@@ -0,0 +1,107 @@
+"""
+Registro de prompts: versión, hash de contenido y costo en tokens por paso.
+
+prompts.py registra cada template al definirlo; aquí se calcula el hash
+(cambia con cualquier edición de texto) y el costo estático de entrada, que
+se imprime en el warm-up y mide scripts/bench_prompt_tokens.py para
+detectar prompts que crecen antes de que cuesten latencia.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.services.langchain.context import estimate_tokens
+
+ENCODING = "o200k_base"
+
+
+@dataclass
+class PromptEntry:
+    key: str
+    prompt: Any  # PromptTemplate
+    version: str
+    content_hash: str
+    shared: List[str] = field(default_factory=list)
+
+    @property
+    def ref(self) -> str:
+        return f"v{self.version}@{self.content_hash}"
+
+
+REGISTRY: Dict[str, PromptEntry] = {}
+SHARED_BLOCKS: Dict[str, str] = {}
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def register_shared(name: str, text: str) -> str:
+    SHARED_BLOCKS[name] = text
+    return text
+
+
+def register(key: str, prompt: Any, version: str, shared: Optional[List[str]] = None):
+    REGISTRY[key] = PromptEntry(key, prompt, version, content_hash(prompt.template), list(shared or []))
+    return prompt
+
+
+def get(key: str) -> PromptEntry:
+    return REGISTRY[key]
+
+
+def versions() -> Dict[str, str]:
+    """{paso: "v<versión>@<hash>"} — se guarda junto a cada análisis."""
+    return {key: entry.ref for key, entry in REGISTRY.items()}
+
+
+# ==========================================================
+# 🔢 Conteo de tokens
+# ==========================================================
+_encoder: Any = None
+
+
+def _get_encoder():
+    """tiktoken si el encoding está disponible localmente; si no, False (estimación)."""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+
+            _encoder = tiktoken.get_encoding(ENCODING)
+        except Exception:
+            _encoder = False
+    return _encoder
+
+
+def counter_name() -> str:
+    return f"tiktoken:{ENCODING}" if _get_encoder() else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def token_report() -> List[Dict[str, Any]]:
+    """Costo estático de entrada por paso (template sin datos) y parte compartida."""
+    rows = []
+    for key, entry in REGISTRY.items():
+        rows.append({
+            "step": key,
+            "ref": entry.ref,
+            "tokens": count_tokens(entry.prompt.template),
+            "shared_tokens": sum(count_tokens(SHARED_BLOCKS.get(name, "")) for name in entry.shared),
+        })
+    return rows
+
+
+def print_report():
+    rows = token_report()
+    print(f"📚 Prompts registrados ({len(rows)}, contador {counter_name()}):")
+    for r in rows:
+        print(f"   {r['step']:<11} {r['ref']:<20} {r['tokens']:>6} tokens (compartidos {r['shared_tokens']})")
+    print(f"   {'TOTAL':<11} {'':<20} {sum(r['tokens'] for r in rows):>6} tokens")
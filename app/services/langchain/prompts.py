@@ -1,5 +1,23 @@
 from langchain.prompts import PromptTemplate
 
+from app.services.langchain.prompt_registry import register, register_shared
+
+# ==========================================================
+# 📏 Instrucciones compartidas (una sola definición)
+# ==========================================================
+# Sin llaves: se puede anteponer tanto a templates con .format() como a los
+# que se usan tal cual (.template).
+GLOBAL_JSON_RULES = register_shared("GLOBAL_JSON_RULES", """
+    ⚠️ FORMATO (OBLIGATORIO)
+    - Devuelve únicamente un JSON válido, sin texto, títulos, comentarios ni markdown (ni ```, ni #, ni negritas) antes o después.
+    - Escapa las comillas internas así: \\"texto\\". Evita saltos de línea innecesarios dentro de valores extensos.
+    - Verifica comas, llaves y corchetes; si el JSON no es válido, regenéralo antes de enviarlo.
+""")
+
+# Los prompts que se envían tal cual (.template, sin variables) usan
+# "mustache": las llaves simples de sus ejemplos JSON quedan literales.
+RAW_FORMAT = "mustache"
+
 # Prompt 1: Contexto organizacional y Sectorial
 
 prompt_1 = PromptTemplate(
@@ -61,12 +79,7 @@ prompt_1 = PromptTemplate(
 
 prompt_2 = PromptTemplate(
     name="🔹 Prompt 2: Identificación de Impactos (basado en S&P)",
-    template="""
-
-        INSTRUCCIONES GLOBALES DE FORMATO
-        - Devuelve únicamente un JSON válido.
-        - No incluyas texto antes ni después del JSON.
-        - Escapa comillas internas como: \\"texto\\".
+    template=GLOBAL_JSON_RULES + """
 
         🎯 Objetivo  
         Extraer del PDF “materiality_map_sp_nuevo.pdf” **todas las filas** asociadas al sector S&P que coincida con la industria:
@@ -95,21 +108,16 @@ prompt_2 = PromptTemplate(
         5. Trae **todas** las filas del sector.  
         6. Si ya no hay más filas, agrega `"exhausted": true`.  
 
-        📦 Estructura de salida obligatoria:
+        📦 Estructura de salida obligatoria (formato compacto):
+        - "columns" va UNA sola vez; cada fila es un arreglo de valores en ESE MISMO orden.
+        - No repitas los nombres de columna dentro de las filas.
         {{
-            "materiality_table": [
-                {{
-                    "sector": "string",
-                    "tema": "string",
-                    "materialidad_financiera": "string (Baja, Media o Alta)",
-                    "valor_materialidad_financiera": "number (0, 2.5 o 5)",
-                    "Riesgos": "string",
-                    "Oportunidades": "string",
-                    "accion_marginal": "string",
-                    "accion_moderada": "string",
-                    "accion_estructural": "string"
-                }}
-            ],
+            "materiality_table": {{
+                "columns": ["sector", "tema", "materialidad_financiera", "valor_materialidad_financiera", "Riesgos", "Oportunidades", "accion_marginal", "accion_moderada", "accion_estructural"],
+                "rows": [
+                    ["string", "string", "Baja | Media | Alta", 0 | 2.5 | 5, "string", "string", "string", "string", "string"]
+                ]
+            }},
             "exhausted": false
         }}
 
@@ -126,15 +134,7 @@ prompt_2 = PromptTemplate(
 prompt_2_1 = PromptTemplate(
     name="🔹 Prompt 2.1: Continuación de la Identificación de Impactos (basado en S&P)",
     input_variables=["prev_rows"],
-    template="""
-    ⚠️ INSTRUCCIONES GLOBALES DE FORMATO (OBLIGATORIAS)
-    Devuelve únicamente un JSON válido.
-    No incluyas texto antes ni después del JSON.
-    No uses markdown ni explicaciones.
-    Si usas comillas internas, escápalas así: \"texto\".
-    Asegúrate de que todas las comas, llaves y valores sean válidos JSON.
-    Si el JSON no es válido, regenera la respuesta antes de enviarla.
-
+    template=GLOBAL_JSON_RULES + """
     --- CONTEXTO ---
     Ya tienes una tabla parcial de materialidad con este contenido previo:
     {prev_rows}
@@ -149,9 +149,9 @@ prompt_2_1 = PromptTemplate(
     - NO debes repetir ni duplicar ningún tema ni ninguna fila equivalente.
     - Si consideras que el prompt anterior ya trajo todas las filas relevantes posibles (es decir, no hay más temas nuevos que agregar),
       entonces NO agregues nada más y devuelve exactamente:
-      {
+      {{
         "materiality_table": []
-      }
+      }}
 
     --- REGLAS DE CANTIDAD ---
     - Si identificas que todavía hay temas adicionales relevantes:
@@ -159,16 +159,16 @@ prompt_2_1 = PromptTemplate(
       - Mantén la coherencia con el sector y estilo del Prompt 2.
     - Nunca dupliques un "tema" que ya esté en las filas previas.
     - Si al intentar generar nuevas filas descubres que terminarías repitiendo temas, devuelve igualmente:
-      {
+      {{
         "materiality_table": []
-      }
+      }}
 
     --- FORMATO OBLIGATORIO ---
     Devuelve SIEMPRE un JSON con esta forma:
 
-    {
+    {{
         "materiality_table": [
-            {
+            {{
                 "sector": "string",
                 "tema": "string",
                 "materialidad_financiera": "string (Baja, Media o Alta)",
@@ -178,9 +178,9 @@ prompt_2_1 = PromptTemplate(
                 "accion_marginal": "string",
                 "accion_moderada": "string",
                 "accion_estructural": "string"
-            }
+            }}
         ]
-    }
+    }}
 
     Requisitos adicionales:
     - Usa exactamente las claves anteriores, incluyendo mayúsculas en "Riesgos" y "Oportunidades".
@@ -194,23 +194,13 @@ prompt_2_1 = PromptTemplate(
 # Prompt 3: Análisis de doble materialidad
 prompt_3 = PromptTemplate(
     name="🔹 Prompt 3: Evaluación de Impactos",
-   template="""
-    ⚠️ INSTRUCCIONES GLOBALES DE FORMATO (OBLIGATORIAS)
-
-    Devuelve únicamente un JSON válido.
-    No incluyas texto antes ni después del JSON.
-    No incluyas explicaciones, títulos, markdown, comentarios ni caracteres adicionales.
-    Si usas comillas internas, escápalas así: \"texto\".
-    No uses saltos de línea innecesarios dentro de valores extensos.
-    Si detectas que el JSON no es válido, regenera automáticamente la respuesta antes de enviarla.
-    Prohibido usar cualquier tipo de markdown (incluyendo triple backticks, #, negritas, etc.).
-    Asegúrate de que todas las comas, llaves y corchetes estén correctamente colocados.
-    Si no puedes cumplir el formato, vuelve a generar la respuesta hasta que sea válida.
+    template_format=RAW_FORMAT,
+   template=GLOBAL_JSON_RULES + """
 
 
     --- INSTRUCCIONES ESPECÍFICAS DEL PROMPT ---
 
-    Analiza los temas materiales identificados en la Materiality Table y agrega las siguientes columnas:
+    Analiza los temas materiales de la materiality_table recibida y, para cada tema, determina las siguientes columnas:
 
     - tipo_impacto: Positivo o negativo
     - potencialidad_impacto: Real o potencial
@@ -221,17 +211,11 @@ prompt_3 = PromptTemplate(
 
     Además, debes incluir un campo adicional al final llamado "resumen_sector", que debe ser un párrafo conciso (mínimo 50 caracteres) explicando la selección sectorial S&P.
 
-    Formato obligatorio de salida:
+    Formato obligatorio de salida (SOLO las columnas nuevas, una fila por tema):
     {
-        "materiality_table": [
+        "materiality_delta": [
             {
-                "sector": "string",
-                "tema": "string",
-                "materialidad_financiera": "string",
-                "valor_materialidad_financiera": "decimal",
-                "accion_marginal": "string",
-                "accion_moderada": "string",
-                "accion_estructural": "string",
+                "tema": "string (copiado exactamente de la tabla recibida)",
                 "tipo_impacto": "string",
                 "potencialidad_impacto": "string",
                 "horizonte_impacto": "string",
@@ -244,8 +228,8 @@ prompt_3 = PromptTemplate(
     }
 
     IMPORTANTE:
-    - Tiene que tener la misma cantidad de columnas que en el prompt 2.
-    - No elimines columnas previas.
+    - Incluye TODOS los temas de la tabla recibida, sin repetirlos.
+    - NO repitas las columnas previas (sector, materialidad, acciones): se unen localmente por "tema".
     - No devuelvas texto adicional ni explicaciones fuera del JSON.
     - "resumen_sector" debe justificar brevemente el sector elegido.
     - Asegúrate de que el JSON sea válido y contenga todas las comas necesarias.
@@ -257,18 +241,8 @@ prompt_3 = PromptTemplate(
 # Prompt 4: Análisis de doble materialidad
 prompt_4 = PromptTemplate(
     name="🔹 Prompt 4: Evaluación de Impactos (doble materialidad)",
-   template="""
-    ⚠️ INSTRUCCIONES GLOBALES DE FORMATO (OBLIGATORIAS)
-
-    Devuelve únicamente un JSON válido.
-    No incluyas texto antes ni después del JSON.
-    No incluyas explicaciones, títulos, markdown, comentarios ni caracteres adicionales.
-    Si usas comillas internas, escápalas así: \"texto\".
-    No uses saltos de línea innecesarios dentro de valores extensos.
-    Si detectas que el JSON no es válido, regenera automáticamente la respuesta antes de enviarla.
-    Prohibido usar cualquier tipo de markdown (incluyendo triple backticks, #, negritas, etc.).
-    Asegúrate de que todas las comas, llaves y corchetes estén correctamente colocados.
-    Si no puedes cumplir el formato, vuelve a generar la respuesta hasta que sea válida.
+    template_format=RAW_FORMAT,
+   template=GLOBAL_JSON_RULES + """
 
 
     --- INSTRUCCIONES ESPECÍFICAS DEL PROMPT ---
@@ -277,39 +251,30 @@ prompt_4 = PromptTemplate(
         Priorizar los impactos asociados a cada tema material utilizando una evaluación combinada de criterios ESG y financieros.
 
         Instrucciones:
-        A la tabla generada anteriormente (Materiality Table), manteniendo toda su información, agrega las siguientes 4 columnas y asigna el valor correspondiente a cada tema material con base en su impacto:
+        Para cada tema de la materiality_table recibida, asigna el valor correspondiente a estas 3 columnas con base en su impacto:
 
         - Gravedad – Evalúa la severidad del impacto negativo. (0 a 5)
         - Probabilidad – Evalúa qué tan probable es que ocurra el impacto. (0 a 5)
         - Alcance – Evalúa qué tan amplio es el impacto. (0 a 5)
 
-        - Materialidad ESG – Suma: valor_materialidad_financiera + gravedad + probabilidad + alcance
+        La Materialidad ESG (valor_materialidad_financiera + gravedad + probabilidad + alcance) se calcula localmente: no la incluyas.
 
 
-        📦 Formato de salida obligatorio:
+        📦 Formato de salida obligatorio (SOLO las columnas nuevas, una fila por tema):
         {
-            "materiality_table": [
+            "materiality_delta": [
                 {
-                    "sector": "string",
-                    "tema": "string",
-                    "tipo_impacto": "string",
-                    "materialidad_financiera": "string (Baja, Media o Alta)",
-                    "potencialidad_impacto": "string",
-                    "horizonte_impacto": "string",
-                    "intencionalidad_impacto": "string",
-                    "penetracion_impacto": "string",
-                    "grado_implicacion": "string",
+                    "tema": "string (copiado exactamente de la tabla recibida)",
                     "gravedad": number,
                     "probabilidad": number,
-                    "alcance": number,
-                    "materialidad_esg": number
+                    "alcance": number
                 }
-            ],
+            ]
         }
 
         ⚠️ Importante:
-        - Tiene que tener la misma cantidad de columnas que en el prompt 2.
-        - No elimines columnas previas.
+        - Incluye TODOS los temas de la tabla recibida, sin repetirlos.
+        - NO repitas las columnas previas: se unen localmente por "tema".
         - No devuelvas texto adicional ni explicaciones fuera del JSON.
 
         ⚙️ Verificación final:
@@ -322,18 +287,8 @@ prompt_4 = PromptTemplate(
 #Prompt 5: Priorización de Temas
 prompt_5 = PromptTemplate(
     name="🔹 Prompt 5: Priorización de Temas",
-   template="""
-    ⚠️ INSTRUCCIONES GLOBALES DE FORMATO (OBLIGATORIAS)
-
-    Devuelve únicamente un JSON válido.
-    No incluyas texto antes ni después del JSON.
-    No incluyas explicaciones, títulos, markdown, comentarios ni caracteres adicionales.
-    Si usas comillas internas, escápalas así: \"texto\".
-    No uses saltos de línea innecesarios dentro de valores extensos.
-    Si detectas que el JSON no es válido, regenera automáticamente la respuesta antes de enviarla.
-    Prohibido usar cualquier tipo de markdown (incluyendo triple backticks, #, negritas, etc.).
-    Asegúrate de que todas las comas, llaves y corchetes estén correctamente colocados.
-    Si no puedes cumplir el formato, vuelve a generar la respuesta hasta que sea válida.
+    template_format=RAW_FORMAT,
+   template=GLOBAL_JSON_RULES + """
 
 
     --- INSTRUCCIONES ESPECÍFICAS DEL PROMPT ---
@@ -342,27 +297,16 @@ prompt_5 = PromptTemplate(
         Definir los 10 temas materiales prioritarios a partir de la evaluación de impactos previamente realizada.
 
         Instrucciones:
-         - Ordena la tabla de la Materiality Table de mayor a menor según el valor de la columna “Materialidad ESG”, sin modificar ningún valor o contenido existente en las filas.
+         - Considera la columna “materialidad_esg” de la materiality_table recibida.
          - Identifica los 10 temas con mayor puntaje total, los cuales serán considerados como los temas materiales priorizados del análisis.
-         - Para facilitar su seguimiento en los siguientes pasos, puedes destacarlos visualmente o etiquetarlos como "Tema Material" en una nueva columna. 
+         - En caso de empate, usa el resto de columnas de evaluación para decidir.
+         - El ordenamiento y el etiquetado de la tabla se hacen localmente: devuelve SOLO los 10 temas priorizados.
 
         Formato obligatorio de salida:
         {
-            "materiality_table": [
+            "materiality_delta": [
                 {
-                    "sector": "string",
-                    "tema": "string",
-                    "tipo_impacto": "string",
-                    "materialidad_financiera": "string (Baja, Media o Alta)",
-                    "potencialidad_impacto": "string",
-                    "horizonte_impacto": "string",
-                    "intencionalidad_impacto": "string",
-                    "penetracion_impacto": "string",
-                    "grado_implicacion": "string",
-                    "gravedad": number,
-                    "probabilidad": number,
-                    "alcance": number,
-                    "materialidad_esg": number
+                    "tema": "string (copiado exactamente de la tabla recibida)"
                 }
             ]
         }
@@ -372,18 +316,8 @@ prompt_5 = PromptTemplate(
 # Prompt 6: Análisis de doble materialidad
 prompt_6 = PromptTemplate(
     name="🔹 Prompt 6: Vínculo con Objetivos de Desarrollo Sostenible (ODS)",
-   template="""
-    ⚠️ INSTRUCCIONES GLOBALES DE FORMATO (OBLIGATORIAS)
-
-    Devuelve únicamente un JSON válido.
-    No incluyas texto antes ni después del JSON.
-    No incluyas explicaciones, títulos, markdown, comentarios ni caracteres adicionales.
-    Si usas comillas internas, escápalas así: \"texto\".
-    No uses saltos de línea innecesarios dentro de valores extensos.
-    Si detectas que el JSON no es válido, regenera automáticamente la respuesta antes de enviarla.
-    Prohibido usar cualquier tipo de markdown (incluyendo triple backticks, #, negritas, etc.).
-    Asegúrate de que todas las comas, llaves y corchetes estén correctamente colocados.
-    Si no puedes cumplir el formato, vuelve a generar la respuesta hasta que sea válida.
+    template_format=RAW_FORMAT,
+   template=GLOBAL_JSON_RULES + """
 
 
     --- INSTRUCCIONES ESPECÍFICAS DEL PROMPT ---
@@ -392,28 +326,26 @@ prompt_6 = PromptTemplate(
         Relacionar los 10 temas materiales priorizados con el Objetivo de Desarrollo Sostenible (ODS), su meta e indicador más directamente asociados.
 
         Instrucciones:
-        1. Mantén intacta la tabla de la Materiality Table: no elimines columnas ni modifiques su contenido existente.
-        2. Agrega estas columnas al final:
+        1. No repitas la materiality_table: devuelve solo las columnas nuevas por tema (se unen localmente por "tema").
+        2. Columnas a completar:
             - "ods" – El Objetivo de Desarrollo Sostenible más directamente relacionado con el tema material.
             - "meta_ods" – La meta de ese ODS más estrechamente alineada semánticamente con el tema.
         3. Utiliza únicamente el documento “lista_ods_adaptia.pdf” como fuente de información. 
             - "indicador_ods" – El indicador correspondiente a la meta seleccionada (misma fila del documento de referencia).
-        4. Para cada uno de los 10 temas materiales (etiquetados como “Material” en la tabla):
+        4. Para cada tema material recibido (con "tema_material": true; pueden ser menos de 10):
             - Revisa los 17 ODS completos y selecciona el que tenga la relación más fuerte y directa con el tema.
             - Una vez elegido el ODS, revisa todas sus metas y selecciona la más directamente vinculada al tema.
             - Copia también el indicador que corresponde a esa meta (misma fila del documento de referencia).
-        5.  Para los temas que no están priorizados como “Material”:
-        - No los elimines.
-        - Completa las tres nuevas columnas con “NA” para indicar que no fueron analizados en esta dimensión.
+        5.  Los temas que no están priorizados NO se incluyen en la salida (se completan localmente con “NA”).
 
         Nota:
         El vínculo debe ser único por tema (solo un ODS, una meta y un indicador), priorizando siempre la opción más específica y semánticamente cercana.
 
-        Formato obligatorio de salida:
+        Formato obligatorio de salida (solo los 10 temas priorizados):
         {
-            "materiality_table": [
+            "materiality_delta": [
                 {
-                    "tema": "string",
+                    "tema": "string (copiado exactamente de la tabla recibida)",
                     "prioridad": "string",
                     "meta_ods": "string",
                     "indicador_ods": "string"
@@ -430,6 +362,7 @@ prompt_6 = PromptTemplate(
 
 prompt_7 = PromptTemplate(
     name="🔹 Prompt 7: Mapeo de Contenidos GRI",
+    template_format=RAW_FORMAT,
     template="""
     --- INSTRUCCIONES ESPECÍFICAS DEL PROMPT ---
 
@@ -452,7 +385,7 @@ prompt_7 = PromptTemplate(
     }
 
     Alcance:
-    - Procesar exactamente los 10 temas materiales recibidos.
+    - Procesar exactamente los temas materiales recibidos (pueden ser menos de 10).
     - Por cada tema, buscar coincidencias en la columna A del PDF (Tema S&P).
     - La búsqueda debe ser:
         • NO sensible a mayúsculas/minúsculas  
@@ -468,7 +401,7 @@ prompt_7 = PromptTemplate(
         E → Requerimiento  
 
     Instrucciones:
-    1. Itera cada uno de los 10 temas recibidos en materiality_table_priorizada.
+    1. Itera cada uno de los temas recibidos en materiality_table_priorizada.
     2. Para cada tema:
         - Buscar en TODAS las filas del PDF.
         - Identificar cuales filas tienen coincidencias con el texto del “tema”.
@@ -476,28 +409,27 @@ prompt_7 = PromptTemplate(
         - NO modificar el texto, respetar 100% lo que dice el PDF.
     3. Agregar todos los resultados a un solo arreglo final
        (sin repetir filas idénticas).
-    4. Verificar que cada uno de los 10 temas tenga al menos una coincidencia.
-       Si no hay coincidencias, incluir:
-         { "estandar_gri": "no_matches_for_this_topic" }
+    4. Verificar que cada uno de los temas recibidos tenga al menos una coincidencia.
+       Si no hay coincidencias, incluir la fila:
+         ["no_matches_for_this_topic", "", "", ""]
        para ese tema, pero NO inventar contenido.
 
-    Formato de salida obligatorio:
+    Formato de salida obligatorio (compacto: "columns" una sola vez y cada fila
+    como arreglo de valores en ese mismo orden):
     {
-        "gri_mapping": [
-            {
-                "estandar_gri": "string",
-                "numero_contenido": "string",
-                "contenido": "string",
-                "requerimiento": "string"
-            }
-        ]
+        "gri_mapping": {
+            "columns": ["estandar_gri", "numero_contenido", "contenido", "requerimiento"],
+            "rows": [
+                ["string", "string", "string", "string"]
+            ]
+        }
     }
 
     Control de calidad:
     - Revisar todas las filas (122 o más, según PDF).
     - Respetar texto EXACTO.
     - Eliminar duplicados.
-    - Debe haber resultados para los 10 temas.
+    - Debe haber resultados para todos los temas recibidos.
     """
 )
 
@@ -586,6 +518,7 @@ prompt_9 = PromptTemplate(
 #Prompt 10: Vinculación Normativa por Tema Material (GAIL)
 prompt_10 = PromptTemplate(
     name="🔹 Prompt 10: Vinculación Normativa por Tema Material (GAIL)",
+    template_format=RAW_FORMAT,
    template="""
     --- INSTRUCCIONES ESPECÍFICAS DEL PROMPT ---
 
@@ -594,8 +527,8 @@ prompt_10 = PromptTemplate(
 
         Instrucciones:
         - Usa “mapeo_regulatorio_adaptia.pdf”.
-        - Filtra la información por el país de operación analizado (según resultado del prompt #1).
-        - Para cada uno de los 10 temas materiales priorizados:
+        - Filtra la información por el país de operación recibido (pais_operacion).
+        - Para cada uno de los temas materiales priorizados recibidos (pueden ser menos de 10):
             1. Revisa todas las regulaciones disponibles para el país siendo analizado.
             2. Evalúa la coincidencia semántica entre nombre del tema material y la descripción de cada normativa (Descripción).
             3. Selecciona SOLO una normativa, la de mayor relevancia para este tema.
@@ -608,15 +541,15 @@ prompt_10 = PromptTemplate(
         - Si varias normativas empatan en relevancia, selecciona la más reciente o de mayor aplicabilidad nacional.
 
 
-        Formato obligatorio:
+        Formato obligatorio (compacto: "columns" una sola vez y cada fila como
+        arreglo de valores en ese mismo orden):
         {
-            "regulaciones": [
-                {
-                    "tipo_regulacion": "string",
-                    "descripcion": "string",
-                    "vigencia": "string",
-                }
-            ]
+            "regulaciones": {
+                "columns": ["tipo_regulacion", "descripcion", "vigencia"],
+                "rows": [
+                    ["string", "string", "string"]
+                ]
+            }
         }
     """
 )
@@ -624,18 +557,8 @@ prompt_10 = PromptTemplate(
 
 prompt_11 = PromptTemplate(
     name="🔹 Prompt 11: Estrategia de Sostenibilidad (Resumen Ejecutivo)",
-   template="""
-    ⚠️ INSTRUCCIONES GLOBALES DE FORMATO (OBLIGATORIAS)
-
-    Devuelve únicamente un JSON válido.
-    No incluyas texto antes ni después del JSON.
-    No incluyas explicaciones, títulos, markdown, comentarios ni caracteres adicionales.
-    Si usas comillas internas, escápalas así: \"texto\".
-    No uses saltos de línea innecesarios dentro de valores extensos.
-    Si detectas que el JSON no es válido, regenera automáticamente la respuesta antes de enviarla.
-    Prohibido usar cualquier tipo de markdown (incluyendo triple backticks, #, negritas, etc.).
-    Asegúrate de que todas las comas, llaves y corchetes estén correctamente colocados.
-    Si no puedes cumplir el formato, vuelve a generar la respuesta hasta que sea válida.
+    template_format=RAW_FORMAT,
+   template=GLOBAL_JSON_RULES + """
 
 
     --- INSTRUCCIONES ESPECÍFICAS DEL PROMPT ---
@@ -659,3 +582,22 @@ prompt_11 = PromptTemplate(
         }
     """
 )
+
+
+# ==========================================================
+# 📚 Registro: versión y hash de contenido por paso
+# ==========================================================
+# Subir la versión al cambiar el sentido de un prompt; el hash detecta
+# cualquier cambio de texto (se guarda en las métricas de cada análisis).
+register("prompt_1", prompt_1, version="1")
+register("prompt_2", prompt_2, version="3", shared=["GLOBAL_JSON_RULES"])
+register("prompt_2_1", prompt_2_1, version="2", shared=["GLOBAL_JSON_RULES"])
+register("prompt_3", prompt_3, version="3", shared=["GLOBAL_JSON_RULES"])
+register("prompt_4", prompt_4, version="3", shared=["GLOBAL_JSON_RULES"])
+register("prompt_5", prompt_5, version="3", shared=["GLOBAL_JSON_RULES"])
+register("prompt_6", prompt_6, version="3", shared=["GLOBAL_JSON_RULES"])
+register("prompt_7", prompt_7, version="3")
+register("prompt_8", prompt_8, version="1")
+register("prompt_9", prompt_9, version="1")
+register("prompt_10", prompt_10, version="3")
+register("prompt_11", prompt_11, version="2", shared=["GLOBAL_JSON_RULES"])
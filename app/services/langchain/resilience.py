@@ -0,0 +1,334 @@
+"""
+Política central de reintentos y circuit breaker para el Assistants API.
+
+- `classify_error` separa errores fatales (cuota, auth, request inválido)
+  de los reintentables (rate limit, timeout, 5xx/conexión) y de las
+  salidas inválidas del modelo.
+- `RetryPolicy` aplica backoff exponencial con jitter completo y un
+  presupuesto de intentos por paso (STEP_POLICIES).
+- `CircuitBreaker` abre el circuito cuando la tasa de errores upstream
+  supera el umbral: las llamadas fallan rápido (o esperan, según
+  ESG_BREAKER_MODE) en lugar de dormir minutos durante una caída.
+"""
+
+import asyncio
+import random
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.services.langchain import costs, deadline
+
+T = TypeVar("T")
+
+
+# ==========================================================
+# 🏷️ Clasificación de errores
+# ==========================================================
+class ErrorKind(str, Enum):
+    QUOTA = "quota"
+    RATE_LIMIT = "rate_limit"
+    TIMEOUT = "timeout"
+    TRANSIENT = "transient"
+    INVALID_OUTPUT = "invalid_output"
+    FATAL = "fatal"
+
+
+RETRYABLE = {ErrorKind.RATE_LIMIT, ErrorKind.TIMEOUT, ErrorKind.TRANSIENT}
+UPSTREAM = RETRYABLE
+
+
+class UpstreamUnavailable(RuntimeError):
+    """El upstream no puede atender (cuota agotada o circuito abierto)."""
+
+
+class QuotaExceeded(UpstreamUnavailable):
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+class RunFailed(ValueError):
+    """
+    El run terminó en un estado distinto de completed. Lleva el estado y
+    `last_error` del run: se clasifica por su código, no por el texto del
+    volcado (ids y timestamps pueden contener "503" o "timeout").
+    """
+
+    def __init__(self, message: str, status: str, last_error: Any = None):
+        super().__init__(message)
+        self.status = status
+        self.code: Optional[str] = getattr(last_error, "code", None)
+        self.error_message: str = getattr(last_error, "message", None) or ""
+
+
+# `last_error.code` de un run fallido (los códigos desconocidos son fatales)
+RUN_ERROR_KINDS: Dict[str, ErrorKind] = {
+    "server_error": ErrorKind.TRANSIENT,
+    "rate_limit_exceeded": ErrorKind.RATE_LIMIT,
+    "invalid_prompt": ErrorKind.FATAL,
+}
+
+
+def _classify_run(e: RunFailed) -> ErrorKind:
+    if e.status == "expired":
+        return ErrorKind.TIMEOUT
+    if e.status == "incomplete":
+        # Salida cortada por límite de tokens: se rehace como salida inválida
+        return ErrorKind.INVALID_OUTPUT
+    if e.status != "failed":
+        # cancelled, requires_action: reintentar no cambia nada
+        return ErrorKind.FATAL
+    if e.code is None:
+        # Falla sin detalle del servidor: se trata como transitoria
+        return ErrorKind.TRANSIENT
+    kind = RUN_ERROR_KINDS.get(e.code, ErrorKind.FATAL)
+    if kind == ErrorKind.RATE_LIMIT and "quota" in e.error_message.lower():
+        return ErrorKind.QUOTA
+    return kind
+
+
+def classify_error(e: BaseException) -> ErrorKind:
+    if isinstance(e, QuotaExceeded):
+        return ErrorKind.QUOTA
+    if isinstance(e, RunFailed):
+        return _classify_run(e)
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+        return ErrorKind.TIMEOUT
+
+    try:
+        import openai
+
+        if isinstance(e, openai.RateLimitError):
+            return ErrorKind.QUOTA if "insufficient_quota" in str(e) else ErrorKind.RATE_LIMIT
+        if isinstance(e, openai.APITimeoutError):
+            return ErrorKind.TIMEOUT
+        if isinstance(e, (openai.APIConnectionError, openai.InternalServerError)):
+            return ErrorKind.TRANSIENT
+        if isinstance(e, (openai.AuthenticationError, openai.PermissionDeniedError,
+                          openai.BadRequestError, openai.NotFoundError)):
+            return ErrorKind.FATAL
+    except ImportError:
+        pass
+
+    # Errores de otras librerías: solo queda el texto
+    err = str(e).lower()
+    if "insufficient_quota" in err:
+        return ErrorKind.QUOTA
+    if "rate_limit" in err or "tokens per minute" in err:
+        return ErrorKind.RATE_LIMIT
+    if "timeout" in err or "timed out" in err or "expired" in err:
+        return ErrorKind.TIMEOUT
+    if any(s in err for s in ("server_error", "overloaded", "connection")) or re.search(r"\b50[234]\b", err):
+        return ErrorKind.TRANSIENT
+    if isinstance(e, (ValueError, KeyError, TypeError)):
+        return ErrorKind.INVALID_OUTPUT
+    return ErrorKind.FATAL
+
+
+def retry_after(e: BaseException) -> Optional[float]:
+    """Segundos indicados por el servidor (header Retry-After), si los hay."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ==========================================================
+# 🔁 Política de reintentos
+# ==========================================================
+@dataclass(frozen=True)
+class RetryPolicy:
+    # Intentos ante errores upstream (rate limit, timeout, 5xx)
+    max_attempts: int = 4
+    # Intentos ante salidas inválidas del modelo (JSON roto, delta incompleta)
+    output_attempts: int = 3
+    base_delay_s: float = 2.0
+    max_delay_s: float = 60.0
+
+    def delay(self, attempt: int, kind: ErrorKind, server_hint: Optional[float] = None) -> float:
+        """Backoff exponencial con jitter completo; rate limit usa su propia escala."""
+        if kind == ErrorKind.RATE_LIMIT:
+            base, cap = settings.ESG_RATE_LIMIT_BASE_S, settings.ESG_RATE_LIMIT_MAX_S
+        else:
+            base, cap = self.base_delay_s, self.max_delay_s
+        if server_hint is not None:
+            return min(cap, server_hint) + random.uniform(0, base)
+        return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+DEFAULT_POLICY = RetryPolicy(
+    base_delay_s=settings.ESG_RETRY_BASE_S, max_delay_s=settings.ESG_RETRY_MAX_S
+)
+
+STEP_POLICIES: Dict[str, RetryPolicy] = {
+    "prompt_1": RetryPolicy(4, 4, settings.ESG_RETRY_BASE_S, settings.ESG_RETRY_MAX_S),
+    # Prompt 2: pocas filas no es error upstream; lo reintenta el quality gate
+    # (MIN_ROWS_PROMPT_2 en validation.py) dentro de output_attempts
+    "prompt_2": RetryPolicy(4, 4, settings.ESG_RETRY_BASE_S, settings.ESG_RETRY_MAX_S),
+}
+
+
+def policy_for(step: str) -> RetryPolicy:
+    return STEP_POLICIES.get(step, DEFAULT_POLICY)
+
+
+# ==========================================================
+# ⚡ Circuit breaker
+# ==========================================================
+class CircuitBreaker:
+    """
+    closed → open cuando, en la ventana de `window_s`, hay al menos
+    `min_calls` llamadas y la tasa de errores upstream >= `error_rate`.
+    open → half_open tras `open_s`; en half_open pasa una sola llamada de
+    prueba: si sale bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, window_s: float, min_calls: int, error_rate: float, open_s: float):
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_s = open_s
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._events: Deque[Tuple[float, bool]] = deque()
+
+    def _trim(self, now: float):
+        while self._events and now - self._events[0][0] > self.window_s:
+            self._events.popleft()
+
+    def _stats(self) -> Tuple[int, float]:
+        self._trim(time.monotonic())
+        total = len(self._events)
+        errors = sum(1 for _, ok in self._events if not ok)
+        return total, (errors / total if total else 0.0)
+
+    def _refresh(self):
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.open_s:
+            self.state = "half_open"
+            self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.open_s - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        self._refresh()
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    async def before_call(self):
+        """Falla rápido o espera (ESG_BREAKER_MODE=wait) mientras el circuito está abierto."""
+        wait_until = time.monotonic() + settings.ESG_BREAKER_MAX_WAIT_S
+        while not self.allow():
+            if settings.ESG_BREAKER_MODE != "wait" or time.monotonic() >= wait_until:
+                raise CircuitOpen(
+                    f"❌ Circuito abierto: OpenAI con tasa de errores alta "
+                    f"(reintentar en {self.retry_in():.0f}s)"
+                )
+            await deadline.sleep(min(1.0, self.retry_in() or 0.5))
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._events.clear()
+        print(f"⚡ Circuit breaker ABIERTO por {self.open_s:.0f}s")
+
+    def record_success(self):
+        self._events.append((time.monotonic(), True))
+        if self.state == "half_open":
+            print("✅ Circuit breaker cerrado")
+            self.state = "closed"
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        now = time.monotonic()
+        self._events.append((now, False))
+        if self.state == "half_open":
+            self._open()
+            return
+        total, rate = self._stats()
+        if self.state == "closed" and total >= self.min_calls and rate >= self.error_rate:
+            self._open()
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refresh()
+        total, rate = self._stats()
+        return {
+            "state": self.state,
+            "calls_in_window": total,
+            "error_rate": round(rate, 3),
+            "times_opened": self.times_opened,
+            "retry_in_s": round(self.retry_in(), 1) if self.state == "open" else 0.0,
+        }
+
+
+breaker = CircuitBreaker(
+    settings.ESG_BREAKER_WINDOW_S,
+    settings.ESG_BREAKER_MIN_CALLS,
+    settings.ESG_BREAKER_ERROR_RATE,
+    settings.ESG_BREAKER_OPEN_S,
+)
+
+
+# ==========================================================
+# 🚦 Llamada con reintentos + breaker
+# ==========================================================
+async def call_with_retry(step: str, call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Ejecuta `call` con la política del paso. Solo reintenta errores upstream
+    reintentables; cuota agotada, errores fatales y circuito abierto se
+    propagan de inmediato.
+    """
+    policy = policy_for(step)
+
+    for attempt in range(1, policy.max_attempts + 1):
+        # Cancelado, o el intento no entra en el deadline → no se llama
+        deadline.checkpoint(step)
+        await breaker.before_call()
+        try:
+            result = await call()
+        except (asyncio.CancelledError, deadline.RunCancelled):
+            breaker._probe_in_flight = False
+            raise
+        except Exception as e:
+            kind = classify_error(e)
+            if kind in UPSTREAM:
+                breaker.record_failure()
+            else:
+                breaker._probe_in_flight = False
+
+            if kind == ErrorKind.QUOTA:
+                # Los análisis nuevos se rechazan en el preflight mientras tanto
+                costs.mark_quota_exhausted()
+                raise QuotaExceeded("❌ Créditos agotados.") from e
+            if kind not in RETRYABLE or attempt == policy.max_attempts:
+                raise
+
+            wait = policy.delay(attempt, kind, retry_after(e))
+            print(f"⏳ {step}: {kind.value} (intento {attempt}/{policy.max_attempts}) → reintento en {wait:.1f}s")
+            await deadline.sleep(wait, step)
+            continue
+
+        breaker.record_success()
+        return result
+
+    raise RuntimeError("❌ Falló la llamada después de múltiples intentos.")
+
+
+def status() -> Dict[str, Any]:
+    return {"circuit": breaker.snapshot(), "mode": settings.ESG_BREAKER_MODE}
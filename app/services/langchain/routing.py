@@ -0,0 +1,133 @@
+"""
+Ruteo por paso: modelo, asistente, tools, máximo de tokens de salida y
+backend de cada paso del pipeline.
+
+Los pasos mecánicos (Prompt 5 solo elige los 10 temas de mayor puntaje;
+Prompt 8 busca un valor en la tabla de equivalencias) no necesitan el
+modelo más capaz y lento del asistente. Las rutas por defecto están en
+`DEFAULT_ROUTES`; `ESG_STEP_ROUTES` las pisa por configuración (JSON),
+sin tocar código, para comparar modelos paso a paso. Las continuaciones
+(`<paso>_continue`) usan la ruta de su paso.
+
+`outcomes` mide cada ruta por (paso, modelo): latencia por run y cuántas
+salidas pasaron a la primera, tras reintentos, degradadas o fallidas.
+Junto con el costo por paso (costs.py) es lo que se mira para decidir
+si un paso puede ir a un modelo más barato. Ver `GET /health/openai` →
+`routing`.
+"""
+
+import statistics
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+CONTINUE_SUFFIX = "_continue"
+
+
+@dataclass(frozen=True)
+class StepRoute:
+    # Asistente de clients.ASSISTANTS (instrucciones, vector stores, archivos)
+    assistant: str = "esg"
+    # None = el modelo configurado en el asistente
+    model: Optional[str] = None
+    # None = las tools del asistente; [] = sin tools
+    tools: Optional[Tuple[str, ...]] = None
+    # Tope de tokens de salida del run (None = sin tope)
+    max_output_tokens: Optional[int] = None
+    # Backend (backends.py); None = ESG_BACKEND
+    backend: Optional[str] = None
+
+    def describe(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["tools"] = list(self.tools) if self.tools is not None else None
+        return data
+
+
+DEFAULT_ROUTES: Dict[str, StepRoute] = {
+    # Ordenar por materialidad_esg y devolver 10 temas: los datos van en el prompt
+    "prompt_5": StepRoute(model="gpt-4o-mini", tools=(), max_output_tokens=1000),
+    # Un valor de la tabla de equivalencias (necesita file_search, no razonamiento)
+    "prompt_8": StepRoute(model="gpt-4o-mini", tools=("file_search",), max_output_tokens=300),
+}
+
+
+def _from_config(base: StepRoute, override: Dict[str, Any]) -> StepRoute:
+    fields = {k: v for k, v in override.items() if k in StepRoute.__dataclass_fields__}
+    if fields.get("tools") is not None:
+        fields["tools"] = tuple(fields["tools"])
+    return replace(base, **fields)
+
+
+def routes() -> Dict[str, StepRoute]:
+    """Tabla efectiva: defaults + `ESG_STEP_ROUTES` (con ruteo deshabilitado, todo a la ruta base)."""
+    if not settings.ESG_ROUTING_ENABLED:
+        return {}
+    table = dict(DEFAULT_ROUTES)
+    for step, override in settings.ESG_STEP_ROUTES.items():
+        table[step] = _from_config(table.get(step, StepRoute()), override)
+    return table
+
+
+def base_step(step: str) -> str:
+    return step[: -len(CONTINUE_SUFFIX)] if step.endswith(CONTINUE_SUFFIX) else step
+
+
+def route_for(step: str) -> StepRoute:
+    return routes().get(base_step(step), StepRoute())
+
+
+def model_for(step: str) -> str:
+    """Modelo efectivo del paso (el del asistente si la ruta no fija uno)."""
+    return route_for(step).model or settings.ESG_DEFAULT_MODEL
+
+
+# ==========================================================
+# 📊 Calidad vs. latencia por (paso, modelo)
+# ==========================================================
+OUTCOMES = ("first_try", "retried", "degraded", "failed")
+
+
+class RouteOutcomes:
+    def __init__(self, window: int = 200):
+        self._latency: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._counts: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(OUTCOMES, 0))
+
+    # `model`: el que corrió de verdad (p. ej. el degradado por presupuesto);
+    # sin él, el de la ruta del paso
+    def run(self, step: str, seconds: float, model: Optional[str] = None):
+        self._latency[(base_step(step), model or model_for(step))].append(seconds)
+
+    def outcome(self, step: str, outcome: str, model: Optional[str] = None):
+        self._counts[(base_step(step), model or model_for(step))][outcome] += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        rows = []
+        for key in sorted(set(self._latency) | set(self._counts)):
+            step, model = key
+            samples = sorted(self._latency.get(key, ()))
+            counts = dict(self._counts.get(key, dict.fromkeys(OUTCOMES, 0)))
+            total = sum(counts.values())
+            rows.append({
+                "step": step,
+                "model": model,
+                "runs": len(samples),
+                "latency_p50_s": round(statistics.median(samples), 2) if samples else None,
+                "latency_p95_s": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 2) if samples else None,
+                **counts,
+                "first_try_rate": round(counts["first_try"] / total, 3) if total else None,
+            })
+        return rows
+
+
+outcomes = RouteOutcomes()
+
+
+def status() -> Dict[str, Any]:
+    return {
+        "enabled": settings.ESG_ROUTING_ENABLED,
+        "default_backend": settings.ESG_BACKEND,
+        "routes": {step: route.describe() for step, route in routes().items()},
+        "outcomes": outcomes.snapshot(),
+    }
@@ -0,0 +1,188 @@
+"""
+Filas compactas para las tablas del análisis (materialidad/ODS, GRI, SASB,
+regulaciones).
+
+Cada fila es un objeto con `__slots__` (sin `__dict__` por instancia) que
+además implementa `Mapping`: el resto del pipeline, las plantillas Jinja
+(`item.tema`, `item.riesgos`) y las reglas de validación la siguen usando
+como un dict, sin copiarla. Los valores categóricos (sector, niveles de
+materialidad, tipos de impacto, industria SASB, etc.) se internan con
+`sys.intern`, así cientos de filas comparten un único string por valor.
+
+Solo al serializar se arma el dict (`as_dict`, vía el `default` de orjson
+en `app.core.responses`). Las columnas desconocidas se conservan en
+`_extra` para no perder nada de lo que devuelva el modelo.
+"""
+
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Columnas de la tabla de materialidad, por paso que las agrega
+BASE_COLUMNS = [
+    "sector", "tema", "materialidad_financiera", "valor_materialidad_financiera",
+]
+ACTION_COLUMNS = ["accion_marginal", "accion_moderada", "accion_estructural"]
+IMPACT_COLUMNS = [
+    "tipo_impacto", "potencialidad_impacto", "horizonte_impacto",
+    "intencionalidad_impacto", "penetracion_impacto", "grado_implicacion",
+]
+SCORE_COLUMNS = ["gravedad", "probabilidad", "alcance", "materialidad_esg"]
+ODS_COLUMNS = ["prioridad", "meta_ods", "indicador_ods"]
+
+_MISSING = object()
+
+
+# ==========================================================
+# 🧱 Fila base
+# ==========================================================
+class Row(Mapping):
+    """
+    `FIELDS`: (atributo, clave en el JSON). La clave pública se respeta al
+    serializar (p. ej. "Riesgos"); el atributo en minúsculas es el que usan
+    las plantillas. Un campo sin asignar no existe (igual que una clave
+    ausente en el dict), así Jinja lo trata como indefinido.
+    """
+
+    __slots__ = ("_extra",)
+
+    FIELDS: Tuple[Tuple[str, str], ...] = ()
+    CATEGORICAL: frozenset = frozenset()
+    # clave pública o atributo → atributo
+    _BY_KEY: Dict[str, str] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        by_key = {}
+        for attr, key in cls.FIELDS:
+            by_key[key] = attr
+            by_key[attr] = attr
+        cls._BY_KEY = by_key
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "Row":
+        row = cls.__new__(cls)
+        extra = None
+        by_key = cls._BY_KEY
+        categorical = cls.CATEGORICAL
+        for key, value in data.items():
+            attr = by_key.get(key)
+            if attr is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            setattr(row, attr, sys.intern(value) if attr in categorical and isinstance(value, str) else value)
+        row._extra = extra
+        return row
+
+    def _get(self, key: str) -> Any:
+        attr = self._BY_KEY.get(key)
+        if attr is not None:
+            return getattr(self, attr, _MISSING)
+        if self._extra is not None:
+            return self._extra.get(key, _MISSING)
+        return _MISSING
+
+    # -------- Mapping --------
+    def __getitem__(self, key: str) -> Any:
+        value = self._get(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._get(key) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        for attr, key in self.FIELDS:
+            if getattr(self, attr, _MISSING) is not _MISSING:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._get(key)
+        return default if value is _MISSING else value
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {}
+        for attr, key in self.FIELDS:
+            value = getattr(self, attr, _MISSING)
+            if value is not _MISSING:
+                data[key] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
+def _fields(*columns: str) -> Tuple[Tuple[str, str], ...]:
+    """Columnas cuyo atributo coincide con la clave del JSON."""
+    return tuple((c, c) for c in columns)
+
+
+# ==========================================================
+# 📋 Tablas
+# ==========================================================
+class MaterialityRow(Row):
+    """Tabla de materialidad de los prompts 2–6 (las columnas ODS llegan en el 6)."""
+
+    FIELDS = (
+        ("sector", "sector"),
+        ("tema", "tema"),
+        ("materialidad_financiera", "materialidad_financiera"),
+        ("valor_materialidad_financiera", "valor_materialidad_financiera"),
+        ("riesgos", "Riesgos"),
+        ("oportunidades", "Oportunidades"),
+        *_fields(*ACTION_COLUMNS, *IMPACT_COLUMNS, *SCORE_COLUMNS, "tema_material", *ODS_COLUMNS),
+    )
+    CATEGORICAL = frozenset(["sector", "tema", "materialidad_financiera", *IMPACT_COLUMNS, "prioridad"])
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+class GriRow(Row):
+    FIELDS = _fields("estandar_gri", "numero_contenido", "contenido", "requerimiento")
+    CATEGORICAL = frozenset(["estandar_gri"])
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+class SasbRow(Row):
+    FIELDS = _fields("industria", "tema", "parametro_contabilidad", "categoria", "unidad_medida", "codigo")
+    CATEGORICAL = frozenset(["industria", "tema", "categoria", "unidad_medida"])
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+class RegulationRow(Row):
+    FIELDS = _fields("tipo_regulacion", "descripcion", "vigencia")
+    CATEGORICAL = frozenset(["tipo_regulacion", "vigencia"])
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+TABLE_ROWS: Dict[str, type] = {
+    "materiality_table": MaterialityRow,
+    "gri_mapping": GriRow,
+    "tabla_sasb": SasbRow,
+    "regulaciones": RegulationRow,
+}
+
+
+def compact_rows(rows: List[Any], row_class: type) -> List[Any]:
+    """Convierte las filas dict a `row_class`; las que ya son Row u otra cosa quedan igual."""
+    return [row_class.from_dict(r) if isinstance(r, dict) else r for r in rows]
+
+
+def compact_tables(parsed: Any) -> Any:
+    """Convierte en el lugar las tablas conocidas de una salida parseada."""
+    if isinstance(parsed, dict):
+        for key, row_class in TABLE_ROWS.items():
+            rows = parsed.get(key)
+            if isinstance(rows, list):
+                parsed[key] = compact_rows(rows, row_class)
+    return parsed
+
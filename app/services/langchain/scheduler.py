@@ -0,0 +1,218 @@
+"""
+Scheduler de runs por paso: clases de prioridad y colas justas por tenant.
+
+Reemplaza al semáforo global de runs (`OPENAI_MAX_CONCURRENT_RUNS`). Cada
+run de un paso pide un lugar; cuando no hay, espera en la cola de su
+clase ordenado por weighted fair queuing (self-clocked: la marca de fin
+de cada run es `max(V, fin_anterior_del_flujo) + costo / peso`):
+
+- Clases: "interactive" (análisis de una empresa, consultas SASB) y
+  "batch" (carteras). El peso de la clase multiplica su parte cuando
+  ambas esperan, y `ESG_SCHED_INTERACTIVE_RESERVED` lugares nunca los
+  toma batch, así un paso interactivo espera como mucho a que termine
+  un run, aunque batch sature la cuota.
+- Dentro de cada clase, un flujo por tenant (organización): una cartera
+  de cientos de empresas no deja sin turno a las demás.
+- El costo de un run es el p50 reciente de su paso (los pasos largos
+  pesan más).
+
+El lugar se toma por run, no por análisis: entre un paso y el siguiente
+un análisis batch vuelve a la cola, y ahí lo adelanta el trabajo
+interactivo (preempción en los bordes de paso). La clase y el tenant
+viajan en un contextvar (`lane`), así los shards de fan-out y los hedges
+heredan los del análisis que los lanzó.
+"""
+
+import asyncio
+import heapq
+import itertools
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+DEFAULT_TENANT = "default"
+# Flujos inactivos que se recuerdan (su marca de fin) antes de podar
+MAX_FLOWS = 1000
+
+
+@dataclass(frozen=True)
+class Lane:
+    priority: str = INTERACTIVE
+    tenant: str = DEFAULT_TENANT
+
+
+_lane: ContextVar[Lane] = ContextVar("esg_lane", default=Lane())
+
+
+def current_lane() -> Lane:
+    return _lane.get()
+
+
+@contextmanager
+def lane(priority: Optional[str] = None, tenant: Optional[str] = None):
+    """Clase y tenant de todo lo que se ejecute dentro (incluidas las tareas hijas)."""
+    if priority is not None and priority not in PRIORITIES:
+        raise ValueError(f"Prioridad inválida: {priority!r} (válidas: {', '.join(PRIORITIES)})")
+    token = _lane.set(Lane(priority or INTERACTIVE, (tenant or DEFAULT_TENANT).strip().casefold()))
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def class_weight(priority: str) -> float:
+    return settings.ESG_SCHED_WEIGHT_INTERACTIVE if priority == INTERACTIVE else settings.ESG_SCHED_WEIGHT_BATCH
+
+
+def tenant_weight(tenant: str) -> float:
+    weights = {k.strip().casefold(): v for k, v in settings.ESG_SCHED_TENANT_WEIGHTS.items()}
+    return weights.get(tenant, 1.0)
+
+
+def step_cost(step: str) -> float:
+    from app.services.langchain.hedging import latency
+
+    return latency.percentile(step, 0.50) or settings.ESG_SCHED_DEFAULT_COST_S
+
+
+# ==========================================================
+# 🗓️ Scheduler
+# ==========================================================
+class StepScheduler:
+    def __init__(self, capacity: int, reserved: int):
+        self.capacity = max(1, capacity)
+        # Lugares solo para interactive (siempre queda al menos uno para batch)
+        self.reserved = max(0, min(reserved, self.capacity - 1))
+        self.running: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        # clase → heap de (marca de fin, orden de llegada, future)
+        self._queues: Dict[str, List[Tuple[float, int, asyncio.Future]]] = {p: [] for p in PRIORITIES}
+        self._vtime = 0.0
+        self._flow_finish: Dict[Tuple[str, str], float] = {}
+        self._seq = itertools.count()
+        self.dispatched: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._waits: Dict[str, Deque[float]] = {p: deque(maxlen=200) for p in PRIORITIES}
+
+    # -------- estado --------
+    def _busy(self) -> int:
+        return sum(self.running.values())
+
+    def _can_run(self, priority: str) -> bool:
+        if self._busy() >= self.capacity:
+            return False
+        return priority == INTERACTIVE or self.running[BATCH] < self.capacity - self.reserved
+
+    def _queued(self, priority: str) -> int:
+        return sum(1 for _, _, f in self._queues[priority] if not f.done())
+
+    def _tag(self, lane_: Lane, step: str) -> float:
+        flow = (lane_.priority, lane_.tenant)
+        start = max(self._vtime, self._flow_finish.get(flow, 0.0))
+        finish = start + step_cost(step) / (class_weight(lane_.priority) * tenant_weight(lane_.tenant))
+        self._flow_finish[flow] = finish
+        if len(self._flow_finish) > MAX_FLOWS:
+            # Los flujos con marca vieja ya no tienen ventaja que conservar
+            self._flow_finish = {f: t for f, t in self._flow_finish.items() if t > self._vtime}
+        return finish
+
+    def _start(self, priority: str, finish: float):
+        self.running[priority] += 1
+        self.dispatched[priority] += 1
+        self._vtime = max(self._vtime, finish)
+
+    # -------- lugares --------
+    async def acquire(self, step: str) -> str:
+        current = _lane.get()
+        priority = current.priority
+        finish = self._tag(current, step)
+        if not self._queued(priority) and self._can_run(priority):
+            self._start(priority, finish)
+            self._waits[priority].append(0.0)
+            return priority
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[priority], (finish, next(self._seq), fut))
+        started = time.monotonic()
+        try:
+            await fut
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                # El lugar llegó justo al cancelar: se devuelve
+                self.release(priority)
+            else:
+                fut.cancel()
+            raise
+        self._waits[priority].append(time.monotonic() - started)
+        return priority
+
+    def release(self, priority: str):
+        self.running[priority] -= 1
+        self._pump()
+
+    def _pump(self):
+        """Entrega los lugares libres a la menor marca de fin entre las clases que pueden correr."""
+        while self._busy() < self.capacity:
+            best = None
+            for priority in PRIORITIES:
+                queue = self._queues[priority]
+                while queue and queue[0][2].done():
+                    heapq.heappop(queue)  # cancelados
+                if queue and self._can_run(priority) and (best is None or queue[0][0] < best[1][0]):
+                    best = (priority, queue[0])
+            if best is None:
+                return
+            priority, (finish, _, fut) = best
+            heapq.heappop(self._queues[priority])
+            self._start(priority, finish)
+            fut.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, step: str):
+        priority = await self.acquire(step)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def status(self) -> Dict[str, Any]:
+        def pct(samples, q):
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2) if ordered else None
+
+        return {
+            "capacity": self.capacity,
+            "reserved_interactive": self.reserved,
+            "classes": {
+                p: {
+                    "running": self.running[p],
+                    "queued": self._queued(p),
+                    "dispatched": self.dispatched[p],
+                    "wait_p50_s": round(statistics.median(self._waits[p]), 2) if self._waits[p] else None,
+                    "wait_p95_s": pct(self._waits[p], 0.95),
+                }
+                for p in PRIORITIES
+            },
+            "tenants": len({t for (_, t) in self._flow_finish}),
+        }
+
+
+_scheduler: Optional[StepScheduler] = None
+
+
+def get_scheduler() -> StepScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = StepScheduler(settings.OPENAI_MAX_CONCURRENT_RUNS, settings.ESG_SCHED_INTERACTIVE_RESERVED)
+    return _scheduler
+
+
+def status() -> Dict[str, Any]:
+    return get_scheduler().status()
@@ -0,0 +1,223 @@
+"""
+Streaming de runs del Assistants API con parseo incremental de filas.
+
+En los pasos tabulares largos (Prompt 2, shards de Prompts 7 y 10) el texto
+se recibe por deltas; `RowStream` emite cada fila de la tabla apenas se
+cierra, para alimentar el progreso y validar mientras el modelo sigue
+generando. Si aparecen demasiadas filas inválidas se aborta el run
+(`StreamAborted`) en vez de esperar la respuesta completa.
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.langchain import deadline
+from app.services.langchain.resilience import RunFailed
+from app.services.langchain.truncation import PartialMessage
+from app.services.langchain.validation import ROW_RULES, row_problems
+from app.services.langchain.wire import rescue_rows
+
+# Parámetros que acepta un run sobre un thread existente
+RUN_PARAMS = ("instructions", "model", "tools", "max_completion_tokens")
+# Estados en los que el run ya no genera (y informa su usage)
+FINAL_STATUSES = ("completed", "incomplete", "failed", "cancelled", "expired", "requires_action")
+# Tras cancelar, cuánto se espera el estado final para leer el usage
+CANCEL_POLLS = 10
+CANCEL_POLL_S = 0.5
+
+
+class StreamAborted(ValueError):
+    """El run se cortó antes de terminar por filas inválidas."""
+
+
+# ==========================================================
+# 🧱 Filas incrementales
+# ==========================================================
+def row_problem(key: str, row: Dict[str, Any]) -> Optional[str]:
+    """Reglas por fila de la tabla (`validation.ROW_RULES`)."""
+    return "; ".join(row_problems(ROW_RULES.get(key), row)) or None
+
+
+class RowStream:
+    """
+    Parser incremental de `key`: acumula los deltas y, cuando llega un
+    cierre de fila, emite `on_row(índice, fila)` para las filas nuevas.
+    """
+
+    def __init__(self, key: str, on_row: Callable[[int, Dict[str, Any]], None]):
+        self.key = key
+        self.on_row = on_row
+        self.reset()
+
+    def reset(self):
+        self._chunks: List[str] = []
+        self.emitted = 0
+        self.bad_rows = 0
+
+    def feed(self, chunk: str):
+        self._chunks.append(chunk)
+        if "]" not in chunk and "}" not in chunk:
+            return
+        rows = rescue_rows("".join(self._chunks), self.key) or []
+        for row in rows[self.emitted:]:
+            index = self.emitted
+            self.emitted += 1
+
+            problem = row_problem(self.key, row)
+            if problem:
+                self.bad_rows += 1
+                print(f"⚠️ {self.key}[{index}]: {problem}")
+                if self.bad_rows >= settings.ESG_STREAM_MAX_BAD_ROWS:
+                    raise StreamAborted(f"{self.key}: {self.bad_rows} filas inválidas → run abortado")
+                continue
+            self.on_row(index, row)
+
+
+# ==========================================================
+# 🧹 Cancelación de runs en el servidor
+# ==========================================================
+async def cancel_run(client: Any, thread_id: str, run_id: str, step: str = "default"):
+    """
+    Cancela el run en OpenAI: cancelar la tarea local no lo detiene y
+    seguiría generando (y facturando) tokens. Espera su estado final y
+    suma a la corrida el usage que informe (costs.record_cancelled).
+    """
+    from app.services.langchain import costs
+
+    try:
+        run = await client.beta.threads.runs.cancel(run_id, thread_id=thread_id)
+        for _ in range(CANCEL_POLLS):
+            if run.status in FINAL_STATUSES:
+                break
+            await asyncio.sleep(CANCEL_POLL_S)
+            run = await client.beta.threads.runs.retrieve(run_id, thread_id=thread_id)
+    except Exception as e:
+        print(f"⚠️ No se pudo cancelar el run {run_id}: {e}")
+        return
+    print(f"🧹 {step}: run {run_id} cancelado ({run.status})")
+    costs.record_cancelled(step, run)
+
+
+class ActiveRun:
+    """
+    Run en vuelo de la tarea actual. Se registra en el CancelToken del
+    trabajo (deadline.py), que lo cancela al cancelar/vencer el trabajo;
+    si la tarea se corta por otra causa (hedge perdedor, stream abortado,
+    error de red) lo cancela `abort()`.
+    """
+
+    def __init__(self, client: Any, step: str = "default"):
+        self.client = client
+        self.step = step
+        self.token = deadline.current_token()
+        self.run: Any = None
+
+    def track(self, run: Any):
+        if self.run is None and run is not None:
+            self.run = run
+            if self.token is not None:
+                self.token.add_run(run.id, self.stop)
+
+    def stop(self):
+        return cancel_run(self.client, self.run.thread_id, self.run.id, self.step)
+
+    async def abort(self):
+        # Si el token ya lo canceló (cancel() / deadline) no se repite
+        if self.run is not None and (self.token is None or self.token.remove_run(self.run.id)):
+            # shield: una segunda cancelación no deja el run corriendo
+            await asyncio.shield(self.stop())
+
+    def release(self):
+        if self.run is not None and self.token is not None:
+            self.token.remove_run(self.run.id)
+
+
+@asynccontextmanager
+async def cancel_on_abort(client: Any, run: Any, step: str = "default"):
+    """
+    Si el bloque se corta (tarea cancelada, error al consultar el run),
+    cancela `run` en el servidor: un run abandonado sigue facturando y
+    bloquea su thread para el reintento.
+    """
+    active = ActiveRun(client, step)
+    active.track(run)
+    try:
+        yield
+    except BaseException:
+        await active.abort()
+        raise
+    finally:
+        active.release()
+
+
+# ==========================================================
+# 📡 Run en streaming
+# ==========================================================
+def unexpected_status(run: Any) -> RunFailed:
+    # Mismo texto que LangChain (truncation.incomplete_run lo lee); classify_error usa last_error
+    run_info = json.dumps(run.model_dump(), indent=2, default=str)
+    return RunFailed(
+        f"Unexpected run status: {run.status}. Full run info:\n\n{run_info}",
+        run.status,
+        getattr(run, "last_error", None),
+    )
+
+
+async def stream_run(
+    client: Any,
+    assistant_id: str,
+    params: Dict[str, Any],
+    on_text: Callable[[str], None],
+    step: str = "default",
+) -> List[PartialMessage]:
+    """
+    Ejecuta el run con streaming y devuelve el mensaje con la misma forma
+    que `ainvoke` ([msg] con .thread_id y .content[0].text.value). Un run
+    `incomplete` devuelve el texto parcial (se completa con continuaciones).
+    """
+    if "thread_id" in params:
+        await client.beta.threads.messages.create(
+            params["thread_id"], role="user", content=params["content"]
+        )
+        manager = client.beta.threads.runs.stream(
+            thread_id=params["thread_id"],
+            assistant_id=assistant_id,
+            **{k: v for k, v in params.items() if k in RUN_PARAMS},
+        )
+    else:
+        manager = client.beta.threads.create_and_run_stream(
+            assistant_id=assistant_id,
+            thread={"messages": [{"role": "user", "content": params["content"]}]},
+            **{k: v for k, v in params.items() if k in RUN_PARAMS + ("tool_resources",)},
+        )
+
+    chunks: List[str] = []
+    active = ActiveRun(client, step)
+    async with manager as stream:
+        try:
+            async for event in stream:
+                active.track(stream.current_run)
+                if event.event != "thread.message.delta":
+                    continue
+                for block in event.data.delta.content or []:
+                    value = getattr(getattr(block, "text", None), "value", None)
+                    if value:
+                        chunks.append(value)
+                        on_text(value)
+        except BaseException:
+            # Cancelado, abortado por filas inválidas o stream cortado: el run sigue en el servidor
+            active.track(stream.current_run)
+            await active.abort()
+            raise
+        finally:
+            active.release()
+        run = await stream.get_final_run()
+
+    if run.status not in ("completed", "incomplete"):
+        raise unexpected_status(run)
+
+    reason = (run.incomplete_details.reason if run.incomplete_details else None)
+    return [PartialMessage(run.thread_id, run.id, "".join(chunks), reason, run.usage, run.model)]
@@ -0,0 +1,103 @@
+"""
+Motor local de tablas de materialidad.
+
+Los prompts 3–6 devuelven solo `{tema → columnas nuevas}` (deltas). Aquí
+se unen sobre la tabla del paso anterior usando una clave `tema`
+normalizada, de modo que las celdas previas nunca se reescriben por el
+modelo y la salida de cada paso es proporcional a lo que agrega.
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+DELTA_KEY = "materiality_delta"
+
+
+def normalize_key(value: Any) -> str:
+    """Clave estable para `tema`: sin acentos, minúsculas, sin puntuación ni espacios extra."""
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text.casefold())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class DeltaMergeError(ValueError):
+    """La delta no cubre la tabla base (faltan temas) o es inválida."""
+
+    def __init__(self, message: str, issues: Dict[str, List[str]]):
+        super().__init__(message)
+        self.issues = issues
+
+
+def merge_deltas(
+    base_rows: List[Dict[str, Any]],
+    delta_rows: List[Dict[str, Any]],
+    columns: List[str],
+    key: str = "tema",
+    required: Optional[List[str]] = None,
+    fill_value: Any = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+    """
+    Une `delta_rows` sobre `base_rows` por `key` normalizada.
+
+    - Solo se copian las `columns` de la delta; el resto de la fila base
+      queda intacto (incluido el texto original de `tema`).
+    - `required`: temas normalizados que deben estar en la delta. Por
+      defecto, todos los de la base. Si falta alguno se lanza DeltaMergeError.
+    - Los temas de la base que no están en la delta y no son requeridos
+      reciben `fill_value` en las columnas nuevas.
+
+    Devuelve (filas_unidas, issues) con issues = {missing, duplicates, unknown}.
+    """
+    index: Dict[str, Dict[str, Any]] = {}
+    duplicates: List[str] = []
+    for row in delta_rows or []:
+        if not isinstance(row, dict):
+            continue
+        k = normalize_key(row.get(key))
+        if not k:
+            continue
+        if k in index:
+            duplicates.append(str(row.get(key)))
+            continue
+        index[k] = row
+
+    base_keys = [normalize_key(r.get(key)) for r in base_rows]
+    required_keys = set(base_keys if required is None else required)
+
+    missing = [str(r.get(key)) for r, k in zip(base_rows, base_keys) if k in required_keys and k not in index]
+    known = set(base_keys)
+    unknown = [str(r.get(key)) for k, r in index.items() if k not in known]
+
+    issues = {"missing": missing, "duplicates": duplicates, "unknown": unknown}
+    if missing:
+        raise DeltaMergeError(f"Delta sin {len(missing)} temas de la tabla base: {missing[:5]}", issues)
+
+    merged = []
+    for row, k in zip(base_rows, base_keys):
+        delta = index.get(k)
+        merged.append({
+            **row,
+            **{c: (delta.get(c, fill_value) if delta else fill_value) for c in columns},
+        })
+    return merged, issues
+
+
+def sort_rows(rows: List[Dict[str, Any]], column: str, reverse: bool = True) -> List[Dict[str, Any]]:
+    """Orden estable por una columna numérica (valores no numéricos al final)."""
+
+    def value(r):
+        try:
+            return float(r.get(column))
+        except (TypeError, ValueError):
+            return float("-inf") if reverse else float("inf")
+
+    return sorted(rows, key=value, reverse=reverse)
+
+
+def to_number(value: Any) -> float:
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return 0.0
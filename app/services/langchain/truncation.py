@@ -0,0 +1,119 @@
+"""
+Detección de salidas truncadas y continuación dirigida.
+
+Cuando una tabla larga (Prompt 2, Prompt 7) llega al límite de salida del
+modelo, en vez de regenerar todo el prompt se piden solo las filas que
+faltan en el mismo thread ("continúa desde la fila N") y se unen con las
+filas completas ya recibidas.
+
+Señales de truncamiento:
+  - el run terminó en estado `incomplete` (LangChain lanza ValueError con
+    el JSON del run; el mensaje parcial se recupera del thread),
+  - corchetes/llaves sin cerrar o un string abierto al final del texto
+    (la última fila parcial se descarta en `wire.rescue_rows`).
+"""
+
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from app.services.langchain.context import compact_json
+from app.services.langchain.wire import ROW_KEYS, WIRE_COLUMNS
+
+INCOMPLETE_STATUS = "Unexpected run status: incomplete"
+
+
+# ==========================================================
+# 🔍 Detección
+# ==========================================================
+def is_truncated(text: str) -> bool:
+    """True si el JSON que empieza en la primera llave quedó sin cerrar."""
+    start = (text or "").find("{")
+    if start < 0:
+        return False
+
+    depth = 0
+    in_string = escaped = False
+    for ch in text[start:]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return False
+    return True
+
+
+def incomplete_run(e: BaseException) -> Optional[Dict[str, Any]]:
+    """Datos del run si `e` es el ValueError de LangChain por estado incomplete."""
+    message = str(e)
+    if not message.startswith(INCOMPLETE_STATUS):
+        return None
+    try:
+        run = json.loads(message.split("\n\n", 1)[1])
+    except (IndexError, ValueError):
+        return None
+    return {
+        "run_id": run.get("id"),
+        "thread_id": run.get("thread_id"),
+        "reason": (run.get("incomplete_details") or {}).get("reason"),
+    }
+
+
+# ==========================================================
+# 🧩 Mensaje parcial (misma forma que los mensajes de LangChain)
+# ==========================================================
+class PartialMessage:
+    def __init__(
+        self, thread_id: str, run_id: str, text: str, reason: Optional[str],
+        usage: Any = None, model: Optional[str] = None,
+    ):
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.content = [SimpleNamespace(text=SimpleNamespace(value=text))]
+        self.incomplete_reason = reason
+        # Tokens del run, si ya se conocen (streaming); si no, costs los pide a la API
+        self.usage = usage
+        self.model = model
+
+
+async def fetch_partial(client: Any, info: Dict[str, Any]) -> List[PartialMessage]:
+    """Lee del thread el texto que el run alcanzó a generar antes de cortarse."""
+    messages = await client.beta.threads.messages.list(
+        info["thread_id"], run_id=info["run_id"], order="asc"
+    )
+    text = "".join(
+        block.text.value
+        for message in messages.data
+        for block in message.content
+        if getattr(block, "type", "text") == "text"
+    )
+    return [PartialMessage(info["thread_id"], info["run_id"], text, info.get("reason"))]
+
+
+# ==========================================================
+# ➡️ Continuación
+# ==========================================================
+def continuation_prompt(key: str, rows: List[Dict[str, Any]]) -> str:
+    columns = WIRE_COLUMNS.get(key, [])
+    row_key = ROW_KEYS.get(key)
+    last = rows[-1].get(row_key) if rows and row_key else None
+    empty = compact_json({key: {"columns": columns, "rows": []}})
+
+    after = f' (último {row_key}: "{last}")' if last else ""
+    return f"""
+    Tu respuesta anterior se cortó por límite de longitud después de la fila {len(rows)} de "{key}"{after}.
+    Continúa desde la fila {len(rows) + 1}: devuelve SOLO las filas que faltan, sin repetir
+    ninguna anterior, con el mismo formato compacto y únicamente este JSON:
+    {compact_json({key: {"columns": columns, "rows": [["..."]]}})}
+    Si ya no faltan filas, devuelve {empty}
+    """
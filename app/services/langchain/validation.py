@@ -0,0 +1,230 @@
+"""
+Quality gates locales entre pasos del pipeline ESG.
+
+Cada paso declara qué debe cumplir su salida (largos mínimos por campo,
+cantidad de filas, valores permitidos, rangos de puntaje). La validación
+corre en microsegundos sobre el JSON ya parseado; si falla se lanza
+`QualityGateError` (un ValueError → INVALID_OUTPUT) y `run_prompt`
+reintenta solo ese paso, antes de gastar los prompts siguientes.
+
+Las mismas reglas de fila se usan en el streaming (`row_problem`) y en
+los shards de fan-out, donde un shard inválido se reintenta solo.
+"""
+
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.langchain.rows import IMPACT_COLUMNS
+from app.services.langchain.tables import DELTA_KEY, normalize_key
+
+MIN_ROWS_PROMPT_2 = 10
+MATERIALIDAD_FINANCIERA = ("Baja", "Media", "Alta")
+VALOR_MATERIALIDAD = (0, 2.5, 5)
+SCORE_RANGE = (0, 5)
+# valor_materialidad_financiera + gravedad + probabilidad + alcance
+MATERIALIDAD_ESG_RANGE = (0, 20)
+
+# Mínimos de caracteres pedidos en el Prompt 1
+PROMPT_1_MIN_LENGTHS = {
+    "nombre_empresa": 30,
+    "pais_operacion": 40,
+    "industria": 60,
+    "tamano_empresa": 40,
+    "ubicacion_geografica": 100,
+    "modelo_negocio": 150,
+    "cadena_valor": 200,
+    "actividades_principales": 200,
+    "madurez_esg": 100,
+    "stakeholders_relevantes": 200,
+}
+
+# Problemas que se listan en el mensaje de error (el resto se cuenta)
+MAX_REPORTED = 5
+
+
+class QualityGateError(ValueError):
+    """La salida del paso no pasó sus reglas; se reintenta solo ese paso."""
+
+    def __init__(self, step: str, problems: List[str]):
+        shown = "; ".join(problems[:MAX_REPORTED])
+        more = f" (+{len(problems) - MAX_REPORTED} más)" if len(problems) > MAX_REPORTED else ""
+        super().__init__(f"{step}: {shown}{more}")
+        self.step = step
+        self.problems = problems
+
+
+# ==========================================================
+# 📐 Reglas declarativas
+# ==========================================================
+@dataclass(frozen=True)
+class TableRule:
+    key: str
+    min_rows: int = 0
+    # Con "exhausted": true el modelo declara que no hay más filas: no se exige min_rows
+    exhausted_ok: bool = False
+    required: Tuple[str, ...] = ()
+    enums: Dict[str, Tuple[Any, ...]] = field(default_factory=dict)
+    ranges: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    # Solo se validan las filas con esta columna verdadera (p. ej. tema_material)
+    where: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class StepRules:
+    min_lengths: Dict[str, int] = field(default_factory=dict)
+    table: Optional[TableRule] = None
+
+
+MATERIALITY_ROWS = TableRule(
+    "materiality_table",
+    required=("tema",),
+    enums={
+        "materialidad_financiera": MATERIALIDAD_FINANCIERA,
+        "valor_materialidad_financiera": VALOR_MATERIALIDAD,
+    },
+)
+
+# Reglas por fila de cada tabla (streaming y shards de fan-out)
+ROW_RULES: Dict[str, TableRule] = {
+    "materiality_table": MATERIALITY_ROWS,
+    "gri_mapping": TableRule("gri_mapping", required=("estandar_gri",)),
+    "regulaciones": TableRule("regulaciones", required=("tipo_regulacion", "descripcion")),
+    DELTA_KEY: TableRule(DELTA_KEY, required=("tema", "prioridad", "meta_ods")),
+}
+
+STEP_RULES: Dict[str, StepRules] = {
+    "prompt_1": StepRules(min_lengths=PROMPT_1_MIN_LENGTHS),
+    "prompt_2": StepRules(table=replace(MATERIALITY_ROWS, min_rows=MIN_ROWS_PROMPT_2, exhausted_ok=True)),
+    # Desde el Prompt 3 solo se validan las columnas que agrega cada paso: un
+    # problema heredado del Prompt 2 no se arregla reintentando el paso actual
+    "prompt_3": StepRules(
+        min_lengths={"resumen_sector": 50},
+        table=TableRule("materiality_table", required=("tema", *IMPACT_COLUMNS)),
+    ),
+    "prompt_4": StepRules(table=TableRule(
+        "materiality_table",
+        ranges={
+            "gravedad": SCORE_RANGE,
+            "probabilidad": SCORE_RANGE,
+            "alcance": SCORE_RANGE,
+            "materialidad_esg": MATERIALIDAD_ESG_RANGE,
+        },
+    )),
+    "prompt_6": StepRules(table=TableRule(
+        "materiality_table", required=("tema", "prioridad", "meta_ods"), where="tema_material",
+    )),
+    "prompt_11": StepRules(min_lengths={"parrafo_1": 150, "parrafo_2": 150}),
+}
+
+
+# ==========================================================
+# 🔍 Chequeos
+# ==========================================================
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(str(value).replace(",", ".").strip())
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def _enum_keys(allowed: Tuple[Any, ...]) -> Tuple[bool, frozenset]:
+    numeric = all(isinstance(a, (int, float)) for a in allowed)
+    return numeric, frozenset(float(a) if numeric else normalize_key(a) for a in allowed)
+
+
+def _in_enum(value: Any, allowed: Tuple[Any, ...]) -> bool:
+    numeric, keys = _enum_keys(allowed)
+    if numeric:
+        return _number(value) in keys
+    if isinstance(value, str) and value in allowed:
+        return True
+    return normalize_key(value) in keys
+
+
+def _empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def row_problems(rule: Optional[TableRule], row: Any) -> List[str]:
+    if rule is None:
+        return []
+    if not isinstance(row, Mapping):
+        return ["fila no es un objeto"]
+
+    problems = [f"{c} vacío" for c in rule.required if _empty(row.get(c))]
+    for column, allowed in rule.enums.items():
+        if column in row and not _in_enum(row[column], allowed):
+            problems.append(f"{column}={row[column]!r} (permitidos: {', '.join(map(str, allowed))})")
+    for column, (low, high) in rule.ranges.items():
+        number = _number(row.get(column))
+        if number is None or not low <= number <= high:
+            problems.append(f"{column}={row.get(column)!r} fuera de [{low}, {high}]")
+    return problems
+
+
+def table_problems(rule: TableRule, parsed: Dict[str, Any]) -> List[str]:
+    rows = parsed.get(rule.key)
+    if not isinstance(rows, list):
+        return [f"falta la tabla '{rule.key}'"]
+
+    problems = []
+    exhausted = rule.exhausted_ok and parsed.get("exhausted") is True
+    if len(rows) < rule.min_rows and not exhausted:
+        problems.append(f"{rule.key}: {len(rows)} filas (< {rule.min_rows})")
+
+    for i, row in enumerate(rows):
+        if rule.where and not (isinstance(row, Mapping) and row.get(rule.where)):
+            continue
+        problems.extend(f"{rule.key}[{i}].{p}" for p in row_problems(rule, row))
+    return problems
+
+
+def min_length_problems(parsed: Dict[str, Any], min_lengths: Dict[str, int]) -> List[str]:
+    problems = []
+    for name, minimum in min_lengths.items():
+        value = parsed.get(name)
+        length = len(value.strip()) if isinstance(value, str) else 0
+        if length < minimum:
+            problems.append(f"{name}: {length} caracteres (mínimo {minimum})")
+    return problems
+
+
+def validate_min_lengths(parsed: Any) -> List[str]:
+    """Mínimos de caracteres del Prompt 1; lista vacía si cumple."""
+    if not isinstance(parsed, dict):
+        return ["la respuesta no es un objeto JSON"]
+    return min_length_problems(parsed, PROMPT_1_MIN_LENGTHS)
+
+
+def step_problems(step: str, parsed: Any) -> List[str]:
+    rules = STEP_RULES.get(step)
+    if rules is None:
+        return []
+    if not isinstance(parsed, dict):
+        return ["la respuesta no es un objeto JSON"]
+    problems = min_length_problems(parsed, rules.min_lengths)
+    if rules.table:
+        problems.extend(table_problems(rules.table, parsed))
+    return problems
+
+
+def check_step(step: str, parsed: Any) -> Any:
+    """Devuelve `parsed` si pasa las reglas del paso; si no, QualityGateError."""
+    problems = step_problems(step, parsed)
+    if problems:
+        raise QualityGateError(step, problems)
+    return parsed
+
+
+def check_rows(step: str, key: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Reglas por fila para un shard de fan-out (un shard inválido se reintenta)."""
+    rule = ROW_RULES.get(key)
+    problems = [f"{key}[{i}].{p}" for i, row in enumerate(rows) for p in row_problems(rule, row)]
+    if problems:
+        raise QualityGateError(step, problems)
+    return rows
@@ -0,0 +1,167 @@
+"""
+Formato compacto para las salidas tabulares del asistente.
+
+Los pasos tabulares (Prompt 2 `materiality_table`, Prompt 7 `gri_mapping`,
+Prompt 10 `regulaciones`) piden al modelo los nombres de columna una sola
+vez y cada fila como arreglo de valores:
+
+    {"materiality_table": {"columns": ["sector", "tema", ...],
+                           "rows": [["Bancos", "Ética", ...], ...]}}
+
+Aquí se expande a la lista de dicts de siempre, así PDFGenerator y los
+clientes de la API no cambian. Las respuestas en el formato anterior
+(lista de objetos) se aceptan tal cual.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.langchain.tables import normalize_key
+
+WIRE_COLUMNS: Dict[str, List[str]] = {
+    "materiality_table": [
+        "sector", "tema", "materialidad_financiera", "valor_materialidad_financiera",
+        "Riesgos", "Oportunidades", "accion_marginal", "accion_moderada", "accion_estructural",
+    ],
+    "gri_mapping": ["estandar_gri", "numero_contenido", "contenido", "requerimiento"],
+    "regulaciones": ["tipo_regulacion", "descripcion", "vigencia"],
+}
+
+# Columna que identifica cada fila en el prompt de continuación ("último tema: ...")
+ROW_KEYS: Dict[str, str] = {
+    "materiality_table": "tema",
+    "gri_mapping": "numero_contenido",
+    "regulaciones": "descripcion",
+}
+
+# Columnas que identifican una fila al unir continuaciones y shards (por
+# defecto, la de ROW_KEYS). En `gri_mapping` un mismo número de contenido
+# tiene varios requerimientos y hay filas sin número: van todas.
+DEDUP_KEYS: Dict[str, Tuple[str, ...]] = {
+    "gri_mapping": ("estandar_gri", "numero_contenido", "contenido", "requerimiento"),
+}
+
+
+def dedup_columns(key: str) -> Tuple[str, ...]:
+    return DEDUP_KEYS.get(key) or (ROW_KEYS.get(key, "tema"),)
+
+
+def row_identity(key: str, row: Dict[str, Any]) -> Tuple[str, ...]:
+    """Clave de deduplicación de una fila de `key` (valores normalizados)."""
+    return tuple(normalize_key(row.get(c)) for c in dedup_columns(key))
+
+_decoder = json.JSONDecoder()
+
+
+def _zip_row(columns: List[str], row: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(row, dict):
+        return row
+    if not isinstance(row, list):
+        return None
+    # Filas cortas se completan con None; valores de más se descartan
+    return {c: (row[i] if i < len(row) else None) for i, c in enumerate(columns)}
+
+
+def expand_table(value: Any, columns: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Convierte una tabla compacta en lista de dicts. Acepta:
+      - {"columns": [...], "rows": [[...], ...]}
+      - [[...], ...] (usa `columns`)
+      - [{...}, ...] (formato anterior, se devuelve igual)
+    Devuelve None si el valor no tiene forma de tabla.
+    """
+    if isinstance(value, dict) and isinstance(value.get("rows"), list):
+        columns = value.get("columns") or columns
+        value = value["rows"]
+    if not isinstance(value, list):
+        return None
+    if any(isinstance(r, list) for r in value) and not columns:
+        return None
+
+    rows = [_zip_row(columns or [], r) for r in value]
+    return [r for r in rows if r is not None]
+
+
+def expand_compact(parsed: Any, key: str) -> Any:
+    """Expande `parsed[key]` en su lugar; deja el resto de la respuesta intacto."""
+    if not isinstance(parsed, dict) or key not in parsed:
+        return parsed
+    rows = expand_table(parsed[key], WIRE_COLUMNS.get(key))
+    if rows is None:
+        raise ValueError(f"'{key}' no tiene forma de tabla")
+    parsed[key] = rows
+    return parsed
+
+
+def _decode_array(raw: str, start: int) -> List[Any]:
+    """
+    Decodifica uno a uno los elementos del arreglo que abre en `start`.
+    Si la salida está truncada, devuelve los elementos completos leídos.
+    """
+    items: List[Any] = []
+    pos = start + 1
+    while pos < len(raw):
+        while pos < len(raw) and raw[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(raw) or raw[pos] == "]":
+            break
+        try:
+            item, pos = _decoder.raw_decode(raw, pos)
+        except ValueError:
+            break
+        items.append(item)
+    return items
+
+
+def rescue_rows(raw: str, key: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Rescata las filas completas de `key` aunque el JSON esté roto o
+    truncado (compacto o formato anterior). None si no hay nada.
+    """
+    match = re.search(rf'"{re.escape(key)}"\s*:\s*([\[{{])', raw or "")
+    if not match:
+        return None
+
+    columns = WIRE_COLUMNS.get(key)
+    if match.group(1) == "[":
+        items = _decode_array(raw, match.start(1))
+    else:
+        body = raw[match.start(1):]
+        cols = re.search(r'"columns"\s*:\s*\[', body)
+        if cols:
+            columns = _decode_array(body, cols.end() - 1) or columns
+        rows = re.search(r'"rows"\s*:\s*\[', body)
+        if not rows:
+            return None
+        items = _decode_array(body, rows.end() - 1)
+
+    return expand_table(items, columns) or None
+
+
+def rescue_fields(raw: str, skip: str) -> Dict[str, Any]:
+    """
+    Campos de primer nivel que alcanzaron a cerrarse en un JSON truncado
+    (p. ej. "exhausted" antes de la tabla), sin el campo `skip`.
+    """
+    raw = raw or ""
+    fields: Dict[str, Any] = {}
+    pos = raw.find("{") + 1
+    if pos == 0:
+        return fields
+    while True:
+        while pos < len(raw) and raw[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(raw) or raw[pos] != '"':
+            break
+        try:
+            name, pos = _decoder.raw_decode(raw, pos)
+            colon = re.compile(r"\s*:\s*").match(raw, pos)
+            if not colon:
+                break
+            value, pos = _decoder.raw_decode(raw, colon.end())
+        except ValueError:
+            break
+        if name != skip:
+            fields[name] = value
+    return fields
@@ -1,29 +1,39 @@
 import os
+import time
 import asyncio
-import random
 import json
 import re
 import csv
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from app.services.langchain.prompts import *
-from app.utils.json_formatter import clean_and_parse_json
-from app.core.config import settings
-from langchain_community.agents.openai_assistant import OpenAIAssistantV2Runnable
-
-os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
-
-assistant = OpenAIAssistantV2Runnable(
-    assistant_id="asst_uN6jjvZ9s4Yv2PFmV1J4iRJB",
-    tools=[
-        {
-            "type": "file_search",
-            "vector_store_ids": ["vs_68c18287fbbc81919a024e80eb9d58b6"]
-        },
-        {"type": "code_interpreter"}
-    ]
+from app.services.langchain.backends import get_backend
+from app.services.langchain.routing import outcomes, route_for, routes
+from app.services.langchain import prompt_registry
+from app.services.langchain.context import RunContext, IMPACT_COLUMNS, TOP_THEMES
+from app.services.langchain.rows import ODS_COLUMNS, SasbRow
+from app.services.langchain.tables import DELTA_KEY, merge_deltas, normalize_key, sort_rows, to_number
+from app.services.langchain.fanout import fan_out, dedupe
+from app.services.langchain.hedging import hedged_call
+from app.services.langchain.wire import (
+    WIRE_COLUMNS, expand_compact, expand_table, rescue_fields, rescue_rows, row_identity,
+)
+from app.services.langchain.truncation import continuation_prompt, is_truncated
+from app.services.langchain.streaming import RowStream
+from app.services.langchain.memory import preview
+from app.services.langchain.scheduler import current_lane, get_scheduler, lane
+from app.services.langchain import costs, deadline
+from app.services.langchain.deadline import RunCancelled
+from app.services.langchain.validation import (
+    MIN_ROWS_PROMPT_2, QualityGateError, check_rows, check_step, step_problems,
 )
+from app.services.langchain.resilience import (
+    ErrorKind, UpstreamUnavailable, call_with_retry, classify_error, policy_for,
+)
+from app.services.documents.preprocess import prepare_document
+from app.core.config import settings
+from app.utils.json_formatter import clean_and_parse_json
 
-MIN_ROWS_PROMPT_2 = 10
 MAX_ROWS_PROMPT_2 = 30
 
 
@@ -51,66 +61,181 @@ def try_fix_json(raw_text: str):
 
 
 # ==================================================
-# 🛟 Rescate manual de arrays en prompts con JSON roto
+# 🔒 INVOCACIÓN SEGURA
 # ==================================================
-def extract_array_from_key(raw_text: str, key: str):
+def output_text(result) -> str:
     try:
-        match = re.search(rf'"{key}"\s*:\s*\[(.*?)\]', raw_text, re.DOTALL)
-        if not match:
-            return None
-        arr = "[" + match.group(1) + "]"
-        return json.loads(arr)
-    except:
-        return None
+        return result[0].content[0].text.value
+    except Exception:
+        return ""
+
+
+async def invoke_once(params, rows: Optional[RowStream] = None, step: str = "default"):
+    # Modelo, tools, tope de salida y backend del paso (routing.py)
+    route = route_for(step)
+    backend = get_backend(route.backend)
+    if costs.run_model():
+        # Corrida degradada por presupuesto (ver costs.preflight)
+        params = {**params, "model": costs.run_model()}
+    # Lugar en el scheduler por run (clase y tenant del contextvar `lane`)
+    async with get_scheduler().slot(step):
+        started = time.perf_counter()
+        if rows is not None and settings.ESG_STREAMING:
+            rows.reset()
+            result = await backend.stream(step, route, params, rows.feed)
+        else:
+            result = await backend.invoke(step, route, params)
+        outcomes.run(step, time.perf_counter() - started, params.get("model"))
+    # Fuera del slot: leer el usage del run no ocupa lugar en el scheduler
+    await costs.record_run(step, params, result, output_text(result))
+    return result
 
 
-# ==================================================
-# 🔒 INVOCACIÓN SEGURA
-# ==================================================
-async def safe_invoke(params):
-    for _ in range(5):
-        try:
-            return assistant.invoke(params)
-        except Exception as e:
-            err = str(e).lower()
+async def safe_invoke(
+    params, step: str = "default", is_valid=None, rows: Optional[RowStream] = None, keep_thread: bool = False
+):
+    """
+    Invoca al asistente con la política de reintentos del paso (backoff con
+    jitter + circuit breaker, ver resilience.py). Los runs sin thread previo
+    se pueden duplicar (hedging) si superan el p95 de su paso; los que
+    continúan un thread no, porque un thread nuevo perdería el contexto.
+    Con `rows`, el run se hace en streaming y las filas se emiten al cerrarse
+    (solo el primario; el hedge no alimenta el parser). Una corrida
+    degradada por presupuesto no hace hedges (duplican el costo).
+    Con `keep_thread` los reintentos siguen en el mismo thread (las
+    continuaciones solo tienen sentido con las filas previas en contexto).
+    """
+    attempts = 0
+    meter = costs.current_meter()
+
+    async def call():
+        nonlocal attempts
+        attempts += 1
+        if attempts > 1 and not keep_thread:
+            # Thread nuevo: el paso se rehace con su contexto explícito
+            params.pop("thread_id", None)
+        if "thread_id" in params or (meter is not None and meter.downgraded):
+            return await invoke_once(params, rows, step)
+        return await hedged_call(
+            step, lambda hedge: invoke_once(dict(params), None if hedge else rows, step), is_valid
+        )
 
-            if "insufficient_quota" in err:
-                raise RuntimeError("❌ Créditos agotados.")
+    return await call_with_retry(step, call)
 
-            if "rate_limit" in err or "tokens per minute" in err:
-                print("⏳ Rate limit. Esperando 3 minutos…")
-                await asyncio.sleep(180)
-                params.pop("thread_id", None)
-                continue
 
-            if "timeout" in err:
-                await asyncio.sleep(10)
-                continue
+# ==================================================
+# ✂️ Tablas truncadas → continuación desde la fila N
+# ==================================================
+async def complete_table(ctx: RunContext, step: str, key: str, raw: str, thread_id: str):
+    """
+    Une las filas completas de una salida truncada con las que devuelven
+    llamadas cortas de continuación en el mismo thread (como máximo
+    ESG_MAX_CONTINUATIONS), en vez de regenerar el prompt entero.
+    """
+    rows = rescue_rows(raw, key) or []
+
+    for n in range(1, settings.ESG_MAX_CONTINUATIONS + 1):
+        print(f"✂️ {step}: salida truncada tras {len(rows)} filas → continuación {n}")
+        ctx.continuations[step] = ctx.continuations.get(step, 0) + 1
+
+        # Un reintento en un thread nuevo no sabe qué filas faltan: se queda en el thread
+        result = await safe_invoke(
+            {"content": continuation_prompt(key, rows), "thread_id": thread_id},
+            step=f"{step}_continue",
+            keep_thread=True,
+        )
+        raw = output_text(result)
+        before = len(rows)
+        rows = dedupe(rows + (rescue_rows(raw, key) or []), key=lambda r: row_identity(key, r))
 
-            raise
+        if not is_truncated(raw) or len(rows) == before:
+            break
+    return rows
 
-    raise RuntimeError("❌ Falló la llamada después de múltiples intentos.")
 
+# ==================================================
+# 🧮 Deltas de prompts 3–6 → tabla completa (join local por tema)
+# ==================================================
+DELTA_BASE = {"prompt_3": "prompt_2", "prompt_4": "prompt_3", "prompt_5": "prompt_4", "prompt_6": "prompt_5"}
+
+
+def apply_delta(ctx: RunContext, step: str, parsed: dict) -> dict:
+    """
+    Une la delta del paso sobre la tabla del paso anterior y devuelve el
+    mismo `response_content` que antes ({"materiality_table": [...]}), así
+    PDFGenerator y los clientes de la API no cambian. Lanza ValueError si
+    la delta es inválida, para reintentar solo este paso.
+    """
+    if not parsed or not isinstance(parsed.get(DELTA_KEY), list):
+        raise ValueError(f"{step}: falta '{DELTA_KEY}' en la respuesta")
+    delta = parsed[DELTA_KEY]
+
+    if step == "prompt_3":
+        base = ctx.outputs["prompt_2"]["materiality_table"]
+        rows, issues = merge_deltas(base, delta, IMPACT_COLUMNS)
+        result = {"materiality_table": rows, "resumen_sector": parsed.get("resumen_sector", "")}
+
+    elif step == "prompt_4":
+        base = ctx.outputs["prompt_3"]["materiality_table"]
+        rows, issues = merge_deltas(base, delta, ["gravedad", "probabilidad", "alcance"])
+        for r in rows:
+            r["materialidad_esg"] = sum(
+                to_number(r.get(c))
+                for c in ("valor_materialidad_financiera", "gravedad", "probabilidad", "alcance")
+            )
+        result = {"materiality_table": rows}
+
+    elif step == "prompt_5":
+        base = ctx.outputs["prompt_4"]["materiality_table"]
+        expected = min(TOP_THEMES, len(base))
+        if len({normalize_key(r.get("tema")) for r in delta if isinstance(r, dict)}) < expected:
+            raise ValueError(f"{step}: se esperaban {expected} temas priorizados")
+        tagged = [{"tema": r.get("tema"), "tema_material": True} for r in delta if isinstance(r, dict)]
+        rows, issues = merge_deltas(base, tagged, ["tema_material"], required=[], fill_value=False)
+        result = {"materiality_table": sort_rows(rows, "materialidad_esg")}
+
+    elif step == "prompt_6":
+        base = ctx.outputs["prompt_5"]["materiality_table"]
+        prioritized = [normalize_key(r.get("tema")) for r in base if r.get("tema_material")]
+        rows, issues = merge_deltas(base, delta, ODS_COLUMNS, required=prioritized, fill_value="NA")
+        result = {"materiality_table": rows}
+
+    else:
+        raise KeyError(step)
+
+    if issues["unknown"]:
+        if step == "prompt_5":
+            raise ValueError(f"{step}: temas inexistentes en la tabla: {issues['unknown'][:5]}")
+        print(f"⚠️ {step}: temas ignorados (no están en la tabla base): {issues['unknown'][:5]}")
+    if issues["duplicates"]:
+        print(f"⚠️ {step}: temas duplicados en la delta: {issues['duplicates'][:5]}")
+    return result
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CSV_SASB_PATH = os.path.join(BASE_DIR, "data", "lista_sasb.csv")
 
-def load_sasb_rows_by_industry(industria_sasb: str):
-    rows = []
+@lru_cache(maxsize=1)
+def sasb_index() -> Dict[str, Tuple[SasbRow, ...]]:
+    """CSV SASB leído una vez por proceso: industria → filas compactas (compartidas)."""
+    index: Dict[str, List[SasbRow]] = {}
     with open(CSV_SASB_PATH, mode="r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            if row["INDUSTRIA"].strip() == industria_sasb.strip():
-                rows.append({
-                    "industria": row["INDUSTRIA"],
-                    "tema": row["TEMA"],
-                    "parametro_contabilidad": row["PARÁMETRO DE CONTABILIDAD"],
-                    "categoria": row["CATEGORÍA"],
-                    "unidad_medida": row["UNIDAD DE MEDIDA"],
-                    "codigo": row["CÓDIGO"],
-                })
-    return rows
+            industria = row["INDUSTRIA"].strip()
+            index.setdefault(industria, []).append(SasbRow.from_dict({
+                "industria": row["INDUSTRIA"],
+                "tema": row["TEMA"],
+                "parametro_contabilidad": row["PARÁMETRO DE CONTABILIDAD"],
+                "categoria": row["CATEGORÍA"],
+                "unidad_medida": row["UNIDAD DE MEDIDA"],
+                "codigo": row["CÓDIGO"],
+            }))
+    return {industria: tuple(rows) for industria, rows in index.items()}
+
+
+def load_sasb_rows_by_industry(industria_sasb: str):
+    return list(sasb_index().get(industria_sasb.strip(), ()))
 
 
 
@@ -124,7 +249,7 @@ async def run_sasb_mapping_and_table(industry: str):
 
     p8_raw = await safe_invoke({
         "content": prompt_8.format(industry=industry)
-    })
+    }, step="prompt_8")
 
     try:
         p8_text = p8_raw[0].content[0].text.value
@@ -134,7 +259,9 @@ async def run_sasb_mapping_and_table(industry: str):
     p8_json = try_fix_json(p8_text)
 
     if not p8_json or "mapeo_sasb" not in p8_json:
-        raise RuntimeError(f"❌ Prompt 8 devolvió un JSON inválido:\n{p8_text}")
+        outcomes.outcome("prompt_8", "failed", costs.run_model())
+        raise RuntimeError(f"❌ Prompt 8 devolvió un JSON inválido:\n{preview(p8_text)}")
+    outcomes.outcome("prompt_8", "first_try", costs.run_model())
 
     industria_sasb = p8_json["mapeo_sasb"][0]["industria_sasb"]
     print(f"✅ Industria SASB detectada por Prompt 8: {industria_sasb}")
@@ -173,55 +300,240 @@ async def run_esg_analysis(
     country: str,
     website: str,
     industry: str,
-    document: Optional[str] = None
+    document: Optional[str] = None,
+    on_event=None,
+    priority: Optional[str] = None,
+    tenant: Optional[str] = None,
 ):
+    """
+    `on_event(dict)` recibe el progreso: pasos iniciados/terminados y filas en streaming.
+    `priority` ("interactive" | "batch") y `tenant` (por defecto la
+    organización) ordenan sus runs en el scheduler.
+    """
+    ctx = RunContext(organization_name, country, website, industry, on_event=on_event)
+    token = deadline.current_token()
+    if token is not None:
+        token.state = "running"
+    try:
+        with lane(priority, tenant or organization_name):
+            with costs.metering(costs.CostMeter(current_lane().tenant)) as meter:
+                ctx.cost = meter
+                result = await _run_pipeline(ctx, document)
+        if result["status"] == "complete":
+            costs.history.record(meter)
+        return result
+    except RunCancelled as e:
+        return _partial_result(ctx, e)
+    except asyncio.CancelledError:
+        # Cancelado por su token (endpoint / deadline): se devuelve lo que hay.
+        # Otra cancelación (apagado del worker) se propaga.
+        if token is None or not token.cancelled:
+            raise
+        asyncio.current_task().uncancel()
+        return _partial_result(ctx, token.error())
+    finally:
+        if token is not None:
+            # Con el resultado armado ya no hay nada que cancelar
+            token.finish()
+        # Borra los crudos retenidos (también los derramados a disco)
+        ctx.close()
+
+
+def _result(ctx: RunContext, status: str, **extra):
+    return {
+        "status": status,
+        "responses": ctx.responses,
+        "failed_prompts": [p.name for p in ctx.failed_prompts],
+        "metrics": {
+            "context": ctx.metrics(),
+            "prompts": prompt_registry.versions(),
+            "document": ctx.document_stats,
+            "cost": ctx.cost.snapshot() if ctx.cost else None,
+            "routing": {step: route.describe() for step, route in routes().items()},
+        },
+        **extra,
+    }
+
+
+def _partial_result(ctx: RunContext, error: RunCancelled):
+    """Corrida cortada (cancelación, deadline o presupuesto): las respuestas ya generadas."""
+    print(f"🛑 Análisis cortado ({error.status}): {error}")
+    ctx.emit("aborted", reason=error.status, message=str(error))
+    return _result(ctx, error.status, aborted={"reason": error.status, "message": str(error)})
+
+
+async def _run_pipeline(ctx: RunContext, document: Optional[str]):
+    organization_name, country, website, industry = (
+        ctx.organization_name, ctx.country, ctx.website, ctx.industry,
+    )
     print("\n🚀 Iniciando análisis ESG para", organization_name)
 
-    responses = []
-    failed_prompts = []
+    # En el contexto: si la corrida se corta, el resultado parcial las usa
+    responses = ctx.responses
+    failed_prompts = ctx.failed_prompts
     thread_id = None
 
+    def mark_failed(prompt):
+        if prompt not in failed_prompts:
+            failed_prompts.append(prompt)
+
+    def table_rows(step, key):
+        return RowStream(key, lambda index, row: ctx.emit("row", step=step, key=key, index=index, row=row))
+
     # ==================================================
     # Helper interno — GUARDA RAW OUTPUT
     # ==================================================
-    async def run_prompt(prompt, content, name=None, retries=4, use_thread=True):
+    async def run_prompt(prompt, content, name=None, use_thread=True, postprocess=None, step=None, table_key=None):
+        """
+        Ejecuta un paso. Los errores upstream ya se reintentan en safe_invoke;
+        aquí solo se reintentan las salidas inválidas (JSON roto, delta
+        incompleta, quality gate), con el presupuesto `output_attempts` del paso.
+        Con `table_key`, una salida truncada se completa con continuaciones.
+        Si el quality gate nunca pasa se devuelve la última salida marcada
+        como degradada (el paso cuenta como fallido).
+        """
         nonlocal thread_id
-        last_raw = ""
+        degraded = None
+        step = step or name or prompt.name
+        policy = policy_for(step)
+        ctx.emit("step", step=step, status="start")
 
-        for attempt in range(1, retries + 1):
-            print(f"\n🧪 Ejecutando {name or prompt.name} (Intento {attempt}/{retries})")
+        for attempt in range(1, policy.output_attempts + 1):
+            deadline.checkpoint(step)
+            print(f"\n🧪 Ejecutando {name or prompt.name} (Intento {attempt}/{policy.output_attempts})")
 
+            parsed = None
             params = {"content": content}
-            if use_thread and thread_id:
+            # En modo fork cada paso lleva su contexto y arranca un thread nuevo
+            if use_thread and thread_id and not ctx.fork_threads:
                 params["thread_id"] = thread_id
 
             try:
-                result = await safe_invoke(params)
+                result = await safe_invoke(
+                    params,
+                    step=step,
+                    is_valid=lambda r: try_fix_json(output_text(r)) is not None,
+                    rows=table_rows(step, table_key) if table_key else None,
+                )
                 run = result[0]
 
                 if hasattr(run, "thread_id"):
                     thread_id = run.thread_id
 
-                last_raw = run.content[0].text.value
-                run_prompt.last_raw = last_raw
-
-                parsed = try_fix_json(last_raw)
-
+                raw = run.content[0].text.value
+                # Solo se retiene comprimido (rescate de filas si el paso falla)
+                ctx.memory.put_raw(step, raw)
+
+                if table_key and is_truncated(raw):
+                    # Se conservan los demás campos que alcanzaron a cerrarse ("exhausted", ...)
+                    parsed = rescue_fields(raw, table_key)
+                    parsed[table_key] = await complete_table(ctx, step, table_key, raw, run.thread_id)
+                else:
+                    parsed = try_fix_json(raw)
+                del raw, result, run
+                if postprocess:
+                    parsed = postprocess(parsed)
+                check_step(step, parsed)
+
+                ctx.memory.drop_raw(step)
+                outcomes.outcome(step, "first_try" if attempt == 1 else "retried", costs.run_model())
                 print(f"✅ {name or prompt.name} completado")
+                ctx.emit("step", step=step, status="done")
                 return parsed
 
+            except (UpstreamUnavailable, RunCancelled):
+                raise
+
+            except QualityGateError as e:
+                print(f"🚦 {name or prompt.name} no pasó el quality gate: {preview(e)}")
+                # Sin JSON no hay nada que aceptar degradado: si ningún intento
+                # dejó salida, el paso cuenta como fallido
+                if parsed:
+                    degraded = (parsed, e.problems)
+                thread_id = None
+                if attempt < policy.output_attempts:
+                    await deadline.sleep(policy.delay(attempt, ErrorKind.INVALID_OUTPUT), step)
+
             except Exception as e:
-                print(f"⚠️ Error recuperable en {name}: {e}")
+                kind = classify_error(e)
                 thread_id = None
-                await asyncio.sleep(5)
+                if kind != ErrorKind.INVALID_OUTPUT:
+                    # Errores upstream: safe_invoke ya agotó su presupuesto
+                    print(f"⛔ Error {kind.value} en {name}: {preview(e)}")
+                    break
+                print(f"⚠️ Salida inválida en {name}: {preview(e)}")
+                if attempt < policy.output_attempts:
+                    await deadline.sleep(policy.delay(attempt, kind), step)
+
+        mark_failed(prompt)
+        if degraded is not None:
+            parsed, problems = degraded
+            print(f"⚠️ {name or prompt.name} se acepta degradado ({len(problems)} problemas)")
+            outcomes.outcome(step, "degraded", costs.run_model())
+            ctx.quality[step] = problems
+            ctx.emit("step", step=step, status="degraded", problems=problems[:5])
+            return parsed
 
         print(f"⛔ {name or prompt.name} falló TODOS los intentos")
-        failed_prompts.append(prompt)
+        outcomes.outcome(step, "failed", costs.run_model())
+        ctx.emit("step", step=step, status="failed")
         return None
 
+    # ==================================================
+    # Fan-out por tema (Prompts 6, 7 y 10)
+    # ==================================================
+    async def run_shard(step, prompt, themes, array_key):
+        content = ctx.build_content(step, prompt.template, themes=themes)
+        result = await safe_invoke(
+            {"content": content},
+            step=step,
+            is_valid=lambda r: f'"{array_key}"' in output_text(r),
+            rows=table_rows(step, array_key),
+        )
+        raw = output_text(result)
+        if is_truncated(raw):
+            rows = await complete_table(ctx, step, array_key, raw, result[0].thread_id)
+        else:
+            parsed = try_fix_json(raw)
+            rows = expand_table(parsed.get(array_key), WIRE_COLUMNS.get(array_key)) if parsed else None
+            # Rescate de las filas completas aunque el JSON esté roto
+            if rows is None:
+                rows = rescue_rows(raw, array_key)
+        # None o filas que no pasan las reglas → shard fallido (se reintenta solo)
+        return check_rows(step, array_key, rows) if rows else None
+
+    async def run_fanout(step, prompt, array_key):
+        deadline.checkpoint(step)
+        themes = ctx.prioritized_themes()
+        shard_size = settings.ESG_FANOUT_SHARD_SIZE if settings.ESG_FANOUT_ENABLED else max(1, len(themes))
+        print(f"\n🧪 Ejecutando {prompt.name} ({len(themes)} temas, shards de {shard_size})")
+        ctx.emit("step", step=step, status="start", themes=len(themes))
+
+        rows, failed_shards = await fan_out(
+            themes,
+            lambda shard: run_shard(step, prompt, shard, array_key),
+            shard_size=shard_size,
+            name=prompt.name,
+        )
+        missing = [t.get("tema") for shard in failed_shards for t in shard]
+        ctx.emit("step", step=step, status="failed" if missing else "done", missing=missing)
+        return rows, missing
+
     # ==================================================
     # PROMPT 1
     # ==================================================
+    # Extracto acotado del documento (cacheado por hash; CPU fuera del event loop)
+    prepared = await asyncio.to_thread(prepare_document, document) if document else None
+    ctx.document_stats = prepared.stats() if prepared else None
+    if prepared:
+        print(f"📄 Documento: {prepared.chars_in} → {len(prepared.text)} caracteres "
+              f"({prepared.selected}/{prepared.chunks} chunks{', cache' if prepared.cached else ''})")
+
+    # 💸 Preflight: estimación vs. presupuestos antes del primer run pagado
+    # (BudgetExceeded si no entra ni degradando el modelo)
+    budget = costs.preflight(ctx.cost, prompt_registry.count_tokens(prepared.text) if prepared else 0)
+    ctx.emit("budget", decision=budget["decision"], estimate_usd=budget["estimate"]["usd"], model=ctx.cost.model)
+
     p1 = await run_prompt(
         prompt_1,
         prompt_1.format(
@@ -229,13 +541,15 @@ async def run_esg_analysis(
             country=country,
             website=website,
             industry=industry,
-            document=document or "",
+            document=prepared.text if prepared else "",
         ),
         name="Prompt 1",
-        use_thread=False
+        use_thread=False,
+        step="prompt_1",
     )
 
     if p1:
+        ctx.record("prompt_1", p1)
         responses.append(
             {"name": prompt_1.name, "response_content": p1, "thread_id": thread_id}
         )
@@ -243,67 +557,39 @@ async def run_esg_analysis(
     # ==================================================
     # PROMPT 2 (con rescate de tabla + extensión 2.1)
     # ==================================================
-    def extract_table(raw_text: str):
-        try:
-            match = re.search(r'"materiality_table"\s*:\s*\[(.*?)\]', raw_text, re.DOTALL)
-            if not match:
-                return None
-            arr = "[" + match.group(1) + "]"
-            return json.loads(arr)
-        except:
-            return None
-
-    print("\n🔹 Ejecutando Prompt 2 (máx 2 intentos)")
-
-    rows = []
-    exhausted = False
-    raw_p2 = None
-
-    for attempt in range(1, 3):
-        p2 = await run_prompt(
-            prompt_2,
-            prompt_2.format(
-                organization_name=organization_name,
-                country=country,
-                website=website,
-                industry=industry,
-            ),
-            name="Prompt 2",
-        )
-
-        raw_p2 = run_prompt.last_raw
-
-        if p2 and "materiality_table" in p2:
-            rows = p2["materiality_table"]
-            exhausted = p2.get("exhausted", False)
-        else:
-            extracted = extract_table(raw_p2)
-            rows = extracted or []
-            exhausted = False
-
-        if exhausted:
-            print("⚠️ Prompt 2 marcó exhausted → deteniendo reintentos.")
-            break
-
-        if len(rows) >= MIN_ROWS_PROMPT_2:
-            print(f"✅ Prompt 2 OK con {len(rows)} filas (>= {MIN_ROWS_PROMPT_2}).")
-            break
+    # El mínimo de filas (salvo "exhausted") lo exige el quality gate de prompt_2
+    p2 = await run_prompt(
+        prompt_2,
+        prompt_2.format(
+            organization_name=organization_name,
+            country=country,
+            website=website,
+            industry=industry,
+        ),
+        name="Prompt 2",
+        postprocess=lambda parsed: expand_compact(parsed, "materiality_table"),
+        step="prompt_2",
+        table_key="materiality_table",
+    )
 
-        print(
-            f"⚠️ Prompt 2 devolvió solo {len(rows)} filas (< {MIN_ROWS_PROMPT_2}) → reintentando…"
-        )
-        await asyncio.sleep(8)
+    if p2 and isinstance(p2.get("materiality_table"), list):
+        rows = p2["materiality_table"]
+        exhausted = p2.get("exhausted", False)
+    else:
+        rows = rescue_rows(ctx.memory.raw("prompt_2"), "materiality_table") or []
+        exhausted = False
+    ctx.memory.drop_raw("prompt_2")
+    print(f"📊 Prompt 2: {len(rows)} filas (mínimo {MIN_ROWS_PROMPT_2}, exhausted={exhausted})")
 
     # Recortar al máximo permitido
     rows = rows[:MAX_ROWS_PROMPT_2]
+    p2_content = {"materiality_table": rows, "exhausted": exhausted}
+    ctx.record("prompt_2", p2_content)
 
     responses.append(
         {
             "name": prompt_2.name,
-            "response_content": {
-                "materiality_table": rows,
-                "exhausted": exhausted,
-            },
+            "response_content": p2_content,
             "thread_id": thread_id,
         }
     )
@@ -311,20 +597,68 @@ async def run_esg_analysis(
     # ==================================================
     # PROMPTS 3 → 6  (ANTES iban después, ahora están donde corresponde)
     # ==================================================
-    for p in [prompt_3, prompt_4, prompt_5, prompt_6]:
-        parsed = await run_prompt(
-            p,
-            p.template,
-            name=p.name,
-            retries=3,
-        )
+    for step, p in [
+        ("prompt_3", prompt_3), ("prompt_4", prompt_4),
+        ("prompt_5", prompt_5), ("prompt_6", prompt_6),
+    ]:
+        if step == "prompt_6":
+            # Prompt 5 ya corrió (o falló): los temas no cambian más
+            ctx.freeze_themes()
+            themes_ready = "prompt_5" in ctx.outputs
+        if DELTA_BASE[step] not in ctx.outputs:
+            print(f"⛔ {p.name} omitido: falta la tabla de {DELTA_BASE[step]}")
+            mark_failed(p)
+            ctx.consumed(step)
+            continue
+
+        if step == "prompt_6":
+            # ODS por tema: shards concurrentes, luego join local de la delta
+            rows, missing = await run_fanout(step, p, DELTA_KEY)
+            try:
+                parsed = apply_delta(ctx, step, {DELTA_KEY: rows}) if not missing else None
+            except ValueError as e:
+                print(f"⚠️ {p.name}: {preview(e)}")
+                parsed = None
+            problems = step_problems(step, parsed) if parsed else []
+            if problems:
+                print(f"⚠️ {p.name}: {len(problems)} problemas de quality gate")
+                ctx.quality[step] = problems
+                mark_failed(p)
+        else:
+            parsed = await run_prompt(
+                p,
+                ctx.build_content(step, p.template),
+                name=p.name,
+                postprocess=lambda parsed, step=step: apply_delta(ctx, step, parsed),
+                step=step,
+            )
 
         if parsed:
+            ctx.record(step, parsed)
             responses.append(
                 {"name": p.name, "response_content": parsed, "thread_id": thread_id}
             )
         else:
-            failed_prompts.append(p)
+            mark_failed(p)
+        ctx.consumed(step)
+
+    # ==================================================
+    # PROMPT 7 → contenidos GRI por tema (fan-out)
+    # ==================================================
+    # Las tablas 4 y 5 ya se soltaron tras Prompt 6; los temas quedaron fijados
+    if themes_ready:
+        gri_rows, missing = await run_fanout("prompt_7", prompt_7, "gri_mapping")
+        # Misma fila de dos shards: mismo estándar, número, contenido y requerimiento
+        gri_rows = dedupe(gri_rows, key=lambda r: row_identity("gri_mapping", r))
+        content = {"gri_mapping": gri_rows}
+        if missing:
+            content["temas_sin_resultado"] = missing
+            mark_failed(prompt_7)
+        ctx.record("prompt_7", content)
+        responses.append({"name": prompt_7.name, "response_content": content, "thread_id": None})
+    else:
+        mark_failed(prompt_7)
+    ctx.consumed("prompt_7")
 
     # ==================================================
     # PROMPT 8 (LLM) → mapeo sector S&P → industria SASB
@@ -333,7 +667,7 @@ async def run_esg_analysis(
 
     p8_raw = await safe_invoke({
         "content": prompt_8.format(industry=industry)
-    })
+    }, step="prompt_8")
 
     try:
         p8_text = p8_raw[0].content[0].text.value
@@ -343,7 +677,9 @@ async def run_esg_analysis(
     p8_json = try_fix_json(p8_text)
 
     if not p8_json or "mapeo_sasb" not in p8_json:
-        raise RuntimeError(f"❌ Prompt 8 devolvió JSON inválido:\n{p8_text}")
+        outcomes.outcome("prompt_8", "failed", costs.run_model())
+        raise RuntimeError(f"❌ Prompt 8 devolvió JSON inválido:\n{preview(p8_text)}")
+    outcomes.outcome("prompt_8", "first_try", costs.run_model())
 
     industria_sasb = p8_json["mapeo_sasb"][0]["industria_sasb"]
     print(f"✅ Industria SASB detectada por Prompt 8: {industria_sasb}")
@@ -352,6 +688,7 @@ async def run_esg_analysis(
         "name": prompt_8.name,
         "response_content": p8_json
     })
+    ctx.emit("step", step="prompt_8", status="done", industria_sasb=industria_sasb)
 
     # ==================================================
     # PROMPT 9 (CSV local)
@@ -374,44 +711,43 @@ async def run_esg_analysis(
             "tabla_sasb": tabla_sasb
         }
     })
+    ctx.emit("step", step="prompt_9", status="done", rows=len(tabla_sasb))
 
     # ==================================================
-    # PROMPTS 10 → 11
+    # PROMPT 10 → regulaciones por tema (fan-out)
     # ==================================================
-    for p in [prompt_10, prompt_11]:
-
-        parsed = await run_prompt(
-            p,
-            p.template,
-            name=p.name,
-            retries=3,
-        )
+    reg_rows, missing = await run_fanout("prompt_10", prompt_10, "regulaciones")
+    reg_rows = dedupe(reg_rows, key=lambda r: (r.get("tipo_regulacion"), r.get("descripcion")))
+
+    if reg_rows:
+        content = {"regulaciones": reg_rows}
+        if missing:
+            content["temas_sin_resultado"] = missing
+            mark_failed(prompt_10)
+        ctx.record("prompt_10", content)
+        responses.append({"name": prompt_10.name, "response_content": content, "thread_id": None})
+    else:
+        mark_failed(prompt_10)
+    ctx.consumed("prompt_10")
 
-        raw = getattr(run_prompt, "last_raw", "")
-
-        # Rescate especial SOLO para Prompt 10
-        if not parsed and p is prompt_10:
-            print(f"\n⚠️ JSON inválido en {p.name}, RAW:")
-            print(raw[:2000])
-
-            arr = extract_array_from_key(raw, "regulaciones")
-            if arr:
-                parsed = {"regulaciones": arr}
+    # ==================================================
+    # PROMPT 11
+    # ==================================================
+    parsed = await run_prompt(
+        prompt_11,
+        ctx.build_content("prompt_11", prompt_11.template),
+        name=prompt_11.name,
+        step="prompt_11",
+    )
 
-        if parsed:
-            responses.append(
-                {"name": p.name, "response_content": parsed, "thread_id": thread_id}
-            )
-        else:
-            failed_prompts.append(p)
+    if parsed:
+        ctx.record("prompt_11", parsed)
+        responses.append(
+            {"name": prompt_11.name, "response_content": parsed, "thread_id": thread_id}
+        )
+    ctx.consumed("prompt_11")
 
     # ==================================================
     # RESULTADO FINAL
     # ==================================================
-    status = "complete" if not failed_prompts else "incomplete"
-
-    return {
-        "status": status,
-        "responses": responses,
-        "failed_prompts": [p.name for p in failed_prompts],
-    }
+    return _result(ctx, "complete" if not failed_prompts else "incomplete")
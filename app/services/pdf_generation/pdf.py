@@ -12,6 +12,7 @@ import logging
 from jinja2 import Environment, FileSystemLoader, Template
 from weasyprint import HTML, CSS
 from weasyprint.text.fonts import FontConfiguration
+from app.services.langchain.rows import Row
 
 logger = logging.getLogger(__name__)
 
@@ -112,7 +113,8 @@ class PDFGenerator:
             ods_data = pipeline_data[5].get("response_content", {}).get("materiality_table", [])
 
             # 🧾 4. GRI (prompt 7)
-            gri_data = pipeline_data[6].get("response_content", {}).get("gri", [])
+            gri_content = pipeline_data[6].get("response_content", {})
+            gri_data = gri_content.get("gri_mapping") or gri_content.get("gri", [])
 
             # 📈 5. SASB (prompt 9)
             sasb_data = pipeline_data[8].get("response_content", {}).get("tabla_sasb", [])
@@ -124,6 +126,9 @@ class PDFGenerator:
             exec_summary = pipeline_data[10].get("response_content", {})
 
             def normalize_item(item):
+                # Las filas compactas ya exponen sus columnas como atributos en minúscula
+                if isinstance(item, Row):
+                    return item
                 return {k.lower().replace(" ", "_"): v for k, v in item.items()}
 
             matriz_acciones = [normalize_item(i) for i in materiality_actions]
@@ -1,6 +1,8 @@
 import json
 import re
 
+from app.services.langchain.memory import preview
+
 def clean_and_parse_json(output: str) -> dict:
     """
     Limpia un string que contiene un bloque de JSON envuelto en ```json ... ```
@@ -13,4 +15,5 @@ def clean_and_parse_json(output: str) -> dict:
     try:
         return json.loads(cleaned)
     except json.JSONDecodeError as e:
-        raise ValueError(f"Error al parsear JSON: {e}\nTexto limpio: {cleaned}")
\ No newline at end of file
+        # Solo el comienzo del texto: el error termina en logs y en reintentos
+        raise ValueError(f"Error al parsear JSON: {e}\nTexto limpio: {preview(cleaned)}")
\ No newline at end of file
@@ -1,15 +1,73 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from app.api.router import api_router
+from app.core.config import settings
+from app.core.admission import Overloaded, get_admission
+from app.services.langchain.deadline import DEADLINE, RunCancelled
+from app.core.responses import FastJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Adaptia API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 🤖 Registro de clientes OpenAI: los clientes HTTP se crean en el primer uso
+    from app.services.langchain.clients import AssistantRegistry, set_registry
+
+    registry = AssistantRegistry(settings)
+    set_registry(registry)
+    app.state.assistants = registry
+
+    if settings.WARMUP_ON_STARTUP:
+        from app.core.warmup import warm_up
+
+        print("🔥 Warm-up:", await run_in_threadpool(warm_up))
+    yield
+    await registry.aclose()
+    set_registry(None)
+    # 🔌 Cerrar conexiones del pool al apagar el worker (solo si se crearon)
+    if "app.core.database" in sys.modules:
+        await sys.modules["app.core.database"].dispose_engines()
+    # 📄 Pool de extracción de documentos (solo si se usó)
+    if "app.services.documents.extract" in sys.modules:
+        sys.modules["app.services.documents.extract"].shutdown_pool()
+
+
+app = FastAPI(title="Adaptia API", lifespan=lifespan)
 
 app.include_router(api_router, prefix="/api")
 
+
+# 🚦 Worker saturado → 429/503 con Retry-After (ver app/core/admission.py);
+# también presupuesto insuficiente (402/429, app/services/langchain/costs.py)
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    return FastJSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc), "retry_after_s": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)} if exc.retry_after else None,
+    )
+
+
+# 🛑 Trabajo cancelado / deadline vencido antes de empezar (en cola): sin resultado parcial
+@app.exception_handler(RunCancelled)
+async def cancelled_handler(request, exc: RunCancelled):
+    return FastJSONResponse(
+        status_code=504 if exc.status == DEADLINE else 409,
+        content={"detail": str(exc), "status": exc.status},
+    )
+
+
+if settings.RESPONSE_COMPRESSION:
+    from app.core.compression import CompressionMiddleware
+
+    app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -29,3 +87,47 @@ print("🚀 Python API iniciada en puerto:", os.getenv("PORT", "default"))
 @app.get("/health")
 async def health():
     return {"status": "ok", "port": os.getenv("PORT", "8000")}
+
+
+@app.get("/health/openai")
+async def health_openai():
+    from app.services.langchain import costs, hedging, resilience, routing, scheduler
+
+    retries = resilience.status()
+    return {
+        "status": "ok" if retries["circuit"]["state"] == "closed" else "degraded",
+        "registry": app.state.assistants.status(),
+        "hedging": hedging.status(),
+        "scheduler": scheduler.status(),
+        "resilience": retries,
+        "costs": costs.status(),
+        "routing": routing.status(),
+    }
+
+
+@app.get("/health/memory")
+async def health_memory():
+    from app.services.langchain import memory
+
+    return {"status": "ok", "memory": memory.status()}
+
+
+@app.get("/health/admission")
+async def health_admission():
+    admission = get_admission().status()
+    return {"status": "ok" if admission["load"] <= 1 else "saturated", "admission": admission}
+
+
+@app.get("/health/db")
+async def health_db():
+    from app.core.database import pool_status
+
+    return {"status": "ok", "pools": pool_status()}
+
+
+# 🔥 Precalienta los subsistemas pesados (útil tras un cold start serverless)
+@app.post("/warmup")
+async def warmup():
+    from app.core.warmup import warm_up
+
+    return {"status": "ok", "subsystems": await run_in_threadpool(warm_up)}
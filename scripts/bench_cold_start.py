@@ -0,0 +1,103 @@
+"""
+Benchmark de cold start.
+
+1. Perfil de `python -X importtime -c "import main"` (top módulos por tiempo acumulado).
+2. Tiempo desde el lanzamiento de uvicorn hasta el primer `/health` 200.
+3. RSS del worker después de responder.
+
+Uso:
+    python scripts/bench_cold_start.py --runs 5 --max-seconds 1.0
+Sale con código 1 si la mediana supera --max-seconds (para CI).
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def import_profile(top: int):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line.replace("import time:", "").split("|")
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    rows.sort(reverse=True)
+    return [{"module": m, "cumulative_ms": c / 1000, "self_ms": s / 1000} for c, s, m in rows[:top]]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+
+def time_to_first_health(timeout: float = 30.0):
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=0.5) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - start, rss_mb(proc.pid)
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("❌ /health no respondió a tiempo")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    samples = [time_to_first_health() for _ in range(args.runs)]
+    times = [t for t, _ in samples]
+    report = {
+        "first_health_s": {
+            "median": round(statistics.median(times), 3),
+            "min": round(min(times), 3),
+            "max": round(max(times), 3),
+        },
+        "rss_mb": max((r for _, r in samples if r is not None), default=None),
+        "import_profile": import_profile(args.top),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.max_seconds is not None and report["first_health_s"]["median"] > args.max_seconds:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
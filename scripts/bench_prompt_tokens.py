@@ -0,0 +1,124 @@
+"""
+Benchmark de tokens de entrada por análisis completo.
+
+Arma el contenido real que recibe cada paso (template + datos upstream
+compactos, shards de fan-out incluidos) con una tabla de materialidad
+sintética de tamaño típico, y cuenta tokens con el contador del registro.
+
+Uso:
+    python scripts/bench_prompt_tokens.py --rows 25 --max-total 30000
+Sale con código 1 si el total supera --max-total (para CI).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.core.config import settings  # noqa: E402
+from app.services.langchain import prompt_registry  # noqa: E402
+from app.services.langchain.context import RunContext  # noqa: E402
+from app.services.langchain.fanout import split_shards  # noqa: E402
+from app.services.langchain.prompts import (  # noqa: E402
+    prompt_1, prompt_2, prompt_3, prompt_4, prompt_5, prompt_6,
+    prompt_7, prompt_8, prompt_10, prompt_11,
+)
+
+ORG = {
+    "organization_name": "Compañía Ejemplo S.A.",
+    "country": "Chile",
+    "website": "https://ejemplo.cl",
+    "industry": "Bancos comerciales",
+}
+
+
+def synthetic_context(n_rows: int) -> RunContext:
+    ctx = RunContext(ORG["organization_name"], ORG["country"], ORG["website"], ORG["industry"], "fork")
+    ctx.record("prompt_1", {
+        "nombre_empresa": ORG["organization_name"],
+        "pais_operacion": "Chile. Opera con sucursales propias y banca digital en todo el territorio.",
+        "industria": ORG["industry"],
+    })
+    rows = [
+        {
+            "sector": "Bancos",
+            "tema": f"Tema material de ejemplo número {i}",
+            "materialidad_financiera": "Alta",
+            "valor_materialidad_financiera": 5,
+            "Riesgos": "Riesgo regulatorio y reputacional por incumplimiento de estándares del sector.",
+            "Oportunidades": "Mejora de la confianza de clientes e inversionistas.",
+            "accion_marginal": "Capacitar a los equipos involucrados en el tema.",
+            "accion_moderada": "Implementar políticas y controles específicos con seguimiento anual.",
+            "accion_estructural": "Integrar el tema en la estrategia y el gobierno corporativo.",
+            "tipo_impacto": "Negativo",
+            "potencialidad_impacto": "Real",
+            "horizonte_impacto": "Largo plazo",
+            "intencionalidad_impacto": "No intencionado",
+            "penetracion_impacto": "Reversible",
+            "grado_implicacion": "Directo",
+            "gravedad": 4, "probabilidad": 3, "alcance": 3,
+            "materialidad_esg": 15 - (i % 7),
+            "tema_material": i < 10,
+        }
+        for i in range(n_rows)
+    ]
+    for step in ("prompt_2", "prompt_3", "prompt_4", "prompt_5"):
+        ctx.record(step, {"materiality_table": rows})
+    return ctx
+
+
+def measure(n_rows: int):
+    with synthetic_context(n_rows) as ctx:
+        return _measure(ctx)
+
+
+def _measure(ctx: RunContext):
+    contents = {
+        "prompt_1": [prompt_1.format(**ORG, document="")],
+        "prompt_2": [prompt_2.format(**ORG)],
+        "prompt_3": [ctx.build_content("prompt_3", prompt_3.template)],
+        "prompt_4": [ctx.build_content("prompt_4", prompt_4.template)],
+        "prompt_5": [ctx.build_content("prompt_5", prompt_5.template)],
+        "prompt_8": [prompt_8.format(industry=ORG["industry"])],
+        "prompt_11": [ctx.build_content("prompt_11", prompt_11.template)],
+    }
+    shards = split_shards(ctx.prioritized_themes(), settings.ESG_FANOUT_SHARD_SIZE)
+    for step, prompt in (("prompt_6", prompt_6), ("prompt_7", prompt_7), ("prompt_10", prompt_10)):
+        contents[step] = [ctx.build_content(step, prompt.template, themes=shard) for shard in shards]
+
+    steps = {
+        step: {
+            "calls": len(texts),
+            "tokens": sum(prompt_registry.count_tokens(t) for t in texts),
+        }
+        for step, texts in contents.items()
+    }
+    return steps, sum(s["tokens"] for s in steps.values())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=25, help="filas de la tabla de materialidad")
+    parser.add_argument("--max-total", type=int, default=None)
+    args = parser.parse_args()
+
+    steps, total = measure(args.rows)
+    report = {
+        "counter": prompt_registry.counter_name(),
+        "rows": args.rows,
+        "shard_size": settings.ESG_FANOUT_SHARD_SIZE,
+        "prompts": prompt_registry.versions(),
+        "steps": steps,
+        "total_input_tokens": total,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.max_total is not None and total > args.max_total:
+        print(f"❌ {total} tokens por análisis > --max-total {args.max_total}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark de memoria de las tablas del análisis: filas dict (representación
+anterior) contra filas compactas (`app.services.langchain.rows`).
+
+Mide con tracemalloc lo que retienen las tablas de `example_data.json`
+(materialidad, GRI, SASB, regulaciones) replicadas `--scale` veces, y el
+CSV SASB completo. Las filas se construyen desde copias nuevas de los
+strings (como llegarían de json.loads de cada respuesta del modelo) para
+que el interning de categóricos cuente igual que en producción.
+
+Uso:
+    python scripts/bench_row_memory.py --scale 10
+"""
+
+import argparse
+import csv
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.core.responses import dumps  # noqa: E402
+from app.services.langchain.rows import TABLE_ROWS, compact_rows  # noqa: E402
+from app.services.langchain.workflows import CSV_SASB_PATH  # noqa: E402
+
+EXAMPLE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "app", "services", "pdf_generation", "example_data.json"
+)
+
+
+def example_tables(scale: int):
+    """{tabla: [json de cada fila]} con las filas repetidas `scale` veces."""
+    with open(EXAMPLE, encoding="utf-8") as f:
+        responses = json.load(f)
+    tables = {key: [] for key in TABLE_ROWS}
+    for response in responses:
+        content = response.get("response_content") or {}
+        for key in TABLE_ROWS:
+            if isinstance(content.get(key), list):
+                tables[key].extend(json.dumps(r, ensure_ascii=False) for r in content[key])
+    return {key: rows * scale for key, rows in tables.items() if rows}
+
+
+def sasb_table():
+    with open(CSV_SASB_PATH, encoding="utf-8") as f:
+        rows = [
+            {
+                "industria": r["INDUSTRIA"],
+                "tema": r["TEMA"],
+                "parametro_contabilidad": r["PARÁMETRO DE CONTABILIDAD"],
+                "categoria": r["CATEGORÍA"],
+                "unidad_medida": r["UNIDAD DE MEDIDA"],
+                "codigo": r["CÓDIGO"],
+            }
+            for r in csv.DictReader(f)
+        ]
+    return [json.dumps(r, ensure_ascii=False) for r in rows]
+
+
+def retained(build):
+    """(objeto, bytes retenidos) de lo que construye `build`."""
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def median_ms(fn, runs: int = 20) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def measure(key: str, encoded_rows):
+    row_class = TABLE_ROWS[key]
+    dicts, dict_bytes = retained(lambda: [json.loads(r) for r in encoded_rows])
+    rows, row_bytes = retained(lambda: compact_rows([json.loads(r) for r in encoded_rows], row_class))
+    # Mismo contenido (las columnas conocidas salen en el orden del esquema)
+    assert json.loads(dumps(rows)) == json.loads(dumps(dicts)), key
+    return {
+        "rows": len(encoded_rows),
+        "dict_bytes": dict_bytes,
+        "compact_bytes": row_bytes,
+        "saved_pct": round(100 * (1 - row_bytes / max(dict_bytes, 1)), 1),
+        "serialize_ms": {"dict": median_ms(lambda: dumps(dicts)), "compact": median_ms(lambda: dumps(rows))},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=10, help="copias de las tablas de example_data.json")
+    args = parser.parse_args()
+
+    report = {"scale": args.scale, "tables": {}}
+    for key, encoded in example_tables(args.scale).items():
+        report["tables"][key] = measure(key, encoded)
+    report["tables"]["tabla_sasb (CSV completo)"] = measure("tabla_sasb", sasb_table())
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
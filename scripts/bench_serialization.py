@@ -0,0 +1,86 @@
+"""
+Benchmark de serialización y bytes en el cable de la respuesta del análisis.
+
+Usa `example_data.json` (respuesta real de /esg-analysis-api) replicado
+`--scale` veces y compara stdlib `json` (lo que hacía `JSONResponse`)
+contra orjson (`FastJSONResponse`), y el tamaño/tiempo de gzip y zstd con
+los niveles configurados en el middleware de compresión.
+
+Uso:
+    python scripts/bench_serialization.py --scale 3 --runs 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.core.compression import compress, zstandard  # noqa: E402
+from app.core.responses import dumps  # noqa: E402
+
+EXAMPLE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "app", "services", "pdf_generation", "example_data.json"
+)
+
+
+def payload(scale: int):
+    with open(EXAMPLE, encoding="utf-8") as f:
+        responses = json.load(f)
+    return {
+        "analysis_id": "00000000-0000-0000-0000-000000000000",
+        "status": "complete",
+        "analysis_json": responses * scale,
+        "failed_prompts": [],
+    }
+
+
+def stdlib_json(content) -> bytes:
+    # Igual que starlette.responses.JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn, runs: int):
+    samples = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=1, help="copias de example_data.json en analysis_json")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    content = payload(args.scale)
+    report = {"scale": args.scale, "runs": args.runs, "serialization_ms": {}, "wire": {}}
+
+    body_std, report["serialization_ms"]["json"] = timed(lambda: stdlib_json(content), args.runs)
+    body, report["serialization_ms"]["orjson"] = timed(lambda: dumps(content), args.runs)
+    report["serialization_ms"]["speedup"] = round(
+        report["serialization_ms"]["json"] / max(report["serialization_ms"]["orjson"], 1e-6), 1
+    )
+
+    report["wire"]["identity"] = {"bytes": len(body), "json_bytes": len(body_std)}
+    for encoding in ("gzip", "zstd"):
+        if encoding == "zstd" and zstandard is None:
+            continue
+        compressed, ms = timed(lambda: compress(body, encoding), args.runs)
+        report["wire"][encoding] = {
+            "bytes": len(compressed),
+            "ratio": round(len(body) / len(compressed), 2),
+            "compress_ms": ms,
+        }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
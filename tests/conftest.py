@@ -0,0 +1,115 @@
+"""
+Assistants API simulado sobre httpx.MockTransport (sin red) para probar
+los runs de clients.py / streaming.py con el SDK real de openai.
+"""
+
+import itertools
+import json
+from typing import Callable, Optional, Tuple
+
+import httpx
+import openai
+import pytest
+from langchain_community.agents.openai_assistant import OpenAIAssistantV2Runnable
+
+from app.services.langchain.clients import ASSISTANTS, AssistantHandle
+
+
+class FakeAssistantsAPI:
+    """
+    Threads y runs en memoria. `responder(content) -> (texto, colgado)`:
+    un run colgado queda `in_progress` hasta que se cancela.
+    """
+
+    def __init__(self, responder: Optional[Callable[[str], Tuple[str, bool]]] = None):
+        self.responder = responder or (lambda content: ("[]", False))
+        self.requests = []
+        self.runs = {}
+        # Consultas del run que responden 500 (run colgado del lado del cliente)
+        self.failing_polls = 0
+        self._ids = itertools.count(1)
+        self._pending = {}
+
+    def _start(self, thread_id: str, content: str) -> dict:
+        text, hang = self.responder(content)
+        run_id = f"run_{next(self._ids)}"
+        self.runs[run_id] = {"thread_id": thread_id, "status": "queued", "text": text, "hang": hang}
+        return self._run(run_id)
+
+    def _run(self, run_id: str) -> dict:
+        run = self.runs[run_id]
+        final = run["status"] in ("completed", "cancelled")
+        return {
+            "id": run_id,
+            "object": "thread.run",
+            "thread_id": run["thread_id"],
+            "status": run["status"],
+            "model": "gpt-4o",
+            "incomplete_details": None,
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110} if final else None,
+        }
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content) if request.content else {}
+        self.requests.append((request.method, request.url.path, body))
+        parts = request.url.path.split("/")[2:]
+
+        if parts == ["threads", "runs"]:
+            thread_id = f"thread_{next(self._ids)}"
+            return httpx.Response(200, json=self._start(thread_id, body["thread"]["messages"][0]["content"]))
+        if len(parts) == 3 and parts[2] == "messages" and request.method == "POST":
+            self._pending[parts[1]] = body["content"]
+            return httpx.Response(200, json={"id": f"msg_{next(self._ids)}", "object": "thread.message"})
+        if len(parts) == 3 and parts[2] == "runs":
+            return httpx.Response(200, json=self._start(parts[1], self._pending.pop(parts[1])))
+        if len(parts) == 4 and parts[2] == "runs":
+            if self.failing_polls:
+                self.failing_polls -= 1
+                return httpx.Response(500, json={"error": {"message": "server_error"}})
+            run = self.runs[parts[3]]
+            if run["status"] == "cancelling":
+                run["status"] = "cancelled"
+            elif not run["hang"] and run["status"] != "cancelled":
+                run["status"] = "completed"
+            else:
+                run["status"] = "in_progress" if run["status"] == "queued" else run["status"]
+            return httpx.Response(200, json=self._run(parts[3]))
+        if len(parts) == 5 and parts[4] == "cancel":
+            self.runs[parts[3]]["status"] = "cancelling"
+            return httpx.Response(200, json=self._run(parts[3]))
+        if len(parts) == 3 and parts[2] == "messages":
+            run_id = request.url.params.get("run_id")
+            message = {
+                "id": f"msg_{run_id}",
+                "object": "thread.message",
+                "thread_id": parts[1],
+                "run_id": run_id,
+                "role": "assistant",
+                "content": [{"type": "text", "text": {"value": self.runs[run_id]["text"], "annotations": []}}],
+            }
+            return httpx.Response(200, json={"object": "list", "data": [message], "has_more": False})
+        return httpx.Response(404, json={"error": {"message": f"no simulado: {request.url.path}"}})
+
+
+def make_handle(api: FakeAssistantsAPI, name: str = "esg") -> AssistantHandle:
+    transport = httpx.MockTransport(api)
+    runnable = OpenAIAssistantV2Runnable(
+        assistant_id=ASSISTANTS[name].assistant_id,
+        client=openai.OpenAI(api_key="test", http_client=httpx.Client(transport=transport), max_retries=0),
+        async_client=openai.AsyncOpenAI(
+            api_key="test", http_client=httpx.AsyncClient(transport=transport), max_retries=0
+        ),
+        check_every_ms=10,
+    )
+    return AssistantHandle(name, ASSISTANTS[name], runnable)
+
+
+@pytest.fixture
+def assistants_api():
+    """Fábrica: `assistants_api(responder)` → (api, handle del asistente "esg")."""
+
+    def build(responder=None):
+        api = FakeAssistantsAPI(responder)
+        return api, make_handle(api)
+
+    return build
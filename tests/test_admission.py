@@ -0,0 +1,72 @@
+"""
+Control de admisión: cupo en curso, cola FIFO acotada, 429 y 503.
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController, Overloaded
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_cola_llena_rechaza_con_429_y_retry_after():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=1, queue_timeout_s=5)
+        await admission.acquire()
+        waiting = asyncio.create_task(admission.acquire())
+        await settle()
+
+        with pytest.raises(Overloaded) as exc:
+            await admission.acquire()
+
+        admission.release()
+        await waiting
+        return admission, exc.value
+
+    admission, error = asyncio.run(scenario())
+
+    assert error.status_code == 429
+    assert error.retry_after >= 1
+    assert admission.rejected_full == 1
+    assert (admission.inflight, admission.queued, admission.admitted) == (1, 0, 2)
+
+
+def test_release_pasa_el_lugar_en_orden_de_llegada():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=5, queue_timeout_s=5)
+        order = []
+
+        async def analysis(name):
+            async with admission.slot():
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(analysis(n) for n in ("a", "b", "c")))
+        return admission, order
+
+    admission, order = asyncio.run(scenario())
+
+    assert order == ["a", "b", "c"]
+    assert admission.inflight == 0
+    assert admission.queued_total == 2
+
+
+def test_espera_agotada_responde_503_y_sale_de_la_cola():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=5, queue_timeout_s=0.01)
+        await admission.acquire()
+        with pytest.raises(Overloaded) as exc:
+            await admission.acquire()
+        admission.release()
+        return admission, exc.value
+
+    admission, error = asyncio.run(scenario())
+
+    assert error.status_code == 503
+    assert admission.rejected_timeout == 1
+    assert (admission.inflight, admission.queued) == (0, 0)
@@ -0,0 +1,59 @@
+"""
+Backends: un paso corrido de punta a punta contra LocalBackend (sin red).
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services.langchain import backends, costs, routing, workflows
+from app.services.langchain.backends import Backend, LocalBackend
+from app.services.langchain.routing import RouteOutcomes
+
+
+@pytest.fixture
+def local(monkeypatch):
+    seen = []
+
+    def responder(step, params):
+        seen.append((step, params.get("model")))
+        return json.dumps({"mapeo_sasb": [{"industria_sasb": "Bancos"}]})
+
+    backend = LocalBackend(responder)
+    monkeypatch.setattr(settings, "ESG_BACKEND", "local")
+    monkeypatch.setitem(backends._backends, "local", backend)
+    monkeypatch.setattr(workflows, "outcomes", RouteOutcomes())
+    return seen
+
+
+def test_backend_sin_invoke_no_se_puede_instanciar():
+    with pytest.raises(TypeError):
+        Backend()
+
+
+def test_paso_corre_en_local_backend(local):
+    [msg] = asyncio.run(workflows.invoke_once({"content": "industria: banca"}, step="prompt_8"))
+
+    assert json.loads(msg.content[0].text.value)["mapeo_sasb"][0]["industria_sasb"] == "Bancos"
+    assert msg.thread_id.startswith("local_")
+    assert local == [("prompt_8", None)]
+    [row] = workflows.outcomes.snapshot()
+    assert (row["step"], row["model"], row["runs"]) == ("prompt_8", routing.model_for("prompt_8"), 1)
+
+
+def test_corrida_degradada_registra_el_modelo_que_corrio(local):
+    meter = costs.CostMeter("tenant_test")
+    meter.model = "gpt-4o-mini-degradado"
+
+    async def run():
+        with costs.metering(meter):
+            await workflows.invoke_once({"content": "industria: banca"}, step="prompt_8")
+
+    asyncio.run(run())
+
+    assert local == [("prompt_8", "gpt-4o-mini-degradado")]
+    [row] = workflows.outcomes.snapshot()
+    assert row["model"] == "gpt-4o-mini-degradado"
+    assert meter.steps["prompt_8"]["runs"] == 1
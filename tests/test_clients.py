@@ -0,0 +1,41 @@
+"""
+Runs del Assistants API contra un transporte HTTP simulado (ver conftest.py).
+"""
+
+import asyncio
+
+import openai
+import pytest
+
+
+def test_run_en_thread_existente_no_envia_tool_resources(assistants_api):
+    api, handle = assistants_api()
+
+    [message] = asyncio.run(handle.ainvoke({"content": "continúa", "thread_id": "thread_1"}))
+
+    assert message.thread_id == "thread_1"
+    assert message.content[0].text.value == "[]"
+    [(_, _, run_body)] = [r for r in api.requests if r[:2] == ("POST", "/v1/threads/thread_1/runs")]
+    assert "tool_resources" not in run_body
+    assert run_body["tools"] == [{"type": "file_search"}, {"type": "code_interpreter"}]
+
+
+def test_run_nuevo_envia_tool_resources_al_thread(assistants_api):
+    api, handle = assistants_api()
+
+    asyncio.run(handle.ainvoke({"content": "hola"}))
+
+    [(_, _, body)] = [r for r in api.requests if r[:2] == ("POST", "/v1/threads/runs")]
+    assert body["tool_resources"]["file_search"]["vector_store_ids"]
+
+
+def test_error_al_consultar_el_run_lo_cancela(assistants_api):
+    api, handle = assistants_api(lambda content: ("[]", True))
+    api.failing_polls = 1
+
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(handle.ainvoke({"content": "continúa", "thread_id": "thread_1"}))
+
+    # Sin cancelar, el run abandonado bloquearía el thread para el reintento
+    [run] = api.runs.values()
+    assert run["status"] == "cancelled"
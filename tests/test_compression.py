@@ -0,0 +1,28 @@
+"""
+Negociación de Accept-Encoding.
+"""
+
+import pytest
+
+from app.core import compression
+from app.core.compression import choose_encoding
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("*", "gzip"),
+    ("br, *", "gzip"),
+    ("gzip, zstd", "zstd"),
+    ("zstd;q=0.5, *", "gzip"),
+    ("zstd, *;q=0.5", "zstd"),
+    ("gzip;q=0, *", None),
+    ("br", None),
+    ("", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+def test_sin_zstandard_se_usa_gzip(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+
+    assert choose_encoding("zstd, gzip") == "gzip"
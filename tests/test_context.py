@@ -0,0 +1,53 @@
+"""
+RunContext: salidas liberadas al consumirse y corridas cerradas fuera de memory.status().
+"""
+
+from app.services.langchain import memory
+from app.services.langchain.context import RunContext
+
+
+def themes_table(n=12):
+    return {
+        "materiality_table": [
+            {"tema": f"Tema {i}", "materialidad_esg": 20 - i, "tema_material": i < 10}
+            for i in range(n)
+        ]
+    }
+
+
+def test_consumed_libera_salidas_que_nadie_vuelve_a_leer():
+    with RunContext("Acme", "Chile", "acme.cl", "Energía") as ctx:
+        ctx.record("prompt_3", themes_table())
+        ctx.record("prompt_4", themes_table())
+        retained = ctx.memory.current
+
+        ctx.consumed("prompt_4")
+
+        assert "prompt_3" not in ctx.outputs
+        assert "prompt_4" in ctx.outputs
+        assert "out:prompt_3" not in ctx.memory.sizes
+        assert ctx.memory.current < retained
+
+
+def test_temas_fijados_sobreviven_a_soltar_prompt_5():
+    with RunContext("Acme", "Chile", "acme.cl", "Energía") as ctx:
+        ctx.record("prompt_4", themes_table())
+        ctx.record("prompt_5", themes_table())
+        ctx.freeze_themes()
+        themes = ctx.prioritized_themes()
+
+        ctx.consumed("prompt_6")
+
+        assert "prompt_4" not in ctx.outputs and "prompt_5" not in ctx.outputs
+        assert ctx.prioritized_themes() == themes
+        assert len(themes) == 10
+
+
+def test_contexto_cerrado_sale_de_las_corridas_activas():
+    before = memory.status()["active_runs"]
+
+    with RunContext("Acme", "Chile", "acme.cl", "Energía") as ctx:
+        ctx.record("prompt_1", {"resumen": "x" * 100})
+        assert memory.status()["active_runs"] == before + 1
+
+    assert memory.status()["active_runs"] == before
@@ -0,0 +1,84 @@
+"""
+Preflight de costo: corrida completa, degradada al modelo barato o rechazada.
+"""
+
+import pytest
+
+from app.core.config import settings
+from app.services.langchain import costs
+from app.services.langchain.costs import BudgetExceeded, CostMeter
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    monkeypatch.setattr(costs, "ledger", costs.SpendLedger())
+    monkeypatch.setattr(costs, "history", costs.CostHistory())
+    monkeypatch.setattr(costs, "_quota_exhausted_at", None)
+    monkeypatch.setattr(settings, "ESG_BUDGET_DOWNGRADE_MODEL", "gpt-4o-mini")
+    full = costs.estimate()["usd"]
+    cheap = costs.estimate(model="gpt-4o-mini")["usd"]
+    assert 0 < cheap < full
+
+    def configure(**limits):
+        for name, value in limits.items():
+            monkeypatch.setattr(settings, name, value)
+
+    return configure, full, cheap
+
+
+def test_estimacion_escala_con_el_documento(budgets):
+    base = costs.estimate()
+    with_document = costs.estimate(document_tokens=10_000)
+
+    assert with_document["steps"]["prompt_1"]["input_tokens"] == base["steps"]["prompt_1"]["input_tokens"] + 10_000
+    assert with_document["usd"] > base["usd"]
+    assert base["steps"]["prompt_7"]["source"] == "static"
+
+
+def test_sin_presupuestos_corre_completa(budgets):
+    meter = CostMeter("acme")
+
+    decision = costs.preflight(meter)
+
+    assert decision["decision"] == "full"
+    assert meter.model is None and meter.limit_usd is None
+    assert meter.estimate_usd == decision["estimate"]["usd"]
+
+
+def test_presupuesto_justo_degrada_al_modelo_barato(budgets):
+    configure, full, cheap = budgets
+    configure(ESG_BUDGET_ANALYSIS_USD=(full + cheap) / 2)
+    meter = CostMeter("acme")
+
+    decision = costs.preflight(meter)
+
+    assert decision["decision"] == "downgraded"
+    assert meter.model == "gpt-4o-mini"
+    assert meter.estimate_usd == cheap
+
+
+def test_analisis_demasiado_caro_se_rechaza_con_402(budgets):
+    configure, _, cheap = budgets
+    configure(ESG_BUDGET_ANALYSIS_USD=cheap / 2)
+
+    with pytest.raises(BudgetExceeded) as exc:
+        costs.preflight(CostMeter("acme"))
+
+    assert exc.value.status_code == 402
+    assert exc.value.retry_after is None
+
+
+def test_presupuesto_diario_del_tenant_cuenta_corridas_en_curso(budgets):
+    configure, full, _ = budgets
+    configure(ESG_BUDGET_TENANT_DAILY_USD=full * 1.5, ESG_BUDGET_DOWNGRADE_MODEL="")
+    running = CostMeter("acme")
+    costs.preflight(running)
+    costs.ledger.open(running)
+
+    with pytest.raises(BudgetExceeded) as exc:
+        costs.preflight(CostMeter("acme"))
+
+    assert exc.value.status_code == 429
+    assert exc.value.retry_after == pytest.approx(costs.seconds_to_midnight(), abs=2)
+    # Otro tenant no comparte ese presupuesto
+    assert costs.preflight(CostMeter("otra"))["decision"] == "full"
@@ -0,0 +1,23 @@
+"""
+Métricas del pool de conexiones.
+"""
+
+from sqlalchemy import create_engine, text
+
+from app.core.database import MeteredQueuePool, _attach_metrics
+
+
+def test_metricas_sobreviven_a_dispose():
+    engine = create_engine("sqlite://", poolclass=MeteredQueuePool, pool_size=1, max_overflow=0)
+    metrics = _attach_metrics(engine)
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+
+    engine.dispose()
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+
+    assert engine.pool.metrics is metrics
+    assert metrics.checkouts == 2
+    assert metrics.connects == 2
+    assert engine.pool.metrics.snapshot(engine.pool)["checkouts"] == 2
@@ -0,0 +1,53 @@
+"""
+Cancelación de trabajos: los runs en vuelo se cancelan también en OpenAI.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.langchain import costs, deadline
+
+
+def hanging(content):
+    return "[]", True
+
+
+def run_until_cancelled(handle, token, cancel_after=None):
+    async def main():
+        with costs.metering(costs.CostMeter("tests")) as meter:
+            if cancel_after is not None:
+                asyncio.get_running_loop().call_later(cancel_after, token.cancel)
+            with pytest.raises(deadline.RunCancelled) as error:
+                await deadline.run_job(token, lambda: handle.ainvoke({"content": "x"}, step="prompt_1"))
+            # Las cancelaciones del token corren en segundo plano
+            await asyncio.gather(*deadline._stopping)
+        return error.value, meter
+
+    return asyncio.run(main())
+
+
+def test_cancelar_trabajo_cancela_el_run_en_el_servidor(assistants_api):
+    api, handle = assistants_api(hanging)
+    token = deadline.CancelToken()
+
+    error, meter = run_until_cancelled(handle, token, cancel_after=0.1)
+
+    assert error.status == deadline.CANCELLED
+    [run] = api.runs.values()
+    assert run["status"] == "cancelled"
+    # Una sola cancelación (token), no una por el token y otra por la tarea
+    assert sum(path.endswith("/cancel") for _, path, _ in api.requests) == 1
+    assert meter.steps["prompt_1"]["output_tokens"] == 10
+    assert token.runs == {}
+
+
+def test_deadline_vencido_cancela_el_run_en_el_servidor(assistants_api):
+    api, handle = assistants_api(hanging)
+    token = deadline.CancelToken(deadline_s=0.1)
+
+    error, _ = run_until_cancelled(handle, token)
+
+    assert error.status == deadline.DEADLINE
+    [run] = api.runs.values()
+    assert run["status"] == "cancelled"
@@ -0,0 +1,30 @@
+"""
+Hedging: el run perdedor se cancela en OpenAI y su usage se cobra.
+"""
+
+import asyncio
+
+from app.services.langchain import costs, hedging
+
+
+def test_hedge_perdedor_se_cancela_en_el_servidor(assistants_api, monkeypatch):
+    api, handle = assistants_api(lambda content: ('{"ok": true}', content == "lento"))
+    monkeypatch.setattr(hedging, "hedge_after", lambda step: 0.05)
+
+    async def main():
+        with costs.metering(costs.CostMeter("tests")) as meter:
+            result = await hedging.hedged_call(
+                "prompt_1",
+                lambda hedge: handle.ainvoke({"content": "rápido" if hedge else "lento"}, step="prompt_1"),
+            )
+        return result, meter
+
+    [message], meter = asyncio.run(main())
+
+    assert message.content[0].text.value == '{"ok": true}'
+    [slow] = [run_id for run_id, run in api.runs.items() if run["hang"]]
+    assert api.runs[slow]["status"] == "cancelled"
+    assert any(path.endswith(f"/runs/{slow}/cancel") for _, path, _ in api.requests)
+    # Solo el run cancelado pasa por costs acá (el ganador lo cobra invoke_once)
+    assert meter.steps["prompt_1"]["input_tokens"] == 100
+    assert meter.steps["prompt_1"]["output_tokens"] == 10
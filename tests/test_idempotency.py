@@ -0,0 +1,60 @@
+"""
+Deduplicación: orden admisión → lock → análisis, y replays sin cola.
+"""
+
+import asyncio
+
+from app.services import idempotency
+
+
+def test_lock_se_pide_con_lugar_en_admision(monkeypatch):
+    events = []
+
+    async def fake_acquire(key):
+        events.append("lock")
+        return None
+
+    monkeypatch.setattr(idempotency, "_acquire", fake_acquire)
+    monkeypatch.setattr(idempotency, "_find_stored", lambda req_hash, key: None)
+
+    async def analyze():
+        events.append("analyze")
+        return "resultado"
+
+    async def run(guarded):
+        events.append("admitted")
+        return await guarded(analyze)
+
+    result, origin = asyncio.run(idempotency.run_once("test", "h1", None, run, lambda stored: stored))
+
+    assert (result, origin) == ("resultado", None)
+    assert events == ["admitted", "lock", "analyze"]
+
+
+def test_guardado_se_devuelve_sin_admision_ni_lock(monkeypatch):
+    async def fail(*args):
+        raise AssertionError("no debía llamarse")
+
+    monkeypatch.setattr(idempotency, "_acquire", fail)
+    monkeypatch.setattr(idempotency, "_find_stored", lambda req_hash, key: {"id": "a1"})
+
+    result, origin = asyncio.run(idempotency.run_once("test", "h2", None, fail, lambda stored: stored["id"]))
+
+    assert (result, origin) == ("a1", "stored")
+
+
+def test_guardado_por_otro_nodo_mientras_se_esperaba_el_lock(monkeypatch):
+    lookups = iter([None, {"id": "a2"}])
+    monkeypatch.setattr(idempotency, "_find_stored", lambda req_hash, key: next(lookups))
+
+    async def no_lock(key):
+        return None
+
+    monkeypatch.setattr(idempotency, "_acquire", no_lock)
+
+    async def run(guarded):
+        return await guarded(lambda: None)
+
+    result, origin = asyncio.run(idempotency.run_once("test", "h3", None, run, lambda stored: stored["id"]))
+
+    assert (result, origin) == ("a2", "stored")
@@ -0,0 +1,97 @@
+"""
+Preprocesamiento del documento: normalización, chunks y selección BM25.
+"""
+
+import pytest
+
+from app.core.config import settings
+from app.services.documents import preprocess
+from app.services.documents.preprocess import BM25, chunk, normalize_text, paragraphs, select_passages, tokenize
+
+
+def test_normalize_text_quita_paginas_encabezados_repetidos_y_guiones():
+    page = "Reporte Integrado 2023\nLa compañía opera en Chile y Perú con plan-\ntas propias.\nPágina {n} de 3"
+    text = normalize_text("\n\n".join(page.format(n=n) for n in range(1, 4)))
+
+    assert text.count("Reporte Integrado 2023") == 1
+    assert "Página" not in text
+    assert "plantas propias" in text
+
+
+def test_paragraphs_descarta_duplicados_con_otra_grafia():
+    blocks = paragraphs("Energía renovable en planta.\n\nENERGIA  renovable en\nplanta.\n\nAgua y residuos.")
+
+    assert blocks == ["Energía renovable en planta.", "Agua y residuos."]
+
+
+def test_chunk_respeta_el_maximo_y_corta_en_oraciones():
+    blocks = ["Primera oración larga. " * 10, "corto", "otro corto"]
+
+    chunks = chunk(blocks, 100)
+
+    assert all(len(c) <= 100 for c in chunks)
+    assert all(c.endswith("larga.") for c in chunks[:-1])
+    # El resto del párrafo largo se junta con los cortos que siguen
+    assert chunks[-1].endswith("larga.\ncorto\notro corto")
+    assert "".join(chunks).count("Primera") == 10
+
+
+def test_bm25_prioriza_el_documento_con_el_termino_raro():
+    docs = [tokenize(t) for t in (
+        "emisiones de carbono y energía",
+        "energía y clientes",
+        "energía y proveedores",
+    )]
+
+    scores = BM25(docs).scores(tokenize("emisiones energía"))
+
+    assert scores[0] == max(scores)
+    assert scores[1] == scores[2] > 0
+
+
+def test_select_passages_llena_el_presupuesto_en_orden_del_documento():
+    chunks = [
+        "Los colaboradores y empleados suman 4.000 trabajadores.",
+        "Texto sin relación alguna con los campos buscados.",
+        "La sede y las oficinas están en Santiago; plantas en regiones.",
+        "Proveedores, abastecimiento y logística de la cadena de valor.",
+    ]
+    budget = len(chunks[0]) + len(chunks[3]) + 1
+
+    chosen, by_field = select_passages(chunks, budget, per_field=1)
+
+    assert chosen == sorted(chosen)
+    assert 1 not in chosen
+    assert sum(len(chunks[i]) for i in chosen) <= budget
+    assert by_field["cadena_valor"] == [3]
+
+
+def test_select_passages_sin_coincidencias_usa_el_comienzo():
+    chunks = ["xyz " * 10, "qwe " * 10, "asd " * 10]
+
+    chosen, _ = select_passages(chunks, 85, per_field=2)
+
+    assert chosen == [0, 1]
+
+
+@pytest.fixture
+def small_budget(monkeypatch):
+    monkeypatch.setattr(settings, "ESG_DOCUMENT_BUDGET_TOKENS", 50)
+    monkeypatch.setattr(settings, "ESG_DOCUMENT_CHUNK_CHARS", 120)
+    monkeypatch.setattr(preprocess, "_cache", preprocess.OrderedDict())
+
+
+def test_prepare_document_extracta_y_cachea_por_hash(small_budget):
+    document = "\n\n".join(
+        [f"Párrafo de relleno número {i} sin datos útiles para nadie." for i in range(20)]
+        + ["La empresa tiene 4.000 colaboradores y ventas por 300 millones."]
+    )
+
+    first = preprocess.prepare_document(document)
+    second = preprocess.prepare_document(document)
+
+    assert len(first.text) < len(document)
+    assert "4.000 colaboradores" in first.text
+    assert first.fields["tamano_empresa"]
+    assert not first.cached and second.cached
+    assert second.text == first.text
@@ -0,0 +1,38 @@
+"""
+Clasificación de runs fallidos por `last_error.code`.
+"""
+
+from openai.types.beta.threads import Run
+from openai.types.beta.threads.run import LastError
+
+from app.services.langchain.resilience import ErrorKind, RunFailed, classify_error
+from app.services.langchain.streaming import unexpected_status
+
+
+def failed_run(status="failed", code=None, message="", run_id="run_abc"):
+    last_error = LastError(code=code, message=message) if code else None
+    return Run.model_construct(
+        id=run_id, thread_id="thread_1", status=status, last_error=last_error, created_at=1715030503
+    )
+
+
+def test_prompt_invalido_es_fatal_aunque_el_volcado_diga_503():
+    error = unexpected_status(failed_run(code="invalid_prompt", message="bad", run_id="run_503timeout"))
+
+    assert isinstance(error, RunFailed)
+    assert classify_error(error) == ErrorKind.FATAL
+
+
+def test_codigos_de_run():
+    assert classify_error(unexpected_status(failed_run(code="server_error"))) == ErrorKind.TRANSIENT
+    assert classify_error(unexpected_status(failed_run(code="rate_limit_exceeded"))) == ErrorKind.RATE_LIMIT
+    quota = failed_run(code="rate_limit_exceeded", message="You exceeded your current quota")
+    assert classify_error(unexpected_status(quota)) == ErrorKind.QUOTA
+    assert classify_error(unexpected_status(failed_run(status="expired"))) == ErrorKind.TIMEOUT
+    assert classify_error(unexpected_status(failed_run(status="incomplete"))) == ErrorKind.INVALID_OUTPUT
+    assert classify_error(unexpected_status(failed_run(status="cancelled"))) == ErrorKind.FATAL
+
+
+def test_texto_libre_solo_matchea_codigos_http_completos():
+    assert classify_error(RuntimeError("upstream 503 Service Unavailable")) == ErrorKind.TRANSIENT
+    assert classify_error(ValueError("fila 15030 sin tema")) == ErrorKind.INVALID_OUTPUT
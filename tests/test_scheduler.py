@@ -0,0 +1,78 @@
+"""
+Scheduler de runs: clases de prioridad, lugares reservados y colas justas por tenant.
+"""
+
+import asyncio
+
+from app.services.langchain.scheduler import BATCH, INTERACTIVE, StepScheduler, lane
+
+
+def run_waiters(scheduler, lanes, holder=(INTERACTIVE, "ocupa")):
+    """
+    Ocupa la capacidad, encola un run por cada (prioridad, tenant) en orden
+    y los libera uno a uno: devuelve el orden en que obtuvieron lugar.
+    """
+
+    async def scenario():
+        order = []
+        held = []
+        for _ in range(scheduler.capacity):
+            with lane(*holder):
+                held.append(await scheduler.acquire("paso_test"))
+
+        async def run(priority, tenant):
+            with lane(priority, tenant):
+                async with scheduler.slot("paso_test"):
+                    order.append((priority, tenant))
+
+        tasks = []
+        for priority, tenant in lanes:
+            tasks.append(asyncio.create_task(run(priority, tenant)))
+            await asyncio.sleep(0)
+        for priority in held:
+            scheduler.release(priority)
+        await asyncio.gather(*tasks)
+        return order
+
+    return asyncio.run(scenario())
+
+
+def test_interactive_adelanta_a_batch_que_llego_antes():
+    order = run_waiters(
+        StepScheduler(capacity=1, reserved=0),
+        [(BATCH, "cartera"), (BATCH, "cartera"), (INTERACTIVE, "acme")],
+    )
+
+    assert order[0] == (INTERACTIVE, "acme")
+
+
+def test_tenants_de_la_misma_clase_se_turnan():
+    order = run_waiters(
+        StepScheduler(capacity=1, reserved=0),
+        [(BATCH, "cartera")] * 3 + [(BATCH, "pyme")],
+        holder=(BATCH, "ocupa"),
+    )
+
+    # La cartera encoló primero, pero la pyme no espera a que termine toda
+    assert order.index((BATCH, "pyme")) == 1
+
+
+def test_batch_no_toma_los_lugares_reservados():
+    async def scenario():
+        scheduler = StepScheduler(capacity=3, reserved=2)
+        with lane(BATCH, "cartera"):
+            await scheduler.acquire("paso_test")
+            waiting = asyncio.create_task(scheduler.acquire("paso_test"))
+            await asyncio.sleep(0)
+        with lane(INTERACTIVE, "acme"):
+            await scheduler.acquire("paso_test")
+            await scheduler.acquire("paso_test")
+        running = dict(scheduler.running)
+        queued = scheduler.status()["classes"][BATCH]["queued"]
+        waiting.cancel()
+        return running, queued
+
+    running, queued = asyncio.run(scenario())
+
+    assert running == {INTERACTIVE: 2, BATCH: 1}
+    assert queued == 1
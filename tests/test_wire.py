@@ -0,0 +1,31 @@
+"""
+Formato compacto: rescate de filas y campos de salidas truncadas.
+"""
+
+from app.services.langchain.wire import rescue_fields, rescue_rows, row_identity
+
+TRUNCATED = (
+    '{"exhausted": true, "nota": {"fuente": "SASB"}, '
+    '"materiality_table": {"columns": ["sector", "tema"], "rows": [["Energía", "Agua"], ["Ener'
+)
+
+
+def test_rescata_filas_completas():
+    assert rescue_rows(TRUNCATED, "materiality_table") == [{"sector": "Energía", "tema": "Agua"}]
+
+
+def test_rescata_campos_de_primer_nivel_sin_la_tabla():
+    assert rescue_fields(TRUNCATED, "materiality_table") == {"exhausted": True, "nota": {"fuente": "SASB"}}
+
+
+def test_campos_sin_json():
+    assert rescue_fields("sin llaves", "materiality_table") == {}
+
+
+def test_identidad_gri_incluye_requerimiento():
+    a = {"estandar_gri": "GRI 2", "numero_contenido": "2-7", "contenido": "Empleados", "requerimiento": "a. total"}
+    b = {**a, "requerimiento": "b. por región"}
+
+    assert row_identity("gri_mapping", a) != row_identity("gri_mapping", b)
+    assert row_identity("gri_mapping", a) == row_identity("gri_mapping", {**a, "contenido": "EMPLEADOS "})
+    assert row_identity("materiality_table", {"tema": "Agua", "sector": "x"}) == ("agua",)
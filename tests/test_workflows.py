@@ -0,0 +1,92 @@
+"""
+Tablas truncadas: continuaciones en el mismo thread con un backend simulado.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.langchain import backends, resilience
+from app.services.langchain.backends import Backend
+from app.services.langchain.context import RunContext
+from app.services.langchain.resilience import RetryPolicy
+from app.services.langchain.truncation import PartialMessage
+from app.services.langchain.workflows import complete_table
+
+TRUNCATED = '{"materiality_table": {"columns": ["sector", "tema"], "rows": [["Energía", "Agua"], ["Energía", "Emisiones"], ["Ener'
+CONTINUATION = '{"materiality_table": {"columns": ["sector", "tema"], "rows": [["Energía", "Residuos"]]}}'
+
+
+class ScriptedBackend(Backend):
+    """Devuelve (o lanza) las respuestas en orden y guarda los params de cada run."""
+
+    name = "scripted"
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def invoke(self, step, route, params):
+        self.calls.append((step, dict(params)))
+        reply = self.replies.pop(0)
+        if isinstance(reply, BaseException):
+            raise reply
+        thread_id = params.get("thread_id") or f"thread_nuevo_{len(self.calls)}"
+        return [PartialMessage(thread_id, f"run_{len(self.calls)}", reply, None)]
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    monkeypatch.setattr(resilience, "DEFAULT_POLICY", RetryPolicy(base_delay_s=0.0, max_delay_s=0.0))
+
+    def install(replies):
+        backend = ScriptedBackend(replies)
+        monkeypatch.setitem(backends._backends, "openai", backend)
+        return backend
+
+    return install
+
+
+def run_complete_table(step="prompt_2", key="materiality_table", raw=TRUNCATED):
+    with RunContext("Acme", "Chile", "acme.cl", "Energía") as ctx:
+        rows = asyncio.run(complete_table(ctx, step, key, raw, "thread_1"))
+    return ctx, rows
+
+
+def test_continuacion_une_filas_en_el_mismo_thread(scripted):
+    backend = scripted([CONTINUATION])
+
+    ctx, rows = run_complete_table()
+
+    assert [r["tema"] for r in rows] == ["Agua", "Emisiones", "Residuos"]
+    [(step, params)] = backend.calls
+    assert step == "prompt_2_continue"
+    assert params["thread_id"] == "thread_1"
+    assert ctx.continuations == {"prompt_2": 1}
+
+
+def test_reintento_de_continuacion_no_cambia_de_thread(scripted):
+    backend = scripted([TimeoutError("run timed out"), CONTINUATION])
+
+    _, rows = run_complete_table()
+
+    assert [r["tema"] for r in rows] == ["Agua", "Emisiones", "Residuos"]
+    assert [params["thread_id"] for _, params in backend.calls] == ["thread_1", "thread_1"]
+
+
+def test_continuacion_gri_no_junta_requerimientos_del_mismo_numero(scripted):
+    columns = '"columns": ["estandar_gri", "numero_contenido", "contenido", "requerimiento"]'
+    truncated = (
+        '{"gri_mapping": {' + columns + ', "rows": ['
+        '["GRI 2", "2-7", "Empleados", "a. número total"], ["GRI 2", "2-7", "Empleados", "b. por región"], ["GRI'
+    )
+    continuation = (
+        '{"gri_mapping": {' + columns + ', "rows": ['
+        '["GRI 2", "2-7", "Empleados", "b. por región"], ["GRI 303", "", "Agua", "a. extracción"], '
+        '["GRI 303", "", "Agua", "b. vertidos"]]}}'
+    )
+    scripted([continuation])
+
+    _, rows = run_complete_table("prompt_7", "gri_mapping", truncated)
+
+    assert [r["requerimiento"] for r in rows] == ["a. número total", "b. por región", "a. extracción", "b. vertidos"]